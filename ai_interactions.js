@@ -53,6 +53,33 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     }
 
+    const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+    // Poll a queued AI job until it is done, backing off from 300ms to 2s between polls
+    async function pollAiJob(statusUrl, timeoutMs = 120000, onProgress = null) {
+        const deadline = Date.now() + timeoutMs;
+        let delay = 300;
+        while (Date.now() < deadline) {
+            await sleep(delay);
+            const response = await fetch(statusUrl, { headers: { "Accept": "application/json" } });
+            const job = await response.json().catch(() => ({}));
+            if (!response.ok) {
+                throw new Error(job.error || `HTTP error! status: ${response.status}`);
+            }
+            if (job.progress && onProgress) {
+                onProgress(job.progress);
+            }
+            if (job.status === "done") {
+                return job.result;
+            }
+            if (job.status === "error") {
+                throw new Error(job.error || "AI job failed");
+            }
+            delay = Math.min(delay * 1.5, 2000);
+        }
+        throw new Error("Timed out waiting for the AI response");
+    }
+
     async function callAiEndpoint(endpoint, data, button, originalButtonContent) {
         showLoading(button);
         try {
@@ -71,7 +98,11 @@ document.addEventListener("DOMContentLoaded", () => {
                 throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
             }
 
-            const result = await response.json();
+            let result = await response.json();
+            // AI routes answer 202 with a job id; wait for the background job to finish
+            if (result.job_id) {
+                result = await pollAiJob(result.status_url || `/ai/jobs/${result.job_id}`);
+            }
             hideLoading(button, originalButtonContent);
             return result;
 
@@ -83,6 +114,67 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     }
 
+    // Stream an AI endpoint over Server-Sent Events, calling onChunk(text) as tokens arrive.
+    // Resolves with the payload of the final "done" event (same shape as the JSON response).
+    async function streamAiEndpoint(endpoint, data, button, originalButtonContent, onChunk) {
+        showLoading(button);
+        try {
+            const response = await fetch(`/ai${endpoint}`, {
+                method: "POST",
+                headers: {
+                    "Content-Type": "application/json",
+                    "Accept": "text/event-stream",
+                },
+                body: JSON.stringify({ ...data, stream: true }),
+            });
+            if (!response.ok || !response.body) {
+                const errorData = await response.json().catch(() => ({}));
+                throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = "";
+            let result = null;
+            while (result === null) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                // Events are separated by a blank line: "event: <name>\ndata: <json>\n\n"
+                let boundary;
+                while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+                    const rawEvent = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    let eventName = "message";
+                    let payload = "";
+                    rawEvent.split("\n").forEach(line => {
+                        if (line.startsWith("event:")) eventName = line.slice(6).trim();
+                        else if (line.startsWith("data:")) payload += line.slice(5).trim();
+                    });
+                    const parsed = payload ? JSON.parse(payload) : {};
+                    if (eventName === "chunk") {
+                        onChunk(parsed.text);
+                    } else if (eventName === "done") {
+                        result = parsed;
+                    } else if (eventName === "error") {
+                        throw new Error(parsed.error || "AI stream failed");
+                    }
+                }
+            }
+            if (result === null) {
+                throw new Error("AI stream ended unexpectedly");
+            }
+            hideLoading(button, originalButtonContent);
+            return result;
+
+        } catch (error) {
+            console.error(`Error streaming ${endpoint}:`, error);
+            displayError(button, `AI request failed: ${error.message}`);
+            hideLoading(button, originalButtonContent);
+            return null;
+        }
+    }
+
     // --- Modal Event Listeners ---
     if (modalCloseButtons) {
         modalCloseButtons.forEach(button => {
@@ -127,10 +219,23 @@ document.addEventListener("DOMContentLoaded", () => {
                 prompt = prompt.trim();
                 if (!prompt) { alert("Please provide a lesson title for context."); return; }
 
-                result = await callAiEndpoint("/generate_text", { prompt }, button, originalButtonContent);
+                // Render tokens into the block as they stream in
+                const quill = quillEditorDiv?.__quill; // Check if Quill instance exists
+                if (quill) {
+                    quill.setText("");
+                } else if (targetTextArea) {
+                    targetTextArea.value = "";
+                }
+                result = await streamAiEndpoint("/generate_text", { prompt }, button, originalButtonContent, (chunk) => {
+                    if (quill) {
+                        quill.insertText(quill.getLength() - 1, chunk);
+                    } else if (targetTextArea) {
+                        targetTextArea.value += chunk;
+                    }
+                });
                 if (result?.generated_text) {
-                    if (quillEditorDiv && quillEditorDiv.__quill) { // Check if Quill instance exists
-                        quillEditorDiv.__quill.setText(result.generated_text);
+                    if (quill) {
+                        quill.setText(result.generated_text);
                     } else if (targetTextArea) {
                         targetTextArea.value = result.generated_text;
                     }
@@ -148,7 +253,10 @@ document.addEventListener("DOMContentLoaded", () => {
                  let context = document.getElementById("lesson-title-input")?.value || "lesson context";
                  context = context.trim();
 
-                 result = await callAiEndpoint("/generate_quiz", { context }, button, originalButtonContent);
+                 questionInput.value = "";
+                 result = await streamAiEndpoint("/generate_quiz", { context }, button, originalButtonContent, (chunk) => {
+                     questionInput.value += chunk;
+                 });
                  if (result?.generated_quiz) {
                      const quiz = result.generated_quiz;
                      questionInput.value = quiz.question;
@@ -188,6 +296,34 @@ document.addEventListener("DOMContentLoaded", () => {
                     displaySuggestion("ai-structure-suggestion", structureHtml); // Display raw JSON for now
                     // TODO: Format structure suggestion nicely
                 }
+            }
+            // Draft every lesson of the course in one background job
+            else if (button.id === "ai-generate-all-btn") {
+                const courseId = document.querySelector("#structure-panel li[data-type=\"course\"]")?.dataset.id;
+                if (!courseId) { console.error("Course ID not found for AI batch generation."); return; }
+                showLoading(button);
+                try {
+                    const response = await fetch(`/ai/course/${courseId}/generate_all`, {
+                        method: "POST",
+                        headers: { "Content-Type": "application/json" },
+                        body: JSON.stringify({}),
+                    });
+                    const job = await response.json().catch(() => ({}));
+                    if (!response.ok) {
+                        throw new Error(job.error || `HTTP error! status: ${response.status}`);
+                    }
+                    result = await pollAiJob(job.status_url, 600000, (progress) => {
+                        displaySuggestion("ai-generate-all-status",
+                            `Drafting lessons: ${progress.done + progress.failed}/${progress.total} finished` +
+                            (progress.failed ? ` (${progress.failed} failed)` : ""));
+                    });
+                    displaySuggestion("ai-generate-all-status",
+                        `AI drafted ${result.created_blocks} blocks. Open a lesson to review them.`);
+                } catch (error) {
+                    displayError(button, `AI request failed: ${error.message}`);
+                } finally {
+                    hideLoading(button, originalButtonContent);
+                }
             }
              // Suggest Image Concept
             else if (button.id === "ai-suggest-image-btn") { // Assuming dynamic buttons get this ID/class
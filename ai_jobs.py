@@ -0,0 +1,163 @@
+# ai_jobs.py
+"""
+Background execution for the /ai routes.
+
+AI calls take seconds each, and gunicorn's sync workers would otherwise sit
+idle waiting on them. Routes hand the work to a bounded thread pool and
+return a job id straight away; the browser polls GET /ai/jobs/<id>.
+Job state lives in the database so any worker process can answer the poll.
+"""
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from main import db
+
+
+def _job_id() -> str:
+    return uuid.uuid4().hex
+
+
+class AIJob(db.Model):
+    __tablename__ = "ai_job"
+
+    id          = db.Column(db.String(32), primary_key=True, default=_job_id)
+    user_id     = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    kind        = db.Column(db.String(64), nullable=False)        # e.g. "generate_text"
+    status      = db.Column(db.String(16), nullable=False, default="queued")  # queued | running | done | error
+    result      = db.Column(db.Text, nullable=True)               # JSON payload once done
+    progress    = db.Column(db.Text, nullable=True)               # JSON, for long multi-step jobs
+    error       = db.Column(db.String(255), nullable=True)
+
+    created_at  = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self) -> dict:
+        payload = {"job_id": self.id, "kind": self.kind, "status": self.status}
+        if self.progress:
+            payload["progress"] = json.loads(self.progress)
+        if self.status == "done":
+            payload["result"] = json.loads(self.result) if self.result else None
+        elif self.status == "error":
+            payload["error"] = self.error
+        return payload
+
+    def __repr__(self):
+        return f"<AIJob {self.id} {self.kind} {self.status}>"
+
+
+class QueueFull(Exception):
+    """Raised when this worker already has the maximum number of pending AI jobs."""
+
+
+class AIJobQueue:
+    """Bounded, per-process thread pool that runs AI calls outside the request."""
+
+    def __init__(self, max_workers=4, max_pending=32, job_ttl_seconds=3600):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.job_ttl_seconds = job_ttl_seconds
+        self._executor = None
+        self._executor_pid = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._current = threading.local()   # id of the job running on this pool thread
+
+    def init_app(self, app):
+        self.max_workers = app.config.get("AI_JOB_WORKERS", self.max_workers)
+        self.max_pending = app.config.get("AI_JOB_QUEUE_SIZE", self.max_pending)
+        self.job_ttl_seconds = app.config.get("AI_JOB_TTL_SECONDS", self.job_ttl_seconds)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created lazily, and re-created if we find ourselves in a forked child:
+        # pool threads never survive a fork.
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="ai-job")
+                self._executor_pid = os.getpid()
+                self._slots = threading.BoundedSemaphore(self.max_pending)
+            return self._executor
+
+    def submit(self, kind, fn, *args, user_id, error_message="AI request failed", on_finish=None,
+               **kwargs) -> str:
+        """
+        Record a queued job, schedule ``fn(*args, **kwargs)`` and return the job id.
+
+        ``on_finish()`` runs on the pool thread once the job has ended, however it ended.
+        """
+        executor = self._get_executor()
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull(kind)
+
+        try:
+            job = AIJob(user_id=user_id, kind=kind, status="queued")
+            db.session.add(job)
+            db.session.commit()
+            job_id = job.id
+            app = current_app._get_current_object()
+            executor.submit(self._run, app, job_id, kind, error_message, fn, args, kwargs, on_finish)
+        except Exception:
+            self._slots.release()
+            raise
+
+        self._maybe_prune()
+        return job_id
+
+    def _run(self, app, job_id, kind, error_message, fn, args, kwargs, on_finish=None):
+        try:
+            self._current.job_id = job_id
+            with app.app_context():
+                try:
+                    self._update(job_id, status="running")
+                    try:
+                        result = fn(*args, **kwargs)
+                    except Exception as e:
+                        app.logger.error(f"AI job {job_id} ({kind}) failed: {e}")
+                        self._update(job_id, status="error", error=error_message,
+                                     finished_at=datetime.utcnow())
+                    else:
+                        self._update(job_id, status="done", result=json.dumps(result),
+                                     finished_at=datetime.utcnow())
+                finally:
+                    db.session.remove()
+        finally:
+            self._current.job_id = None
+            self._slots.release()
+            if on_finish is not None:
+                try:
+                    on_finish()
+                except Exception as e:
+                    app.logger.error(f"AI job {job_id} ({kind}) cleanup failed: {e}")
+
+    def report_progress(self, progress: dict):
+        """Publish progress for the job running on this thread (no-op elsewhere)."""
+        job_id = getattr(self._current, "job_id", None)
+        if job_id is not None:
+            self._update(job_id, progress=json.dumps(progress))
+
+    @staticmethod
+    def _update(job_id, **fields):
+        AIJob.query.filter_by(id=job_id).update(fields)
+        db.session.commit()
+
+    def _maybe_prune(self):
+        """Every so often, drop finished jobs older than the TTL."""
+        self._submitted += 1
+        if self._submitted % 50:
+            return
+        cutoff = datetime.utcnow() - timedelta(seconds=self.job_ttl_seconds)
+        AIJob.query.filter(AIJob.created_at < cutoff,
+                           AIJob.status.in_(("done", "error"))).delete(synchronize_session=False)
+        db.session.commit()
+
+
+# Shared queue for the app; configured in create_app()
+ai_job_queue = AIJobQueue()
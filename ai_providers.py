@@ -0,0 +1,183 @@
+# ai_providers.py
+"""
+Model backends behind AIService.
+
+``AI_PROVIDER`` picks one:
+
+* ``stub`` (default): no provider; AIService answers with its built-in
+  placeholders after a simulated delay.
+* ``openai``: any OpenAI-compatible chat completions API at ``AI_BASE_URL``.
+  Point it at ``ai_stub_server.py`` to load-test offline.
+
+The OpenAI-compatible provider keeps one ``requests.Session`` per worker
+process. Its connection pool keeps connections alive, so calls after the
+first skip the TCP and TLS handshakes. Every call has:
+
+* separate connect and read timeouts;
+* retries on connection errors, timeouts, 429 and 5xx, with jittered
+  exponential backoff (honouring ``Retry-After``);
+* an overall deadline that bounds the whole call, retries and backoff
+  included. A stream is not retried once its response has started.
+"""
+import json
+import os
+import random
+import threading
+import time
+
+# requests is imported on first use: it adds ~100 ms to every cold start
+# (see `flask startup-check`), and the stub provider never needs it.
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ProviderError(Exception):
+    """The provider could not produce an answer (after any retries)."""
+
+
+class OpenAICompatibleProvider:
+    """Chat completions over HTTP with pooled keep-alive connections."""
+
+    def __init__(self, api_key, base_url="https://api.openai.com/v1", model="gpt-4o-mini",
+                 connect_timeout=3.05, read_timeout=30.0, deadline=60.0, max_retries=3,
+                 backoff_base=0.5, backoff_cap=8.0, pool_size=16):
+        self.api_key = api_key
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.model = model
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.pool_size = pool_size
+        self._session_obj = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            api_key=os.getenv("OPENAI_API_KEY", ""),
+            base_url=os.getenv("AI_BASE_URL", "https://api.openai.com/v1"),
+            model=os.getenv("AI_MODEL", "gpt-4o-mini"),
+            connect_timeout=float(os.getenv("AI_CONNECT_TIMEOUT", "3.05")),
+            read_timeout=float(os.getenv("AI_READ_TIMEOUT", "30")),
+            deadline=float(os.getenv("AI_DEADLINE", "60")),
+            max_retries=int(os.getenv("AI_MAX_RETRIES", "3")),
+            pool_size=int(os.getenv("AI_POOL_SIZE", "16")),
+        )
+
+    def _session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        # One pool per process: sockets must not be shared across a fork
+        with self._lock:
+            if self._session_obj is None or self._session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update({"Authorization": f"Bearer {self.api_key}",
+                                        "Content-Type": "application/json"})
+                self._session_obj = session
+                self._session_pid = os.getpid()
+            return self._session_obj
+
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        # "Full jitter": spreads out retries from many workers hitting the same limit
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def _post(self, payload, stream=False):
+        """POST with retries inside the deadline; returns a successful response."""
+        import requests
+
+        give_up_at = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                raise ProviderError("AI provider deadline exceeded")
+            response, error = None, None
+            try:
+                response = self._session().post(
+                    self.url, json=payload, stream=stream,
+                    timeout=(min(self.connect_timeout, remaining), min(self.read_timeout, remaining)))
+                if response.status_code < 400:
+                    return response
+                if response.status_code not in RETRY_STATUSES:
+                    try:
+                        detail = response.text[:200]
+                    finally:
+                        response.close()   # a streamed response would otherwise keep the connection
+                    raise ProviderError(f"AI provider returned {response.status_code}: {detail}")
+                error = f"AI provider returned {response.status_code}"
+                response.close()   # hands the connection back to the pool
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = f"AI provider unreachable: {e}"
+
+            if attempt >= self.max_retries:
+                raise ProviderError(error)
+            delay = self._backoff(attempt, response)
+            if time.monotonic() + delay >= give_up_at:
+                raise ProviderError(f"{error} (no time left to retry)")
+            time.sleep(delay)
+            attempt += 1
+
+    def _payload(self, system, prompt, json_mode, max_tokens, stream=False):
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "system", "content": system}, {"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+        }
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    def complete(self, system, prompt, json_mode=False, max_tokens=800):
+        """Return the model's reply (parsed JSON when ``json_mode``)."""
+        response = self._post(self._payload(system, prompt, json_mode, max_tokens))
+        try:
+            content = response.json()["choices"][0]["message"]["content"]
+            return json.loads(content) if json_mode else content
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise ProviderError(f"Unexpected AI provider response: {e}") from None
+
+    def stream(self, system, prompt, max_tokens=800):
+        """Yield reply text as it arrives (server-sent events)."""
+        give_up_at = time.monotonic() + self.deadline
+        response = self._post(self._payload(system, prompt, False, max_tokens, stream=True), stream=True)
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                if time.monotonic() > give_up_at:
+                    raise ProviderError("AI provider deadline exceeded mid-stream")
+                try:
+                    delta = json.loads(data)["choices"][0].get("delta", {})
+                except (ValueError, KeyError, IndexError) as e:
+                    raise ProviderError(f"Unexpected AI provider stream event: {e}") from None
+                if delta.get("content"):
+                    yield delta["content"]
+
+
+def make_provider(name=None):
+    """The provider named by ``AI_PROVIDER``; None means AIService's placeholders."""
+    name = (name or os.getenv("AI_PROVIDER", "stub")).lower()
+    if name == "stub":
+        return None
+    if name == "openai":
+        return OpenAICompatibleProvider.from_env()
+    raise ValueError(f"Unknown AI_PROVIDER {name!r} (expected 'stub' or 'openai')")
@@ -1,19 +1,189 @@
 # /home/ubuntu/mini-course-creator/ai_routes.py
 
-from flask import Blueprint, request, jsonify, current_app
+import json
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify, current_app, url_for, Response, stream_with_context
 from flask_login import login_required, current_user
+from markupsafe import escape
 
-# Import the AI service instance (assuming it's initialized in ai_service.py)
-# We might need to adjust imports based on Flask app structure (e.g., using factory pattern)
-try:
-    from ai_service import ai_service_instance
-except ImportError:
-    # Handle potential circular import or structure issues if ai_service needs app context
-    # This is a simplified approach; a factory pattern is often better.
-    from ai_service import ai_service_instance
+from ai_jobs import AIJob, QueueFull, ai_job_queue
+from cache import ai_response_cache
+from coalesce import ai_coalescer
+from course import Course, Module, Lesson, ContentBlock
+from main import db
+from positions import key_between
+from rate_limit import RateLimited, ai_rate_limiter
+from sqlalchemy import func
+
+# The AI service is created on first use, not when this blueprint is imported
+from ai_service import get_ai_service
 
 ai_bp = Blueprint('ai_bp', __name__, url_prefix='/ai')
 
+# Every AI route validates its input, then hands the slow provider call to the
+# background job queue and answers 202 with a job id. The browser polls
+# /ai/jobs/<job_id> for the result, so web workers never wait on the AI.
+
+def enqueue_ai_job(kind, fn, *args, error_message="AI request failed", cost=1):
+    """Queue ``fn(*args)`` for the current user and return a 202 job response."""
+    # Raises RateLimited (answered with 429 below) before anything is queued
+    lease = ai_rate_limiter.acquire(current_user.id, cost)
+    try:
+        job_id = ai_job_queue.submit(kind, fn, *args, user_id=current_user.id,
+                                     error_message=error_message,
+                                     on_finish=lambda: ai_rate_limiter.release(lease))
+    except QueueFull:
+        ai_rate_limiter.release(lease)
+        current_app.logger.warning(f"AI job queue full, rejecting {kind}")
+        response = jsonify({"error": "AI service is busy, please try again shortly"})
+        response.headers["Retry-After"] = "2"
+        return response, 503
+    except Exception as e:
+        ai_rate_limiter.release(lease)
+        current_app.logger.error(f"Failed to queue AI job {kind}: {e}")
+        return jsonify({"error": error_message}), 500
+
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": url_for("ai_bp.job_status_route", job_id=job_id),
+    }), 202
+
+@ai_bp.errorhandler(RateLimited)
+def rate_limited(e):
+    """Refuse fast: the limiter has already decided, nothing else is touched."""
+    retry_after = max(1, math.ceil(e.retry_after))
+    response = jsonify({"error": "Too many AI requests, please wait a moment and try again",
+                        "reason": e.reason, "retry_after": retry_after})
+    response.headers["Retry-After"] = str(retry_after)
+    return response, 429
+
+# --- Server-Sent Events streaming --- #
+# generate_text and generate_quiz can also stream chunks as the model produces
+# them, so the first words reach the editor long before the full draft exists.
+# Clients opt in with {"stream": true} or "Accept: text/event-stream".
+
+def use_cache(data):
+    """Clients may send {"cache": false} to skip the AI response cache for one call."""
+    return data.get("cache", True) is not False
+
+def wants_stream(data):
+    return bool(data.get("stream")) or "text/event-stream" in request.headers.get("Accept", "")
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def stream_ai_response(kind, stream, finish, error_message="AI request failed"):
+    """
+    Relay a chunk generator from AIService as an SSE response.
+
+    Each chunk is sent as a ``chunk`` event; the generator's return value is
+    passed to ``finish`` to build the final ``done`` event. The call holds a
+    rate-limit lease until the stream ends or the response is closed, which
+    also covers a body that is never iterated (client gone before the first
+    read, or an error further up). Releasing twice is harmless.
+    """
+    logger = current_app.logger
+    lease = ai_rate_limiter.acquire(current_user.id)
+
+    def events():
+        try:
+            while True:
+                try:
+                    chunk = next(stream)
+                except StopIteration as stop:
+                    yield _sse("done", finish(stop.value))
+                    return
+                yield _sse("chunk", {"text": chunk})
+        except Exception as e:
+            logger.error(f"AI {kind} stream failed: {e}")
+            yield _sse("error", {"error": error_message})
+        finally:
+            ai_rate_limiter.release(lease)
+
+    def close():
+        stream.close()   # stop the upstream call if it never ran to the end
+        ai_rate_limiter.release(lease)
+
+    response = Response(stream_with_context(events()), mimetype="text/event-stream")
+    response.call_on_close(close)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # don't let a fronting nginx buffer the stream
+    return response
+
+@ai_bp.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def job_status_route(job_id):
+    """Endpoint to poll a queued AI job for its status and result."""
+    job = AIJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+@ai_bp.route('/cache/stats', methods=['GET'])
+@login_required
+def cache_stats_route():
+    """Endpoint reporting AI response cache hit/miss counters for this worker."""
+    return jsonify(ai_response_cache.stats())
+
+@ai_bp.route('/coalesce/stats', methods=['GET'])
+@login_required
+def coalesce_stats_route():
+    """Endpoint reporting upstream AI calls run vs. shared with identical in-flight calls (this worker)."""
+    return jsonify(ai_coalescer.stats())
+
+@ai_bp.route('/limits/stats', methods=['GET'])
+@login_required
+def limits_stats_route():
+    """Endpoint reporting rate-limit settings, in-flight calls and admission/rejection counts."""
+    return jsonify(ai_rate_limiter.stats())
+
+# --- Job bodies (run on the AI worker pool, outside the request) --- #
+
+def _generate_text_job(prompt, use_cache=True):
+    # Add user context if needed by the real AI model
+    return {"generated_text": get_ai_service().generate_lesson_text(prompt, use_cache=use_cache)}
+
+def _generate_quiz_job(context, use_cache=True):
+    return {"generated_quiz": get_ai_service().generate_quiz(context, use_cache=use_cache)}
+
+def _analyze_outcome_job(outcome_text, use_cache=True):
+    return {"suggestion": get_ai_service().analyze_outcome(outcome_text, use_cache=use_cache)}
+
+def _analyze_audience_job(audience_text, use_cache=True):
+    return {"suggestion": get_ai_service().analyze_audience(audience_text, use_cache=use_cache)}
+
+def _suggest_structure_job(topic, use_cache=True):
+    structure = get_ai_service().suggest_course_structure(topic, use_cache=use_cache)
+    # Add specific handling for workflow automation topics if needed
+    if "workflow automation" in topic.lower():
+        # Potentially modify or add specific modules/lessons for this topic
+        structure["modules"].append({
+            "title": "Module 4: Identifying Automation Opportunities (AI)",
+            "lessons": [
+                "4.1: Exercise: List Your Top 5 Tasks",
+                "4.2: Analyzing Tasks for Automation Potential",
+                "4.3: Prioritizing Opportunities"
+            ]
+        })
+    return {"suggested_structure": structure}
+
+def _explain_concept_job(concept_key, use_cache=True):
+    explanation = get_ai_service().explain_concept(concept_key, use_cache=use_cache)
+    # Basic markdown processing (replace **text** with <strong>text</strong>)
+    # In a real app, use a proper Markdown library
+    explanation = explanation.replace("**", "<strong>", 1).replace("**", "</strong>", 1)
+    explanation = explanation.replace("*", "<em>", 1).replace("*", "</em>", 1)
+    return {"explanation": explanation}
+
+def _suggest_image_concept_job(context, use_cache=True):
+    return {"suggestion": get_ai_service().suggest_image_concept(context, use_cache=use_cache)}
+
 @ai_bp.route('/generate_text', methods=['POST'])
 @login_required
 def generate_text_route():
@@ -24,14 +194,13 @@ def generate_text_route():
     if not prompt:
         return jsonify({"error": "Prompt is required"}), 400
 
-    try:
-        # Add user context if needed by the real AI model
-        # user_info = f"User: {current_user.id}"
-        generated_text = ai_service_instance.generate_lesson_text(prompt)
-        return jsonify({"generated_text": generated_text})
-    except Exception as e:
-        current_app.logger.error(f"AI text generation failed: {e}")
-        return jsonify({"error": "Failed to generate text"}), 500
+    if wants_stream(data):
+        return stream_ai_response("generate_text", get_ai_service().stream_lesson_text(prompt),
+                                  lambda text: {"generated_text": text},
+                                  error_message="Failed to generate text")
+
+    return enqueue_ai_job("generate_text", _generate_text_job, prompt, use_cache(data),
+                          error_message="Failed to generate text")
 
 @ai_bp.route('/generate_quiz', methods=['POST'])
 @login_required
@@ -43,13 +212,13 @@ def generate_quiz_route():
     if not context:
         return jsonify({"error": "Context is required"}), 400
 
-    try:
-        # Add user context if needed
-        generated_quiz = ai_service_instance.generate_quiz(context)
-        return jsonify({"generated_quiz": generated_quiz})
-    except Exception as e:
-        current_app.logger.error(f"AI quiz generation failed: {e}")
-        return jsonify({"error": "Failed to generate quiz"}), 500
+    if wants_stream(data):
+        return stream_ai_response("generate_quiz", get_ai_service().stream_quiz(context),
+                                  lambda quiz: {"generated_quiz": quiz},
+                                  error_message="Failed to generate quiz")
+
+    return enqueue_ai_job("generate_quiz", _generate_quiz_job, context, use_cache(data),
+                          error_message="Failed to generate quiz")
 
 # Add other AI routes here later (suggest_structure, analyze_outcome, explain_concept, suggest_image_concept)
 
@@ -66,12 +235,8 @@ def analyze_outcome_route():
     if not outcome_text:
         return jsonify({"error": "Outcome text is required"}), 400
 
-    try:
-        suggestion = ai_service_instance.analyze_outcome(outcome_text)
-        return jsonify({"suggestion": suggestion})
-    except Exception as e:
-        current_app.logger.error(f"AI outcome analysis failed: {e}")
-        return jsonify({"error": "Failed to analyze outcome"}), 500
+    return enqueue_ai_job("analyze_outcome", _analyze_outcome_job, outcome_text, use_cache(data),
+                          error_message="Failed to analyze outcome")
 
 
 
@@ -86,12 +251,8 @@ def analyze_audience_route():
     if not audience_text:
         return jsonify({"error": "Audience text is required"}), 400
 
-    try:
-        suggestion = ai_service_instance.analyze_audience(audience_text)
-        return jsonify({"suggestion": suggestion})
-    except Exception as e:
-        current_app.logger.error(f"AI audience analysis failed: {e}")
-        return jsonify({"error": "Failed to analyze audience"}), 500
+    return enqueue_ai_job("analyze_audience", _analyze_audience_job, audience_text, use_cache(data),
+                          error_message="Failed to analyze audience")
 
 
 
@@ -106,23 +267,8 @@ def suggest_structure_route():
     if not topic:
         return jsonify({"error": "Topic is required"}), 400
 
-    try:
-        structure = ai_service_instance.suggest_course_structure(topic)
-        # Add specific handling for workflow automation topics if needed
-        if "workflow automation" in topic.lower():
-            # Potentially modify or add specific modules/lessons for this topic
-            structure["modules"].append({
-                "title": "Module 4: Identifying Automation Opportunities (AI)",
-                "lessons": [
-                    "4.1: Exercise: List Your Top 5 Tasks",
-                    "4.2: Analyzing Tasks for Automation Potential",
-                    "4.3: Prioritizing Opportunities"
-                ]
-            })
-        return jsonify({"suggested_structure": structure})
-    except Exception as e:
-        current_app.logger.error(f"AI structure suggestion failed: {e}")
-        return jsonify({"error": "Failed to suggest structure"}), 500
+    return enqueue_ai_job("suggest_structure", _suggest_structure_job, topic, use_cache(data),
+                          error_message="Failed to suggest structure")
 
 
 
@@ -137,16 +283,8 @@ def explain_concept_route():
     if not concept_key:
         return jsonify({"error": "Concept key is required"}), 400
 
-    try:
-        explanation = ai_service_instance.explain_concept(concept_key)
-        # Basic markdown processing (replace **text** with <strong>text</strong>)
-        # In a real app, use a proper Markdown library
-        explanation = explanation.replace("**", "<strong>", 1).replace("**", "</strong>", 1)
-        explanation = explanation.replace("*", "<em>", 1).replace("*", "</em>", 1)
-        return jsonify({"explanation": explanation})
-    except Exception as e:
-        current_app.logger.error(f"AI explanation failed for key {concept_key}: {e}")
-        return jsonify({"error": "Failed to get explanation"}), 500
+    return enqueue_ai_job("explain", _explain_concept_job, concept_key, use_cache(data),
+                          error_message="Failed to get explanation")
 
 @ai_bp.route("/suggest_image_concept", methods=["POST"])
 @login_required
@@ -158,10 +296,128 @@ def suggest_image_concept_route():
     if not context:
         return jsonify({"error": "Context is required"}), 400
 
-    try:
-        suggestion = ai_service_instance.suggest_image_concept(context)
-        return jsonify({"suggestion": suggestion})
-    except Exception as e:
-        current_app.logger.error(f"AI image concept suggestion failed: {e}")
-        return jsonify({"error": "Failed to suggest image concept"}), 500
-
+    return enqueue_ai_job("suggest_image_concept", _suggest_image_concept_job, context, use_cache(data),
+                          error_message="Failed to suggest image concept")
+
+
+# --- Course-wide batch generation --- #
+# Drafts a text block and a quiz block for every lesson of a course in one job.
+# Every provider call (text and quiz separately) fans out over a pool, so the
+# job takes roughly as long as the slowest single call rather than the sum.
+# The pool is shared by all batch jobs in the process, so AI_BATCH_CONCURRENCY
+# caps the upstream calls in flight however many jobs run at once.
+
+_batch_executor = None
+_batch_executor_pid = None
+_batch_executor_lock = threading.Lock()
+
+def _get_batch_executor(max_workers):
+    global _batch_executor, _batch_executor_pid
+    with _batch_executor_lock:
+        if _batch_executor is None or _batch_executor_pid != os.getpid():
+            _batch_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-batch")
+            _batch_executor_pid = os.getpid()
+        return _batch_executor
+
+def _generate_all_job(course_id, lessons, concurrency, use_cache=True):
+    """Generate drafts for ``lessons`` [(id, title)] and store them as new ContentBlocks."""
+    progress = {"total": len(lessons), "done": 0, "failed": 0,
+                "lessons": {str(lesson_id): "pending" for lesson_id, _ in lessons}}
+    ai_job_queue.report_progress(progress)
+
+    pool = _get_batch_executor(concurrency)
+    service = get_ai_service()
+    futures = {}
+    for lesson_id, title in lessons:
+        futures[pool.submit(service.generate_lesson_text, title, use_cache=use_cache)] = (lesson_id, "text")
+        futures[pool.submit(service.generate_quiz, title, use_cache=use_cache)] = (lesson_id, "quiz")
+
+    # A lesson is done once both its calls are; either failing fails the lesson
+    results = {lesson_id: {} for lesson_id, _ in lessons}
+    failed = set()
+    for future in as_completed(futures):
+        lesson_id, part = futures[future]
+        try:
+            results[lesson_id][part] = future.result()
+        except Exception as e:
+            current_app.logger.error(f"AI batch generation of {part} failed for lesson {lesson_id}: {e}")
+            if lesson_id in failed:
+                continue
+            failed.add(lesson_id)
+            progress["failed"] += 1
+            progress["lessons"][str(lesson_id)] = "error"
+        else:
+            if lesson_id in failed or len(results[lesson_id]) < 2:
+                continue
+            progress["done"] += 1
+            progress["lessons"][str(lesson_id)] = "done"
+        ai_job_queue.report_progress(progress)
+    drafts = {lesson_id: (parts["text"], parts["quiz"]) for lesson_id, parts in results.items()
+              if lesson_id not in failed}
+
+    # Lessons deleted while the job ran are skipped, so the rest still get their drafts
+    existing = {row[0] for row in
+                db.session.query(Lesson.id).join(Module, Lesson.module_id == Module.id)
+                .filter(Module.course_id == course_id, Lesson.id.in_(list(drafts)))}
+    deleted = sorted(set(drafts) - existing)
+    for lesson_id in deleted:
+        del drafts[lesson_id]
+        progress["lessons"][str(lesson_id)] = "deleted"
+
+    # Append after each lesson's existing blocks, all in one transaction
+    max_positions = dict(
+        db.session.query(ContentBlock.lesson_id, func.max(ContentBlock.position))
+        .filter(ContentBlock.lesson_id.in_(list(drafts)))
+        .group_by(ContentBlock.lesson_id)
+        .all()
+    )
+    new_blocks = {}
+    for lesson_id, (text, quiz) in drafts.items():
+        text_position = key_between(max_positions.get(lesson_id), None)
+        text_block = ContentBlock(lesson_id=lesson_id, type="text",
+                                  data=json.dumps({"html": f"<p>{escape(text)}</p>"}), position=text_position)
+        quiz_block = ContentBlock(lesson_id=lesson_id, type="quiz",
+                                  data=json.dumps(quiz), position=key_between(text_position, None))
+        db.session.add_all([text_block, quiz_block])
+        new_blocks[lesson_id] = (text_block, quiz_block)
+    # Bump the revision so cached public pages of the course go stale
+    Course.query.filter_by(id=course_id).update({"updated_at": datetime.utcnow(),
+                                                 "revision": Course.revision + 1})
+    db.session.commit()
+
+    return {
+        "course_id": course_id,
+        "created_blocks": 2 * len(new_blocks),
+        "deleted_lessons": deleted,
+        "lessons": [
+            {"lesson_id": lesson_id,
+             "status": progress["lessons"][str(lesson_id)],
+             "block_ids": [b.id for b in new_blocks.get(lesson_id, ())]}
+            for lesson_id, _ in lessons
+        ],
+    }
+
+@ai_bp.route("/course/<int:course_id>/generate_all", methods=["POST"])
+@login_required
+def generate_all_route(course_id):
+    """Endpoint to draft text and quiz blocks for every lesson of a course."""
+    course = Course.query.filter_by(id=course_id, user_id=current_user.id).first()
+    if course is None:
+        return jsonify({"error": "Course not found"}), 404
+
+    data = request.get_json(silent=True) or {}
+    lessons = (
+        db.session.query(Lesson.id, Lesson.title)
+        .join(Module, Lesson.module_id == Module.id)
+        .filter(Module.course_id == course.id)
+        .order_by(Module.position, Lesson.position)
+        .all()
+    )
+    if not lessons:
+        return jsonify({"error": "Course has no lessons"}), 400
+
+    concurrency = current_app.config.get("AI_BATCH_CONCURRENCY", 8)
+    # Two provider calls per lesson; the limiter caps the charge at the burst size
+    return enqueue_ai_job("generate_all", _generate_all_job, course.id,
+                          [tuple(row) for row in lessons], concurrency, use_cache(data),
+                          error_message="Failed to generate course content", cost=2 * len(lessons))
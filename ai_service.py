@@ -1,9 +1,16 @@
 # /home/ubuntu/mini-course-creator/ai_service.py
 
+import functools
 import os
+import threading
 import time # Placeholder for simulating API delay
 import random # For placeholder variety
 
+from ai_providers import ProviderError, make_provider
+from cache import ai_response_cache
+from coalesce import ai_coalescer
+from metrics import ai_call_metrics
+
 # In a real scenario, you would import and initialize an AI client:
 # from some_ai_library import AIClient
 # client = AIClient(api_key=os.getenv("AI_API_KEY"))
@@ -15,12 +22,76 @@ import random # For placeholder variety
 #     print("AI_API_KEY loaded successfully.")
     # client = AIClient(api_key=api_key)
 
+def cached(method_name):
+    """
+    Serve an AIService method from ai_response_cache when possible.
+
+    Callers can bypass the cache for a single call with ``use_cache=False``.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, use_cache=True, **kwargs):
+            cache = ai_response_cache
+            if not (use_cache and cache.enabled and cache.ttl_for(method_name)):
+                return fn(self, *args, **kwargs)
+            key = cache.make_key(method_name, args, kwargs)
+            value = cache.get(method_name, key)
+            if value is None:
+                value = fn(self, *args, **kwargs)
+                cache.set(method_name, key, value)
+            return value
+        return wrapper
+    return decorator
+
+
+def coalesced(method_name):
+    """
+    Let concurrent identical calls share one upstream call (see coalesce.py).
+
+    Applied under ``@cached``, so only cache misses get here.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            key = ai_response_cache.make_key(method_name, args, kwargs)
+            return ai_coalescer.call(method_name, key, lambda: fn(self, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+# --- Prompts (used when a provider is configured; see ai_providers.py) --- #
+SYSTEM_PROMPTS = {
+    "generate_lesson_text": "You write draft lesson text for short online mini-courses. "
+                            "Reply with two or three short, plain-text paragraphs: simple language, "
+                            "one key idea, one concrete example, one actionable tip.",
+    "generate_quiz": "You write one quiz question that checks a mini-course lesson. Reply with a JSON "
+                     'object: {"question": str, "type": "MCQ" or "TF", "options": [str, ...], '
+                     '"correct_answer": index of the right option}.',
+    "suggest_course_structure": "You outline mini-courses. Reply with a JSON object: "
+                                '{"modules": [{"title": str, "lessons": [str, ...]}, ...]} with 3-5 '
+                                "modules of 2-4 lessons each.",
+    "analyze_outcome": "You review a mini-course's learning outcome. In one or two sentences starting "
+                       "with 'Suggestion:', say how to make it more specific and measurable.",
+    "analyze_audience": "You review a mini-course's target audience description. In one or two sentences "
+                        "starting with 'Suggestion:', say what detail about the audience is missing.",
+    "suggest_image_concept": "You suggest images for a lesson. In one or two sentences, describe an image "
+                             "or diagram that would support the lesson text.",
+}
+
+
 class AIService:
     """Provides methods to interact with AI models for course creation assistance."""
 
-    def __init__(self):
-        """Initializes the AI service. Placeholder for API client setup."""
-        pass
+    def __init__(self, provider=None, first_chunk_delay=None, chunk_delay=None):
+        """``provider`` answers the calls (see ai_providers.py); None uses the placeholders."""
+        self.provider = provider
+        # Streaming simulation: time before the first chunk and between chunks (seconds)
+        if first_chunk_delay is None:
+            first_chunk_delay = float(os.getenv("AI_STUB_FIRST_CHUNK_DELAY", "0.3"))
+        if chunk_delay is None:
+            chunk_delay = float(os.getenv("AI_STUB_CHUNK_DELAY", "0.05"))
+        self.first_chunk_delay = first_chunk_delay
+        self.chunk_delay = chunk_delay
 
     def _simulate_api_call(self, duration_seconds=2):
         """Simulates the delay of an external API call."""
@@ -28,13 +99,47 @@ class AIService:
         time.sleep(duration_seconds)
         print("Simulation complete.")
 
+    def _simulate_stream(self, text: str):
+        """Simulates a streamed completion, yielding ``text`` a word at a time."""
+        time.sleep(self.first_chunk_delay)
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.chunk_delay)
+            yield word if i == len(words) - 1 else word + " "
+
+    @ai_call_metrics("generate_lesson_text")
+    @cached("generate_lesson_text")
+    @coalesced("generate_lesson_text")
     def generate_lesson_text(self, prompt: str) -> str:
         """
         Generates draft lesson text content based on a prompt.
         Placeholder implementation.
         """
+        if self.provider is not None:
+            return self.provider.complete(SYSTEM_PROMPTS["generate_lesson_text"], prompt)
         print(f"AI Service: Received prompt for text generation: {prompt}")
         self._simulate_api_call(2)
+        return self._placeholder_lesson_text(prompt)
+
+    @ai_call_metrics("stream_lesson_text")
+    def stream_lesson_text(self, prompt: str):
+        """
+        Streaming variant of generate_lesson_text.
+        Yields text chunks as they arrive and returns the full text.
+        """
+        if self.provider is not None:
+            source = self.provider.stream(SYSTEM_PROMPTS["generate_lesson_text"], prompt)
+        else:
+            print(f"AI Service: Received prompt for streamed text generation: {prompt}")
+            source = self._simulate_stream(self._placeholder_lesson_text(prompt))
+        chunks = []
+        for chunk in source:
+            chunks.append(chunk)
+            yield chunk
+        return "".join(chunks)
+
+    def _placeholder_lesson_text(self, prompt: str) -> str:
         # Placeholder response with some variation
         responses = [
             f"Based on 	'{prompt}	', here's a starting point: Focus on the core concept first. Explain it simply, then provide one clear example. Remember to keep it brief and actionable.",
@@ -43,13 +148,49 @@ class AIService:
         ]
         return random.choice(responses)
 
+    @ai_call_metrics("generate_quiz")
+    @cached("generate_quiz")
+    @coalesced("generate_quiz")
     def generate_quiz(self, context: str) -> dict:
         """
         Generates a quiz (question, type, options, answer) based on context.
         Placeholder implementation.
         """
+        if self.provider is not None:
+            return self._provider_quiz(context)
         print(f"AI Service: Received context for quiz generation: {context}")
         self._simulate_api_call(2)
+        return self._placeholder_quiz(context)
+
+    @ai_call_metrics("stream_quiz")
+    def stream_quiz(self, context: str):
+        """
+        Streaming variant of generate_quiz.
+        Yields the question text in chunks and returns the complete quiz dict.
+        """
+        if self.provider is not None:
+            # A partial JSON object is no use to the editor, so the quiz arrives in one chunk
+            quiz = self._provider_quiz(context)
+            yield quiz["question"]
+            return quiz
+        print(f"AI Service: Received context for streamed quiz generation: {context}")
+        quiz = self._placeholder_quiz(context)
+        yield from self._simulate_stream(quiz["question"])
+        return quiz
+
+    def _provider_quiz(self, context: str) -> dict:
+        quiz = self.provider.complete(SYSTEM_PROMPTS["generate_quiz"], context, json_mode=True)
+        if not isinstance(quiz, dict):
+            raise ProviderError("AI provider returned a malformed quiz")
+        options = quiz.get("options")
+        if (not isinstance(quiz.get("question"), str) or not isinstance(options, list) or len(options) < 2
+                or not isinstance(quiz.get("correct_answer"), int)
+                or not 0 <= quiz["correct_answer"] < len(options)):
+            raise ProviderError("AI provider returned a malformed quiz")
+        return {"question": quiz["question"], "type": quiz.get("type", "MCQ"),
+                "options": [str(o) for o in options], "correct_answer": quiz["correct_answer"]}
+
+    def _placeholder_quiz(self, context: str) -> dict:
         # Placeholder response (MCQ)
         quiz_options = [
             {
@@ -71,8 +212,19 @@ class AIService:
         ]
         return random.choice(quiz_options)
 
+    @ai_call_metrics("suggest_course_structure")
+    @cached("suggest_course_structure")
+    @coalesced("suggest_course_structure")
     def suggest_course_structure(self, topic: str) -> dict:
         """Generates suggested course structure (modules/lessons) based on a topic."""
+        if self.provider is not None:
+            structure = self.provider.complete(SYSTEM_PROMPTS["suggest_course_structure"], topic, json_mode=True)
+            modules = structure.get("modules") if isinstance(structure, dict) else None
+            if not isinstance(modules, list) or not all(
+                    isinstance(m, dict) and isinstance(m.get("lessons"), list) for m in modules):
+                raise ProviderError("AI provider returned a malformed course structure")
+            return {"modules": [{"title": str(m.get("title", "")), "lessons": [str(l) for l in m["lessons"]]}
+                                for m in modules]}
         print(f"AI Service: Received topic for structure suggestion: {topic}")
         self._simulate_api_call(2)
         # Placeholder structure
@@ -84,8 +236,13 @@ class AIService:
             ]
         }
 
+    @ai_call_metrics("analyze_outcome")
+    @cached("analyze_outcome")
+    @coalesced("analyze_outcome")
     def analyze_outcome(self, outcome_text: str) -> str:
         """Analyzes learning outcome text for specificity and clarity."""
+        if self.provider is not None:
+            return self.provider.complete(SYSTEM_PROMPTS["analyze_outcome"], outcome_text, max_tokens=200)
         print(f"AI Service: Received outcome for analysis: {outcome_text}")
         self._simulate_api_call(1)
         suggestions = [
@@ -98,8 +255,13 @@ class AIService:
         else:
             return random.choice(suggestions)
 
+    @ai_call_metrics("analyze_audience")
+    @cached("analyze_audience")
+    @coalesced("analyze_audience")
     def analyze_audience(self, audience_text: str) -> str:
         """Analyzes target audience text for clarity and detail."""
+        if self.provider is not None:
+            return self.provider.complete(SYSTEM_PROMPTS["analyze_audience"], audience_text, max_tokens=200)
         print(f"AI Service: Received audience for analysis: {audience_text}")
         self._simulate_api_call(1)
         suggestions = [
@@ -112,10 +274,15 @@ class AIService:
         else:
             return random.choice(suggestions)
 
+    @ai_call_metrics("explain_concept")
+    @cached("explain_concept")
+    @coalesced("explain_concept")
     def explain_concept(self, concept_key: str) -> str:
         """Provides an explanation for a specific concept key."""
-        print(f"AI Service: Received request to explain concept: {concept_key}")
-        self._simulate_api_call(0.5)
+        # The explanations are curated text below; only the placeholder mode fakes a delay
+        if self.provider is None:
+            print(f"AI Service: Received request to explain concept: {concept_key}")
+            self._simulate_api_call(0.5)
         explanations = {
             "bp1_specificity": "**Best Practice #1: Hyper-Specificity.** Your learning outcome should define a single, concrete skill or ability the learner will gain. Avoid vague terms. *Example:* Instead of 'Understand marketing', use 'Be able to write a compelling headline for a Facebook ad'.",
             "bp2_audience": "**Best Practice #2: Audience Awareness.** Define exactly who this course is for. What's their starting knowledge? What problem are they trying to solve? Tailoring content makes it much more effective.",
@@ -129,14 +296,31 @@ class AIService:
         }
         return explanations.get(concept_key, "Explanation not found for this concept. Please check the concept key.")
 
+    @ai_call_metrics("suggest_image_concept")
+    @cached("suggest_image_concept")
+    @coalesced("suggest_image_concept")
     def suggest_image_concept(self, context: str) -> str:
         """Suggests image concepts based on lesson context."""
+        if self.provider is not None:
+            return self.provider.complete(SYSTEM_PROMPTS["suggest_image_concept"], context, max_tokens=200)
         print(f"AI Service: Received context for image suggestion: {context}")
         self._simulate_api_call(1)
         # Simple placeholder based on context
         keywords = context.split()[:5] # Take first few words
         return f"Based on 	'{context[:50]}...	', consider images illustrating: {', '.join(keywords)}. Or perhaps a diagram showing a key process?"
 
-# Instantiate the service for use in the Flask app
-ai_service_instance = AIService()
+# Created on first use so importing the app stays cheap (and nothing is set up
+# in a gunicorn master that would then be shared by forked workers)
+_ai_service = None
+_ai_service_lock = threading.Lock()
+
+
+def get_ai_service() -> AIService:
+    """The process-wide AIService, created on first call."""
+    global _ai_service
+    if _ai_service is None:
+        with _ai_service_lock:
+            if _ai_service is None:
+                _ai_service = AIService(provider=make_provider())
+    return _ai_service
 
@@ -0,0 +1,165 @@
+# ai_stub_server.py
+"""
+Local stand-in for an OpenAI-compatible chat completions API.
+
+Use it to load-test the AI paths offline, with realistic latency, streaming
+and failures, and without a per-request TLS handshake or a provider bill::
+
+    python ai_stub_server.py --port 8089 --latency-ms 800 --error-rate 0.02
+    AI_PROVIDER=openai AI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=x \
+        gunicorn -c gunicorn.conf.py wsgi:app
+
+It answers ``POST /v1/chat/completions`` over HTTP/1.1 keep-alive, both
+plain and ``"stream": true`` (SSE with chunked transfer encoding). Replies
+for JSON requests have the quiz or course-structure shape that the system
+prompt asks for. ``--rate-limit-rate`` and ``--error-rate`` make a share of
+requests fail with 429 (with Retry-After) or 500. Only the standard library
+is used.
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("learners practice each step with a short example then apply the idea to their own work "
+         "so the lesson stays focused on one outcome and ends with a clear next action").split()
+
+
+def _sample_text(n_words):
+    return " ".join(random.choice(WORDS) for _ in range(n_words)).capitalize() + "."
+
+
+def _json_reply(system):
+    if "quiz" in system.lower():
+        options = [_sample_text(3) for _ in range(3)]
+        return {"question": _sample_text(8)[:-1] + "?", "type": "MCQ", "options": options,
+                "correct_answer": random.randrange(len(options))}
+    if "modules" in system.lower():
+        return {"modules": [{"title": f"Module {m}: {_sample_text(3)[:-1]}",
+                             "lessons": [f"{m}.{l}: {_sample_text(4)[:-1]}" for l in range(1, 4)]}
+                            for m in range(1, 4)]}
+    return {"text": _sample_text(20)}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep connections open between requests
+    # Headers and body go out in separate writes; with Nagle on, the body waits
+    # for the client's delayed ACK and every reply gains ~40 ms
+    disable_nagle_algorithm = True
+    config = None                   # argparse namespace, set in make_server()
+
+    def log_message(self, format, *args):
+        if not self.config.quiet:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _latency(self):
+        cfg = self.config
+        return max(0.0, random.gauss(cfg.latency_ms, cfg.jitter_ms)) / 1000.0
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send_json(400, {"error": {"message": "invalid JSON body"}})
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            return self._send_json(404, {"error": {"message": f"no route {self.path}"}})
+
+        roll = random.random()
+        if roll < self.config.rate_limit_rate:
+            return self._send_json(429, {"error": {"message": "rate limited (stub)"}},
+                                   {"Retry-After": str(self.config.retry_after)})
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            time.sleep(self._latency() / 4)
+            return self._send_json(500, {"error": {"message": "upstream error (stub)"}})
+
+        messages = request.get("messages") or [{}]
+        system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+        json_mode = (request.get("response_format") or {}).get("type") == "json_object"
+        content = json.dumps(_json_reply(system)) if json_mode else _sample_text(random.randint(40, 80))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = request.get("model", "stub")
+
+        if request.get("stream"):
+            return self._stream(completion_id, model, content)
+
+        time.sleep(self._latency())
+        self._send_json(200, {
+            "id": completion_id, "object": "chat.completion", "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": sum(len(str(m.get("content", "")).split()) for m in messages),
+                      "completion_tokens": len(content.split())},
+        })
+
+    def _stream(self, completion_id, model, content):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(self._latency())   # time to first token
+        words = content.split(" ")
+        try:
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(self.config.chunk_delay_ms / 1000.0)
+                event = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word},
+                                      "finish_reason": None}]}
+                self._write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")   # end of chunked body
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True   # the client went away mid-stream
+
+
+def make_server(argv=None):
+    """Parse stub options from ``argv`` and return the (not yet serving) server."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=800, help="mean time to reply / first token")
+    parser.add_argument("--jitter-ms", type=float, default=200, help="standard deviation of the latency")
+    parser.add_argument("--chunk-delay-ms", type=float, default=20, help="gap between streamed words")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered 429")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After sent with 429s (seconds)")
+    parser.add_argument("--quiet", action="store_true", help="don't log each request")
+    config = parser.parse_args(argv)
+
+    StubHandler.config = config
+    server = ThreadingHTTPServer((config.host, config.port), StubHandler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    server = make_server(argv)
+    config = StubHandler.config
+    print(f"AI stub server on http://{config.host}:{config.port}/v1 "
+          f"(latency {config.latency_ms:.0f}±{config.jitter_ms:.0f}ms, "
+          f"errors {config.error_rate:.0%}, 429s {config.rate_limit_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+# bench/__init__.py
+"""
+Reproducible benchmarks for the editor, viewer and AI paths.
+
+::
+
+    python -m bench --shape medium --out bench-results.json
+    python -m bench --shape medium --baseline bench-baseline.json   # exit 1 on regression
+    python -m bench --shape large --only viewer.render,editor.tree
+
+Each run builds a fresh app in a temporary instance folder (SQLite database,
+caches, metrics), seeds synthetic users and courses of the chosen shape (see
+seed.py), then drives the routes in-process with Flask's test client, so
+results don't depend on network or server settings. The AI routes go
+through the real OpenAI-compatible provider against ``ai_stub_server.py``
+with zero latency: that measures our overhead (queueing, polling, SSE,
+the rate limiter, cache and coalescer paths), not the model's.
+
+The JSON report has p50/p95/p99 latency and SQL queries per request for
+every scenario (see scenarios.py). ``--baseline`` compares it with an
+earlier report and lists regressions.
+"""
@@ -0,0 +1,58 @@
+# bench/__main__.py
+"""Command line for the benchmarks: ``python -m bench --help``."""
+import argparse
+import json
+import sys
+
+from bench.runner import compare, run
+from bench.scenarios import SCENARIOS
+from bench.seed import SHAPES, Shape
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench",
+                                     description="Benchmark the editor, viewer and AI routes.")
+    parser.add_argument("--shape", choices=sorted(SHAPES), default="small", help="seeded data size")
+    for field in Shape._fields:
+        parser.add_argument(f"--{field}", type=int, help=f"override the shape's {field}")
+    parser.add_argument("--iterations", type=int, default=100, help="timed runs per scenario")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed runs per scenario first")
+    parser.add_argument("--seed", type=int, default=0, help="seed for data and request choices")
+    parser.add_argument("--only", help="comma-separated scenario names (default: all)")
+    parser.add_argument("--list", action="store_true", help="list scenario names and exit")
+    parser.add_argument("--out", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="compare with this earlier report; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 growth (0.25 = 25%%; p95 may grow twice as much)")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(s.name for s in SCENARIOS))
+        return 0
+
+    shape = SHAPES[args.shape]._replace(**{f: getattr(args, f) for f in Shape._fields
+                                           if getattr(args, f) is not None})
+    only = set(args.only.split(",")) if args.only else None
+    # Progress goes to stderr so stdout can be the report
+    report = run(shape, args.iterations, args.warmup, args.seed, only,
+                 log=lambda message: print(message, file=sys.stderr))
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(json.load(f), report, args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        if problems:
+            return 1
+        print(f"No regressions against {args.baseline}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+# bench/runner.py
+"""Build a throwaway app, seed it, time every scenario, and compare reports."""
+import gc
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from bench.scenarios import SCENARIOS, BenchError, Context
+from bench.seed import seed
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(sorted_values, p):
+    """Linear interpolation between closest ranks (``p`` in 0..100)."""
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * p / 100.0
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(durations_ms, queries, requests, errors):
+    durations = sorted(durations_ms)
+    stats = {"n": len(durations), "errors": errors}
+    if durations:
+        stats.update({
+            "mean_ms": round(sum(durations) / len(durations), 3),
+            "p50_ms": round(percentile(durations, 50), 3),
+            "p95_ms": round(percentile(durations, 95), 3),
+            "p99_ms": round(percentile(durations, 99), 3),
+            "max_ms": round(durations[-1], 3),
+            "queries_per_request": round(sum(queries) / max(1, sum(requests)), 2),
+            "max_queries_per_op": max(queries),
+            "requests_per_op": round(sum(requests) / len(durations), 2),
+        })
+    return stats
+
+
+class _QueryCounter:
+    """Counts SQL statements issued by the benchmark thread (not the AI job threads)."""
+
+    def __init__(self):
+        self.count = 0
+        self.thread = threading.get_ident()
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self.thread:
+            self.count += 1
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _start_ai_stub():
+    """Zero-latency OpenAI-compatible stub on a free port; returns the server."""
+    from ai_stub_server import make_server
+
+    server = make_server(["--port", "0", "--latency-ms", "0", "--jitter-ms", "0",
+                          "--chunk-delay-ms", "0", "--quiet"])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _configure_environment(instance_path, stub_port):
+    # Everything the app writes goes to the temporary instance folder
+    os.environ.pop("DATABASE_URL", None)
+    os.environ.update({
+        "INSTANCE_PATH": instance_path,
+        "AUTO_MIGRATE": "1",
+        "AI_PROVIDER": "openai",
+        "AI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1",
+        "OPENAI_API_KEY": "bench",
+        # A benchmark is one user hammering the AI routes; don't throttle it
+        "AI_RATE_LIMIT_ENABLED": "0",
+        "QUERY_PROFILER": "0",
+    })
+
+
+def run(shape, iterations=100, warmup=10, seed_value=0, only=None, log=print):
+    """Run the scenarios named in ``only`` (all by default) and return the report dict."""
+    scenarios = [s for s in SCENARIOS if not only or s.name in only]
+    unknown = set(only or ()) - {s.name for s in SCENARIOS}
+    if unknown:
+        raise ValueError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    instance_path = tempfile.mkdtemp(prefix="minicourse-bench-")
+    stub = _start_ai_stub()
+    try:
+        _configure_environment(instance_path, stub.server_address[1])
+        from sqlalchemy import event
+        from main import create_app, db
+
+        app = create_app()
+        with app.app_context():
+            log(f"Seeding {shape} ...")
+            started = time.perf_counter()
+            seeded = seed(shape, seed_value)
+            seed_seconds = time.perf_counter() - started
+            log(f"Seeded in {seed_seconds:.1f}s")
+            user_id = seeded[0][0]
+
+        counter = _QueryCounter()
+        with app.app_context():
+            event.listen(db.engine, "after_cursor_execute", counter)
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["_user_id"] = str(user_id)
+            session["_fresh"] = True
+        with app.app_context():
+            ctx = Context(client, user_id, random.Random(seed_value))
+
+        results = {}
+        for scenario in scenarios:
+            durations, queries, requests, errors = [], [], [], 0
+            gc.collect()   # don't bill this scenario for the previous one's garbage
+            for i in range(warmup + iterations):
+                try:
+                    if scenario.prepare:
+                        scenario.prepare(ctx, i)
+                    counter.count, ctx.requests = 0, 0
+                    started = time.perf_counter()
+                    scenario.run(ctx, i)
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                except BenchError as e:
+                    errors += 1
+                    if errors == 1:
+                        log(f"  {scenario.name}: {e}")
+                    continue
+                if i >= warmup:
+                    durations.append(elapsed_ms)
+                    queries.append(counter.count)
+                    requests.append(ctx.requests)
+            results[scenario.name] = summarize(durations, queries, requests, errors)
+            stats = results[scenario.name]
+            log(f"  {scenario.name:28} p50 {stats.get('p50_ms', 0):8.2f} ms  p95 {stats.get('p95_ms', 0):8.2f} ms  "
+                f"p99 {stats.get('p99_ms', 0):8.2f} ms  q/req {stats.get('queries_per_request', 0):6.2f}"
+                + (f"  errors {errors}" if errors else ""))
+
+        return {
+            "meta": {
+                "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "git_revision": _git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "shape": shape._asdict(),
+                "iterations": iterations,
+                "warmup": warmup,
+                "seed": seed_value,
+                "seed_seconds": round(seed_seconds, 3),
+            },
+            "scenarios": results,
+        }
+    finally:
+        stub.shutdown()
+        shutil.rmtree(instance_path, ignore_errors=True)
+
+
+def compare(baseline, current, tolerance=0.25, min_delta_ms=2.0):
+    """
+    Regressions of ``current`` against ``baseline`` (both report dicts), as messages.
+
+    Latency regresses when p50 grows by more than ``tolerance``, or p95 by more
+    than twice that, and by at least ``min_delta_ms`` in either case. Tails are
+    noisier than medians, and p99 over a hundred samples is too noisy to gate
+    on at all. Queries regress when a request makes half a query more on
+    average: an N+1 adds at least one, while polling AI jobs only moves the
+    average a little.
+    """
+    problems = []
+    if baseline["meta"].get("shape") != current["meta"].get("shape"):
+        problems.append(f"shape differs from the baseline ({baseline['meta'].get('shape')}); "
+                        f"latencies are not comparable")
+    for name, now in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if not before or "p95_ms" not in before or "p95_ms" not in now:
+            continue
+        for key, allowed in (("p50_ms", tolerance), ("p95_ms", 2 * tolerance)):
+            if now[key] > before[key] * (1 + allowed) and now[key] - before[key] >= min_delta_ms:
+                problems.append(f"{name}: {key} {before[key]:.2f} -> {now[key]:.2f} "
+                                f"(+{(now[key] / before[key] - 1) * 100:.0f}%)")
+        if now["queries_per_request"] >= before["queries_per_request"] + 0.5:
+            problems.append(f"{name}: queries per request {before['queries_per_request']} "
+                            f"-> {now['queries_per_request']}")
+        if now["errors"] > before.get("errors", 0):
+            problems.append(f"{name}: errors {before.get('errors', 0)} -> {now['errors']}")
+    return problems
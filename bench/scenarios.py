@@ -0,0 +1,213 @@
+# bench/scenarios.py
+"""
+What a benchmark run exercises.
+
+A scenario is one user-visible operation. ``run(ctx, i)`` is timed, and its
+SQL statements are counted. It may make more than one request: AI jobs are
+submitted and then polled until they finish. ``prepare(ctx, i)``, if given,
+runs untimed first, e.g. to create the block that a delete scenario removes.
+"""
+import time
+from collections import namedtuple
+
+Scenario = namedtuple("Scenario", "name run prepare")
+
+JOB_TIMEOUT_SECONDS = 30
+
+
+class BenchError(Exception):
+    """A request in a scenario failed; the sample is counted as an error."""
+
+
+class Context:
+    """The logged-in bench user's seeded data, plus helpers for making requests."""
+
+    def __init__(self, client, user_id, rng):
+        from course import Course, Lesson, Module, ContentBlock
+        from main import db
+
+        self.client = client
+        self.rng = rng
+        self.requests = 0
+        courses = Course.query.filter_by(user_id=user_id).order_by(Course.id).all()
+        self.course_ids = [c.id for c in courses]
+        self.share_ids = [c.share_id for c in courses]
+        self.module_ids = [row[0] for row in db.session.query(Module.id)
+                           .filter(Module.course_id.in_(self.course_ids)).order_by(Module.id)]
+        self.lesson_ids = [row[0] for row in db.session.query(Lesson.id)
+                           .join(Module).filter(Module.course_id.in_(self.course_ids)).order_by(Lesson.id)]
+        lesson_course = dict(db.session.query(Lesson.id, Module.course_id).join(Module)
+                             .filter(Lesson.id.in_(self.lesson_ids)))
+        self.share_by_lesson = {lesson_id: self.share_ids[self.course_ids.index(course_id)]
+                                for lesson_id, course_id in lesson_course.items()}
+        # Writes go to a few lessons of their own so reads see a stable course
+        self.scratch_lesson = self.lesson_ids[-1]
+        self.reorder_lesson = self.lesson_ids[-2] if len(self.lesson_ids) > 1 else self.lesson_ids[-1]
+        self.reorder_blocks = [row[0] for row in db.session.query(ContentBlock.id)
+                               .filter_by(lesson_id=self.reorder_lesson).order_by(ContentBlock.position)]
+        self.scratch_module = self.module_ids[-1]
+        self.added_blocks = []
+        self.added_lessons = []
+
+    def request(self, method, path, **kwargs):
+        self.requests += 1
+        response = self.client.open(path, method=method, **kwargs)
+        response.get_data()   # streamed bodies are produced here, inside the timing
+        if response.status_code >= 400:
+            raise BenchError(f"{method} {path} -> {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response
+
+    def wait_for_job(self, response):
+        """Poll the job behind a 202 response until it is done; returns its result."""
+        status_url = response.get_json()["status_url"]
+        give_up_at = time.monotonic() + JOB_TIMEOUT_SECONDS
+        while time.monotonic() < give_up_at:
+            job = self.request("GET", status_url).get_json()
+            if job["status"] == "done":
+                return job.get("result")
+            if job["status"] == "error":
+                raise BenchError(f"AI job failed: {job.get('error')}")
+            time.sleep(0.005)
+        raise BenchError("AI job did not finish in time")
+
+
+# --- Viewer --- #
+
+def _clear_page_cache():
+    from main_routes import page_cache
+    page_cache.clear()
+
+
+def viewer_render(ctx, i):
+    _clear_page_cache()
+    ctx.request("GET", f"/course/{ctx.rng.choice(ctx.share_ids)}")
+
+
+def viewer_lesson(ctx, i):
+    _clear_page_cache()
+    lesson_id = ctx.rng.choice(ctx.lesson_ids)
+    ctx.request("GET", f"/course/{ctx.share_by_lesson[lesson_id]}?item_type=lesson&item_id={lesson_id}")
+
+
+def viewer_cached(ctx, i):
+    ctx.request("GET", f"/course/{ctx.share_ids[0]}")
+
+
+def dashboard(ctx, i):
+    ctx.request("GET", "/dashboard")
+
+
+# --- Editor --- #
+
+def editor_page(ctx, i):
+    ctx.request("GET", f"/editor/course/{ctx.rng.choice(ctx.course_ids)}")
+
+
+def editor_tree(ctx, i):
+    ctx.request("GET", f"/editor/api/course/{ctx.rng.choice(ctx.course_ids)}/tree")
+
+
+def editor_lesson_details(ctx, i):
+    ctx.request("GET", f"/editor/api/lesson/{ctx.rng.choice(ctx.lesson_ids)}/details")
+
+
+def editor_add_module(ctx, i):
+    ctx.request("POST", f"/editor/course/{ctx.course_ids[-1]}/modules")
+
+
+def editor_add_lesson(ctx, i):
+    response = ctx.request("POST", f"/editor/module/{ctx.scratch_module}/lessons")
+    ctx.added_lessons.append(response.get_json()["lesson"]["id"])
+
+
+def editor_add_block(ctx, i):
+    response = ctx.request("POST", f"/editor/lesson/{ctx.scratch_lesson}/blocks", json={"block_type": "text"})
+    ctx.added_blocks.append(response.get_json()["block"]["id"])
+
+
+def editor_update_block(ctx, i):
+    ctx.request("PUT", f"/editor/block/{ctx.rng.choice(ctx.reorder_blocks)}",
+                json={"content": {"html": f"<p>Edited {i}</p>"}})
+
+
+def editor_reorder(ctx, i):
+    ctx.request("POST", "/editor/reorder", json={"item_type": "block", "item_id": ctx.rng.choice(ctx.reorder_blocks),
+                                                 "new_order": 1 + i % len(ctx.reorder_blocks)})
+
+
+def editor_reorder_bulk(ctx, i):
+    ctx.reorder_blocks.reverse()
+    ctx.request("POST", "/editor/reorder/bulk", json={"item_type": "block", "parent_id": ctx.reorder_lesson,
+                                                      "ordered_ids": ctx.reorder_blocks})
+
+
+def _ensure_added_block(ctx, i):
+    if not ctx.added_blocks:
+        editor_add_block(ctx, i)
+
+
+def editor_delete_block(ctx, i):
+    ctx.request("DELETE", f"/editor/block/{ctx.added_blocks.pop()}")
+
+
+def _ensure_added_lesson(ctx, i):
+    if not ctx.added_lessons:
+        editor_add_lesson(ctx, i)
+
+
+def editor_delete_lesson(ctx, i):
+    ctx.request("DELETE", f"/editor/lesson/{ctx.added_lessons.pop()}")
+
+
+# --- AI (zero-latency provider stub) --- #
+
+def ai_generate_text(ctx, i):
+    # A new prompt each time (and no cache) so every call goes to the provider
+    response = ctx.request("POST", "/ai/generate_text", json={"prompt": f"Bench lesson {i} {ctx.rng.random()}",
+                                                              "cache": False})
+    ctx.wait_for_job(response)
+
+
+def ai_generate_text_stream(ctx, i):
+    ctx.request("POST", "/ai/generate_text", json={"prompt": f"Bench stream {i} {ctx.rng.random()}",
+                                                   "stream": True, "cache": False})
+
+
+def ai_generate_text_cached(ctx, i):
+    ctx.wait_for_job(ctx.request("POST", "/ai/generate_text", json={"prompt": "Bench cached prompt"}))
+
+
+def ai_generate_quiz(ctx, i):
+    response = ctx.request("POST", "/ai/generate_quiz", json={"context": f"Bench quiz {i} {ctx.rng.random()}",
+                                                              "cache": False})
+    ctx.wait_for_job(response)
+
+
+def ai_suggest_structure(ctx, i):
+    response = ctx.request("POST", "/ai/suggest_structure", json={"topic": f"Bench topic {i} {ctx.rng.random()}",
+                                                                  "cache": False})
+    ctx.wait_for_job(response)
+
+
+SCENARIOS = [
+    Scenario("viewer.render", viewer_render, None),
+    Scenario("viewer.lesson", viewer_lesson, None),
+    Scenario("viewer.cached", viewer_cached, None),
+    Scenario("dashboard", dashboard, None),
+    Scenario("editor.page", editor_page, None),
+    Scenario("editor.tree", editor_tree, None),
+    Scenario("editor.lesson_details", editor_lesson_details, None),
+    Scenario("editor.add_module", editor_add_module, None),
+    Scenario("editor.add_lesson", editor_add_lesson, None),
+    Scenario("editor.add_block", editor_add_block, None),
+    Scenario("editor.update_block", editor_update_block, None),
+    Scenario("editor.reorder", editor_reorder, None),
+    Scenario("editor.reorder_bulk", editor_reorder_bulk, None),
+    Scenario("editor.delete_block", editor_delete_block, _ensure_added_block),
+    Scenario("editor.delete_lesson", editor_delete_lesson, _ensure_added_lesson),
+    Scenario("ai.generate_text", ai_generate_text, None),
+    Scenario("ai.generate_text_stream", ai_generate_text_stream, None),
+    Scenario("ai.generate_text_cached", ai_generate_text_cached, None),
+    Scenario("ai.generate_quiz", ai_generate_quiz, None),
+    Scenario("ai.suggest_structure", ai_suggest_structure, None),
+]
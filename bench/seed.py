@@ -0,0 +1,87 @@
+# bench/seed.py
+"""
+Synthetic users and courses for benchmarks.
+
+Courses are written through ``course_io.import_course``, the same batched
+path as a real import, so a 50k-block course seeds in a few seconds. The
+content comes from a seeded ``random.Random``, so the same shape and seed
+always give the same database.
+"""
+import json
+import random
+from collections import namedtuple
+
+BLOCK_MIX = (("text", 6), ("quiz", 2), ("image", 1), ("video", 1), ("action", 1))
+WORDS = ("course lesson learner practice example outcome module step idea review "
+         "question answer project habit skill focus plan draft feedback goal").split()
+
+
+# courses per user, modules per course, lessons per module, blocks per lesson
+Shape = namedtuple("Shape", "users courses modules lessons blocks")
+
+SHAPES = {
+    "small": Shape(users=2, courses=3, modules=4, lessons=3, blocks=4),
+    "medium": Shape(users=5, courses=4, modules=20, lessons=5, blocks=5),
+    # One course at the size the editor has to cope with: 1k modules, 50k blocks
+    "large": Shape(users=1, courses=1, modules=1000, lessons=5, blocks=10),
+}
+
+
+def _words(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def _block_content(rng, block_type):
+    if block_type == "quiz":
+        options = [_words(rng, 3) for _ in range(rng.randint(2, 4))]
+        return {"question": _words(rng, 8) + "?", "type": "mc", "options": options,
+                "correct_answer": rng.randrange(len(options))}
+    if block_type == "image":
+        return {"url": f"https://example.com/{rng.randrange(10 ** 6)}.png", "alt": _words(rng, 4)}
+    if block_type == "video":
+        return {"url": f"https://example.com/video/{rng.randrange(10 ** 6)}"}
+    return {"html": "".join(f"<p>{_words(rng, rng.randint(20, 60))}</p>" for _ in range(rng.randint(1, 3)))}
+
+
+def course_lines(shape, rng, title):
+    """One synthetic course in the course_io NDJSON format."""
+    import course_io
+
+    types = [t for t, weight in BLOCK_MIX for _ in range(weight)]
+    yield json.dumps({"type": "course", "format": course_io.FORMAT_NAME, "version": course_io.FORMAT_VERSION,
+                      "title": title, "description": _words(rng, 20), "outcome": _words(rng, 12),
+                      "audience": _words(rng, 8), "intro_content": f"<p>{_words(rng, 40)}</p>",
+                      "conclusion_content": f"<p>{_words(rng, 30)}</p>"})
+    for m in range(shape.modules):
+        yield json.dumps({"type": "module", "title": f"Module {m + 1}: {_words(rng, 3)}"})
+        for l in range(shape.lessons):
+            yield json.dumps({"type": "lesson", "title": f"Lesson {m + 1}.{l + 1}: {_words(rng, 4)}"})
+            for _ in range(shape.blocks):
+                block_type = rng.choice(types)
+                yield json.dumps({"type": "block", "block_type": block_type,
+                                  "content": _block_content(rng, block_type)})
+    yield json.dumps({"type": "end", "modules": shape.modules, "lessons": shape.modules * shape.lessons,
+                      "blocks": shape.modules * shape.lessons * shape.blocks})
+
+
+def seed(shape, seed=0):
+    """
+    Create ``shape.users`` users with their courses (call inside an app context).
+
+    Returns ``[(user_id, [course_id, ...]), ...]``.
+    """
+    import course_io
+    from main import db
+    from user import User
+
+    rng = random.Random(seed)
+    seeded = []
+    for u in range(shape.users):
+        user = User(name=f"Bench User {u + 1}", email=f"bench{u + 1}@example.com")
+        user.set_password("bench")
+        db.session.add(user)
+        db.session.commit()
+        course_ids = [course_io.import_course(course_lines(shape, rng, f"Bench course {u + 1}.{c + 1}"), user.id)[0]
+                      for c in range(shape.courses)]
+        seeded.append((user.id, course_ids))
+    return seeded
@@ -0,0 +1,227 @@
+# cache.py
+"""
+Small caching building blocks.
+
+``LRUTTLCache`` is a bounded in-process cache with per-entry expiry.
+``SQLiteCacheStore`` is the same idea on disk, so every gunicorn worker on a
+machine can share entries. ``AIResponseCache`` layers the two in front of
+AIService calls.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+_MISSING = object()
+
+
+class LRUTTLCache:
+    """Thread-safe LRU cache whose entries also expire after a TTL."""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._data = OrderedDict()   # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        if expires_at is None and ttl is not None:
+            expires_at = time.time() + ttl
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCacheStore:
+    """
+    On-disk LRU+TTL store shared by every process on the host.
+
+    Connections are per thread and per process (sqlite3 connections must not
+    cross a fork), and WAL mode lets readers proceed while a writer commits.
+    """
+
+    def __init__(self, path, maxsize=10000):
+        self.path = path
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connect(self):
+        # Opened lazily: the file and table are only created on first use
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_accessed_at ON cache (accessed_at)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """Return ``(value, expires_at)`` or ``None`` if missing or expired."""
+        conn = self._connect()
+        row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] is not None and row[1] <= now:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return row
+
+    def set(self, key, value, expires_at=None):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, value, expires_at, time.time()),
+        )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.prune()
+
+    def prune(self):
+        """Drop expired rows, then the least recently used ones beyond ``maxsize``."""
+        conn = self._connect()
+        conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM cache WHERE key IN ("
+            " SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,),
+        )
+
+    def clear(self):
+        self._connect().execute("DELETE FROM cache")
+
+
+def normalize_input(value):
+    """Normalize call arguments so trivially different inputs share a cache key."""
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    if isinstance(value, dict):
+        return {k: normalize_input(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [normalize_input(v) for v in value]
+    return value
+
+
+class AIResponseCache:
+    """
+    Two-level (memory, then SQLite) cache for AIService results.
+
+    Keys are (method, normalized input, model/config version). A method whose
+    TTL is 0 or missing is never cached.
+    """
+
+    DEFAULT_TTLS = {
+        "explain_concept": 24 * 3600,
+        "analyze_outcome": 3600,
+        "analyze_audience": 3600,
+        "suggest_course_structure": 3600,
+        "suggest_image_concept": 600,
+        # Users press "AI Generate" again because they want a different draft
+        "generate_lesson_text": 0,
+        "generate_quiz": 0,
+    }
+
+    def __init__(self, maxsize=512, ttls=None, version="1", store=None, enabled=True):
+        self.memory = LRUTTLCache(maxsize)
+        self.store = store
+        self.ttls = dict(self.DEFAULT_TTLS, **(ttls or {}))
+        self.version = version
+        self.enabled = enabled
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    def init_app(self, app):
+        self.enabled = app.config.get("AI_CACHE_ENABLED", self.enabled)
+        self.memory = LRUTTLCache(app.config.get("AI_CACHE_SIZE", self.memory.maxsize))
+        self.ttls = dict(self.DEFAULT_TTLS, **app.config.get("AI_CACHE_TTLS", {}))
+        self.version = app.config.get("AI_MODEL_VERSION", self.version)
+        store_path = app.config.get("AI_CACHE_PATH")
+        self.store = SQLiteCacheStore(store_path, app.config.get("AI_CACHE_DISK_SIZE", 10000)) if store_path else None
+
+    def ttl_for(self, method):
+        return self.ttls.get(method) or 0
+
+    def make_key(self, method, args, kwargs):
+        raw = json.dumps([method, normalize_input(list(args)), normalize_input(kwargs), self.version],
+                         sort_keys=True, default=str)
+        return f"{method}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+    def get(self, method, key, default=None):
+        """Return the cached value for ``key`` (a fresh copy), or ``default``."""
+        raw = self.memory.get(key)
+        if raw is None and self.store is not None:
+            row = self.store.get(key)
+            if row is not None:
+                raw = row[0]
+                self.memory.set(key, raw, expires_at=row[1])
+        if raw is None:
+            self.misses[method] += 1
+            return default
+        self.hits[method] += 1
+        # Stored as JSON, so callers may mutate what they get back
+        return json.loads(raw)
+
+    def set(self, method, key, value):
+        ttl = self.ttl_for(method)
+        if not ttl:
+            return
+        raw = json.dumps(value)
+        expires_at = time.time() + ttl
+        self.memory.set(key, raw, expires_at=expires_at)
+        if self.store is not None:
+            self.store.set(key, raw, expires_at)
+
+    def stats(self):
+        methods = sorted(set(self.hits) | set(self.misses))
+        return {
+            "enabled": self.enabled,
+            "version": self.version,
+            "memory_entries": len(self.memory),
+            "memory_evictions": self.memory.evictions,
+            "methods": {m: {"hits": self.hits[m], "misses": self.misses[m]} for m in methods},
+        }
+
+
+# Shared instance used by ai_service.py; configured in create_app()
+ai_response_cache = AIResponseCache()
@@ -0,0 +1,239 @@
+# cli.py
+"""Maintenance commands, run with ``flask --app wsgi <command>``."""
+import os
+
+import click
+from flask.cli import AppGroup
+
+from main import db
+
+positions_cli = AppGroup("positions", help="Fractional sort key maintenance.")
+
+
+@positions_cli.command("convert")
+def convert_positions_command():
+    """Convert legacy integer positions to fractional keys (keeps existing order)."""
+    from positions import convert_integer_positions
+
+    converted = convert_integer_positions()
+    if converted:
+        click.echo(f"Converted positions in: {', '.join(converted)}")
+    else:
+        click.echo("Positions are already fractional keys; nothing to do.")
+
+
+@positions_cli.command("rebalance")
+@click.option("--min-length", default=None, type=int,
+              help="Only rebalance sibling lists holding a key at least this long "
+                   "(default: POSITION_MAX_LENGTH).")
+def rebalance_positions_command(min_length):
+    """Rewrite over-long sibling keys to short, evenly spaced ones."""
+    from sqlalchemy import func
+    from positions import PARENT_COLUMNS, POSITION_MAX_LENGTH, rebalance_siblings
+
+    min_length = min_length or POSITION_MAX_LENGTH
+    for model, parent in PARENT_COLUMNS.items():
+        parent_ids = [row[0] for row in
+                      db.session.query(parent)
+                      .filter(func.length(model.position) >= min_length)
+                      .distinct()
+                      .all()]
+        for parent_id in parent_ids:
+            count = rebalance_siblings(model, parent_id)
+            click.echo(f"Rebalanced {count} {model.__tablename__} rows under parent {parent_id}")
+
+
+db_cli = AppGroup("db", help="Schema migrations (see migrations.py).")
+
+
+@db_cli.command("upgrade")
+def db_upgrade_command():
+    """Apply pending schema migrations."""
+    from flask import current_app
+    from migrations import upgrade
+
+    applied = upgrade(current_app)
+    click.echo(f"Applied: {', '.join(applied)}" if applied else "Database is up to date.")
+
+
+@db_cli.command("status")
+def db_status_command():
+    """List migrations not yet applied."""
+    from migrations import pending
+
+    waiting = pending()
+    for version, name in waiting:
+        click.echo(f"pending  {version:>3}  {name}")
+    if not waiting:
+        click.echo("Database is up to date.")
+
+
+@db_cli.command("check-plans")
+@click.option("--verbose", is_flag=True, help="Print every plan, not just the failing ones.")
+def db_check_plans_command(verbose):
+    """Fail if a hot editor/dashboard query would scan a table instead of using an index."""
+    from query_plans import check_query_plans
+
+    failures = 0
+    for name, plan, problems in check_query_plans():
+        click.echo(f"{'FAIL' if problems else 'ok  '}  {name}")
+        if problems or verbose:
+            for line in plan:
+                click.echo(f"        {line}")
+        failures += bool(problems)
+    if failures:
+        raise click.ClickException(f"{failures} queries are not fully served by indexes")
+
+
+search_cli = AppGroup("search", help="Full-text search index (see search.py).")
+
+
+@search_cli.command("rebuild")
+def search_rebuild_command():
+    """Drop and rebuild the search index from the course tables."""
+    from search import rebuild_search_index
+
+    click.echo(f"Indexed {rebuild_search_index()} documents.")
+
+
+render_cli = AppGroup("render", help="Pre-rendered lesson HTML (see lesson_render.py).")
+
+
+@render_cli.command("check")
+@click.option("--fix", is_flag=True, help="Re-render the stale lessons that are found.")
+def render_check_command(fix):
+    """Fail if a lesson's stored HTML doesn't match its blocks."""
+    from lesson_render import check_rendered_lessons
+
+    checked, stale = check_rendered_lessons(fix=fix)
+    for lesson_id in stale:
+        click.echo(f"{'fixed' if fix else 'stale'}  lesson {lesson_id}")
+    click.echo(f"Checked {checked} lessons, {len(stale)} stale.")
+    if stale and not fix:
+        raise click.ClickException(f"{len(stale)} lessons have stale HTML; run with --fix "
+                                   f"or `flask render rebuild`")
+
+
+@render_cli.command("rebuild")
+@click.option("--course-id", type=int, help="Only this course's lessons.")
+def render_rebuild_command(course_id):
+    """Re-render lessons from their blocks."""
+    from lesson_render import rebuild_rendered_lessons
+
+    click.echo(f"Rendered {rebuild_rendered_lessons(course_id)} lessons.")
+
+
+export_cli = AppGroup("export", help="Static-site exports (see export.py).")
+
+
+@export_cli.command("public")
+@click.option("--out", "out_dir", default="exports", show_default=True,
+              type=click.Path(file_okay=False), help="Directory for the ZIP bundles.")
+@click.option("--processes", default=os.cpu_count() or 1, show_default=True, type=int)
+def export_public_command(out_dir, processes):
+    """Export every shared course as course-<share_id>.zip, spread across processes."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from course import Course
+    from export import export_in_worker, init_export_worker
+
+    os.makedirs(out_dir, exist_ok=True)
+    courses = db.session.query(Course.id, Course.share_id).filter(Course.share_id.isnot(None)).all()
+    db.session.remove()
+    # "spawn" so no worker inherits this process's database connections
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=init_export_worker) as pool:
+        futures = [pool.submit(export_in_worker, course_id, os.path.join(out_dir, f"course-{share_id}.zip"))
+                   for course_id, share_id in courses]
+        for future in as_completed(futures):
+            course_id, size = future.result()
+            click.echo(f"course {course_id}: {size} bytes")
+    click.echo(f"Exported {len(courses)} courses to {out_dir}")
+
+
+course_cli = AppGroup("course", help="Course import/export in the NDJSON format (see course_io.py).")
+
+
+@course_cli.command("export")
+@click.argument("course_id", type=int)
+@click.option("--out", "out_file", type=click.File("wb"), default="-",
+              help="File to write (default: stdout).")
+def course_export_command(course_id, out_file):
+    """Write one course as NDJSON."""
+    from course import Course
+    from course_io import iter_course_json
+
+    if db.session.get(Course, course_id) is None:
+        raise click.ClickException(f"No course {course_id}")
+    for line in iter_course_json(course_id):
+        out_file.write(line)
+
+
+@course_cli.command("import")
+@click.argument("path", type=click.File("rb"))
+@click.option("--user-id", required=True, type=int, help="Owner of the new course.")
+def course_import_command(path, user_id):
+    """Create a course from an NDJSON export."""
+    from user import User
+    from course_io import CourseImportError, import_course
+
+    if db.session.get(User, user_id) is None:
+        raise click.ClickException(f"No user {user_id}")
+    try:
+        course_id, counts = import_course(path, user_id)
+    except CourseImportError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Imported course {course_id}: {counts['modules']} modules, "
+               f"{counts['lessons']} lessons, {counts['blocks']} blocks")
+
+
+# Run in a fresh interpreter: time a cold `import wsgi`, then check that
+# startup opened no database connections.
+STARTUP_PROBE = """
+import time
+started = time.perf_counter()
+import wsgi
+elapsed = time.perf_counter() - started
+from main import db
+with wsgi.app.app_context():
+    opened = db.engine.pool.checkedin()
+print(elapsed, opened)
+"""
+
+
+@click.command("startup-check")
+@click.option("--budget-ms", default=1500.0, show_default=True, type=float,
+              help="Maximum allowed median cold-start time.")
+@click.option("--runs", default=5, show_default=True, type=int)
+def startup_check_command(budget_ms, runs):
+    """Measure cold app startup and fail if it is over budget or has side effects."""
+    import statistics
+    import subprocess
+    import sys
+    from flask import current_app
+
+    env = dict(os.environ, AUTO_MIGRATE="0")
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", STARTUP_PROBE], cwd=current_app.root_path,
+                                env=env, capture_output=True, text=True, check=True)
+        elapsed, opened = result.stdout.split()[-2:]
+        timings.append(float(elapsed) * 1000)
+        if int(opened):
+            raise click.ClickException(f"Startup opened {opened} database connection(s)")
+
+    median = statistics.median(timings)
+    click.echo(f"Cold start: median {median:.0f} ms, best {min(timings):.0f} ms "
+               f"over {runs} runs (budget {budget_ms:.0f} ms)")
+    if median > budget_ms:
+        raise click.ClickException("Cold start is over budget")
+
+
+def register_cli(app):
+    app.cli.add_command(positions_cli)
+    app.cli.add_command(db_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(render_cli)
+    app.cli.add_command(export_cli)
+    app.cli.add_command(course_cli)
+    app.cli.add_command(startup_check_command)
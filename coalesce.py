@@ -0,0 +1,206 @@
+# coalesce.py
+"""
+Single-flight coalescing of identical AI calls.
+
+When the same AIService call (same method, same normalized input; see
+``AIResponseCache.make_key``) is already running, a new caller waits for it
+and shares its result instead of paying for a second upstream call.
+
+* Within a process, the first caller runs the call and the others wait on
+  an Event.
+* Across processes, that first caller also takes an exclusive ``flock`` on a
+  per-key lock file. A caller in another worker blocks on the same lock and,
+  once it gets it, picks up the result the previous holder left in a small
+  SQLite store. Only results that finished after the caller started waiting
+  are used, so this shares calls that were in flight and nothing older (the
+  response cache handles reuse over time).
+
+Counters per method show how many upstream calls ran and how many were
+saved (``local_hits`` + ``remote_hits``); see ``/ai/coalesce/stats``.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+try:
+    import fcntl
+except ImportError:          # Windows dev machines: coalesce within the process only
+    fcntl = None
+
+LOCK_POLL_SECONDS = 0.05
+RESULT_TTL_SECONDS = 300
+
+
+class _Flight:
+    """One upstream call in progress in this process."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None   # JSON, so each waiter gets its own copy
+        self.error = None
+
+
+class Coalescer:
+    def __init__(self, path=None, enabled=True, wait_timeout=60):
+        self.path = path   # SQLite result store; lock files go in "<path>.locks/"
+        self.enabled = enabled
+        self.wait_timeout = wait_timeout
+        self.counts = defaultdict(lambda: defaultdict(int))
+        self._local = threading.local()
+        self._reset()
+
+    def init_app(self, app):
+        self.enabled = app.config.get("AI_COALESCE_ENABLED", self.enabled)
+        self.path = app.config.get("AI_COALESCE_PATH", self.path)
+        self.wait_timeout = app.config.get("AI_COALESCE_WAIT_SECONDS", self.wait_timeout)
+
+    def _reset(self):
+        # In-flight calls belong to threads of the process that started them;
+        # a forked child starts with none
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._pid = os.getpid()
+        self._writes = 0
+
+    # --- Shared result store --- #
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS flight ("
+                         " key TEXT PRIMARY KEY, value TEXT NOT NULL, finished_at REAL NOT NULL)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _load(self, key, since):
+        row = self._connect().execute(
+            "SELECT value FROM flight WHERE key = ? AND finished_at >= ?", (key, since)).fetchone()
+        return row[0] if row else None
+
+    def _store(self, key, value):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO flight (key, value, finished_at) VALUES (?, ?, ?)",
+                     (key, value, now))
+        self._writes += 1
+        if self._writes % 100 == 0:
+            conn.execute("DELETE FROM flight WHERE finished_at < ?", (now - RESULT_TTL_SECONDS,))
+
+    # --- Cross-process lock --- #
+
+    def _lock_path(self, key):
+        return os.path.join(self.path + ".locks", hashlib.sha256(key.encode("utf-8")).hexdigest() + ".lock")
+
+    def _acquire_file_lock(self, path, deadline):
+        """Open and flock ``path``, waiting until ``deadline``; returns the fd or None on timeout."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        os.close(fd)
+                        return None
+                    time.sleep(LOCK_POLL_SECONDS)
+            # The previous holder unlinks the file on release; if that happened
+            # while we waited, we hold a lock nobody else can see. Start over.
+            try:
+                if os.stat(path).st_ino == os.fstat(fd).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    @staticmethod
+    def _release_file_lock(fd, path):
+        try:
+            os.unlink(path)   # keeps the lock directory from growing with every key
+        except FileNotFoundError:
+            pass
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def _call_shared(self, method, key, fn):
+        """Run ``fn`` unless another process is already running the same call; returns JSON."""
+        if fcntl is None or self.path is None:
+            self.counts[method]["upstream"] += 1
+            return json.dumps(fn())
+        waiting_since = time.time()
+        path = self._lock_path(key)
+        fd = self._acquire_file_lock(path, time.monotonic() + self.wait_timeout)
+        if fd is None:
+            self.counts[method]["timeouts"] += 1
+            self.counts[method]["upstream"] += 1
+            return json.dumps(fn())
+        try:
+            result = self._load(key, waiting_since)
+            if result is not None:
+                self.counts[method]["remote_hits"] += 1
+                return result
+            self.counts[method]["upstream"] += 1
+            result = json.dumps(fn())
+            self._store(key, result)
+            return result
+        finally:
+            self._release_file_lock(fd, path)
+
+    # --- Public API --- #
+
+    def call(self, method, key, fn):
+        """Return ``fn()``, sharing one execution among concurrent callers with the same ``key``."""
+        if not self.enabled:
+            return fn()
+        if self._pid != os.getpid():
+            self._reset()
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            if not flight.done.wait(self.wait_timeout):
+                self.counts[method]["timeouts"] += 1
+                self.counts[method]["upstream"] += 1
+                return fn()
+            if flight.error is not None:
+                raise flight.error
+            self.counts[method]["local_hits"] += 1
+            return json.loads(flight.result)
+
+        try:
+            flight.result = self._call_shared(method, key, fn)
+            return json.loads(flight.result)
+        except BaseException as e:
+            flight.error = e   # waiters fail too rather than stampeding upstream
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def stats(self):
+        methods = {m: dict(c) for m, c in sorted(self.counts.items())}
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._flights),
+            "methods": methods,
+            "saved_calls": sum(c.get("local_hits", 0) + c.get("remote_hits", 0) for c in methods.values()),
+        }
+
+
+# Shared instance used by ai_service.py; configured in create_app()
+ai_coalescer = Coalescer()
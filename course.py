@@ -1,4 +1,5 @@
 # course.py
+import json
 import uuid
 from datetime import datetime
 
@@ -15,6 +16,10 @@ def _uuid() -> str:
 
 class Course(db.Model):
     __tablename__ = "course"
+    __table_args__ = (
+        # dashboard: a user's courses, newest first (id breaks ties for paging)
+        db.Index("ix_course_user_updated", "user_id", "updated_at", "id"),
+    )
 
     id          = db.Column(db.Integer, primary_key=True)
     user_id     = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
@@ -36,6 +41,11 @@ class Course(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow,  nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow,
                            onupdate=datetime.utcnow,             nullable=False)
+    # Bumped by every write to the row (and by touch_course for child edits);
+    # keys the public page cache and ETag. updated_at can't: MySQL DATETIME
+    # drops fractional seconds, so two edits in one second would share it
+    revision   = db.Column(db.Integer, default=1, server_default="1",
+                           onupdate=db.literal_column("revision + 1"), nullable=False)
 
     # relationship back‑refs added in user.py
     modules = db.relationship("Module", backref="course", cascade="all, delete-orphan",
@@ -47,12 +57,17 @@ class Course(db.Model):
 
 class Module(db.Model):
     __tablename__ = "module"
+    __table_args__ = (
+        # sibling order, max(position) on append, and the FK scan on course delete
+        db.Index("ix_module_course_position", "course_id", "position"),
+    )
 
     id        = db.Column(db.Integer, primary_key=True)
     course_id = db.Column(db.Integer, db.ForeignKey("course.id"), nullable=False)
 
     title     = db.Column(db.String(120), nullable=False)
-    position  = db.Column(db.Integer,     nullable=False)  # order within the course
+    position  = db.Column(db.String(255), nullable=False)  # fractional sort key within the course (positions.py)
+    order     = db.synonym("position")  # name used by the editor API and templates
 
     lessons   = db.relationship("Lesson", backref="module", cascade="all, delete-orphan",
                                 order_by="Lesson.position")
@@ -63,12 +78,23 @@ class Module(db.Model):
 
 class Lesson(db.Model):
     __tablename__ = "lesson"
+    __table_args__ = (
+        db.Index("ix_lesson_module_position", "module_id", "position"),
+    )
 
     id        = db.Column(db.Integer, primary_key=True)
     module_id = db.Column(db.Integer, db.ForeignKey("module.id"), nullable=False)
 
     title     = db.Column(db.String(120), nullable=False)
-    position  = db.Column(db.Integer,     nullable=False)
+    position  = db.Column(db.String(255), nullable=False)
+    order     = db.synonym("position")
+
+    # The blocks rendered to HTML, and their embed metadata as JSON, kept
+    # current at write time by lesson_render.py. Deferred: only the viewer
+    # and export read them
+    rendered_html  = db.deferred(db.Column(db.Text))
+    embeds         = db.deferred(db.Column(db.Text))
+    render_version = db.Column(db.Integer)
 
     blocks    = db.relationship("ContentBlock", backref="lesson",
                                 cascade="all, delete-orphan",
@@ -80,10 +106,34 @@ class Lesson(db.Model):
 
 class ContentBlock(db.Model):
     __tablename__ = "content_block"
+    __table_args__ = (
+        db.Index("ix_content_block_lesson_position", "lesson_id", "position"),
+    )
 
     id        = db.Column(db.Integer, primary_key=True)      # ← complete line
     lesson_id = db.Column(db.Integer, db.ForeignKey("lesson.id"), nullable=False)
     type      = db.Column(db.String(32),  nullable=False)
     data      = db.Column(db.Text,        nullable=False)
-    position  = db.Column(db.Integer,     nullable=False)
+    position  = db.Column(db.String(255), nullable=False)
+    version   = db.Column(db.Integer, nullable=False, default=1, server_default="1")  # bumped on every content write
+
+    # the editor API speaks block_type / content / order
+    block_type = db.synonym("type")
+    order      = db.synonym("position")
+
+    @property
+    def content(self) -> dict:
+        """Block payload decoded from the JSON ``data`` column."""
+        return json.loads(self.data) if self.data else {}
+
+    @content.setter
+    def content(self, value: dict):
+        self.data = json.dumps(value)
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "block_type": self.type, "content": self.content,
+                "order": self.position, "version": self.version}
+
+    def __repr__(self):
+        return f"<ContentBlock {self.id} {self.type}>"
 
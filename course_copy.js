@@ -0,0 +1,18 @@
+// course_copy.js: "Duplicate" (dashboard) and "Use as Template" (view_course.html) buttons
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-copy-url]').forEach(button => {
+        button.addEventListener('click', async () => {
+            button.disabled = true;
+            try {
+                const response = await fetch(button.dataset.copyUrl, { method: 'POST' });
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                const data = await response.json();
+                window.location.href = data.edit_url;
+            } catch (error) {
+                console.error('Error copying course:', error);
+                alert('Could not copy the course. Please try again.');
+                button.disabled = false;
+            }
+        });
+    });
+});
@@ -0,0 +1,115 @@
+# course_copy.py
+"""
+Server-side course duplication.
+
+``copy_course`` clones a course's whole tree with one INSERT…SELECT per
+table, so a copy takes the same handful of round trips for a course of any
+size. New rows get fresh ids. Their parents are found by joining the source
+row's parent to the copy that has the same sort key: positions are unique
+among siblings, so (new parent, position) pins down each copied row.
+
+Legacy data can hold tied positions, which would make those joins fan out.
+Tied sibling lists get fresh distinct keys (order kept) in the copy only,
+through a CASE in the SELECT; the source course, which may belong to
+someone else, is never written.
+"""
+from datetime import datetime
+
+from sqlalchemy import case, func, insert, literal, select
+from sqlalchemy.orm import aliased
+
+from main import db
+from course import Course, Module, Lesson, ContentBlock, _uuid
+from positions import PARENT_COLUMNS, evenly_spaced_keys
+import search
+
+TITLE_MAX_LENGTH = 120
+
+
+def _duplicate_positions(course_id):
+    """(model, parent id) pairs in the course whose siblings share a position."""
+    module_ids = select(Module.id).where(Module.course_id == course_id)
+    lesson_ids = select(Lesson.id).where(Lesson.module_id.in_(module_ids))
+    checks = [
+        (Module, select(Module.course_id).where(Module.course_id == course_id)
+            .group_by(Module.course_id, Module.position).having(func.count() > 1)),
+        (Lesson, select(Lesson.module_id).where(Lesson.module_id.in_(module_ids))
+            .group_by(Lesson.module_id, Lesson.position).having(func.count() > 1)),
+        (ContentBlock, select(ContentBlock.lesson_id).where(ContentBlock.lesson_id.in_(lesson_ids))
+            .group_by(ContentBlock.lesson_id, ContentBlock.position).having(func.count() > 1)),
+    ]
+    return {(model, parent_id) for model, query in checks
+            for parent_id in db.session.execute(query).scalars()}
+
+
+def _untied_positions(course_id):
+    """model -> {id: key} giving every tied sibling list in the course distinct keys."""
+    overrides = {Module: {}, Lesson: {}, ContentBlock: {}}
+    for model, parent_id in _duplicate_positions(course_id):
+        ids = db.session.execute(select(model.id).where(PARENT_COLUMNS[model] == parent_id)
+                                 .order_by(model.position, model.id)).scalars().all()
+        overrides[model].update(zip(ids, evenly_spaced_keys(len(ids))))
+    return overrides
+
+
+def copy_course(source, user_id, title=None):
+    """
+    Copy ``source`` (a Course) and its modules, lessons and blocks to a new
+    course owned by ``user_id``. Returns the new course id; commits.
+    """
+    overrides = _untied_positions(source.id)
+
+    def position(row, model):
+        """The key ``row`` (a source row, possibly aliased) gets in the copy."""
+        if not overrides[model]:
+            return row.position
+        return case(overrides[model], value=row.id, else_=row.position)
+
+    now = datetime.utcnow()
+    connection = db.session.connection()
+    course_id = connection.execute(insert(Course).values(
+        user_id=user_id,
+        title=(title or source.title)[:TITLE_MAX_LENGTH],
+        description=source.description,
+        outcome=source.outcome,
+        audience=source.audience,
+        intro_content=source.intro_content,
+        conclusion_content=source.conclusion_content,
+        share_id=_uuid(),
+        created_at=now,
+        updated_at=now,
+    )).inserted_primary_key[0]
+
+    old_module, new_module = aliased(Module), aliased(Module)
+    old_lesson, new_lesson = aliased(Lesson), aliased(Lesson)
+
+    connection.execute(insert(Module).from_select(
+        ["course_id", "title", "position"],
+        select(literal(course_id), Module.title, position(Module, Module)).where(Module.course_id == source.id),
+    ))
+
+    new_module_for = (new_module.course_id == course_id) & (new_module.position == position(old_module, Module))
+    # Rendered HTML holds no ids (lesson_render.py), so it is copied as is
+    connection.execute(insert(Lesson).from_select(
+        ["module_id", "title", "position", "rendered_html", "embeds", "render_version"],
+        select(new_module.id, old_lesson.title, position(old_lesson, Lesson),
+               old_lesson.rendered_html, old_lesson.embeds, old_lesson.render_version)
+        .join(old_module, old_module.id == old_lesson.module_id)
+        .join(new_module, new_module_for)
+        .where(old_module.course_id == source.id),
+    ))
+
+    connection.execute(insert(ContentBlock).from_select(
+        ["lesson_id", "type", "data", "position", "version"],
+        select(new_lesson.id, ContentBlock.type, ContentBlock.data, position(ContentBlock, ContentBlock), literal(1))
+        .join(old_lesson, old_lesson.id == ContentBlock.lesson_id)
+        .join(old_module, old_module.id == old_lesson.module_id)
+        .join(new_module, new_module_for)
+        .join(new_lesson, (new_lesson.module_id == new_module.id)
+              & (new_lesson.position == position(old_lesson, Lesson)))
+        .where(old_module.course_id == source.id),
+    ))
+
+    search.reindex_course(course_id)
+    db.session.commit()
+    return course_id
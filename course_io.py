@@ -0,0 +1,268 @@
+# course_io.py
+"""
+Course import/export as newline-delimited JSON (one object per line).
+
+A file describes one course in reading order::
+
+    {"type": "course", "format": "mini-course", "version": 1, "title": ..., ...}
+    {"type": "module", "title": ...}
+    {"type": "lesson", "title": ...}
+    {"type": "block", "block_type": "text", "content": {...}}
+    ...
+    {"type": "end", "modules": 3, "lessons": 12, "blocks": 80}
+
+A lesson belongs to the module above it and a block to the lesson above it.
+Ids and sort keys are not part of the format; the import assigns new ones
+in file order. The ``end`` line lets the import tell a complete file from a
+truncated one.
+
+Both directions stream. The export reads blocks through one ordered cursor
+and writes a line per row. The import reads one line at a time and inserts
+in batches with executemany, all in one transaction, so a large course
+neither sits in memory nor goes through per-object ORM adds.
+"""
+import json
+
+from sqlalchemy import insert, select
+
+from main import db
+from course import Course, Module, Lesson, ContentBlock
+from positions import sequential_keys
+import search
+import lesson_render
+
+FORMAT_NAME = "mini-course"
+FORMAT_VERSION = 1
+
+COURSE_FIELDS = ("title", "description", "outcome", "audience", "intro_content", "conclusion_content")
+# Keep in step with editor.default_block_content
+BLOCK_TYPES = {"text", "image", "video", "quiz", "action"}
+TITLE_MAX_LENGTH = 120
+
+IMPORT_BATCH_SIZE = 500
+
+
+class CourseImportError(ValueError):
+    """The file isn't a valid course export; ``line`` is 1-based (None if not tied to one line)."""
+
+    def __init__(self, message, line=None):
+        super().__init__(f"line {line}: {message}" if line else message)
+        self.line = line
+
+
+# --- Export --- #
+
+def _line(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def iter_course_json(course_id):
+    """Yield the course as NDJSON lines (bytes)."""
+    course = db.session.get(Course, course_id)
+    header = {"type": "course", "format": FORMAT_NAME, "version": FORMAT_VERSION}
+    header.update((field, getattr(course, field)) for field in COURSE_FIELDS)
+    yield _line(header)
+
+    # Titles of the whole tree are small; blocks come through a single
+    # ordered cursor and are matched to their lesson as it goes past
+    modules = db.session.execute(
+        select(Module.id, Module.title).where(Module.course_id == course_id)
+        .order_by(Module.position, Module.id)).all()
+    lessons = db.session.execute(
+        select(Lesson.id, Lesson.module_id, Lesson.title)
+        .join(Module, Module.id == Lesson.module_id)
+        .where(Module.course_id == course_id)
+        .order_by(Module.position, Module.id, Lesson.position, Lesson.id)).all()
+    blocks = db.session.execute(
+        select(ContentBlock.lesson_id, ContentBlock.type, ContentBlock.data)
+        .join(Lesson, Lesson.id == ContentBlock.lesson_id)
+        .join(Module, Module.id == Lesson.module_id)
+        .where(Module.course_id == course_id)
+        .order_by(Module.position, Module.id, Lesson.position, Lesson.id,
+                  ContentBlock.position, ContentBlock.id)
+        .execution_options(yield_per=IMPORT_BATCH_SIZE))
+
+    block = next(blocks, None)
+    counts = {"modules": 0, "lessons": 0, "blocks": 0}
+    lesson_index = 0
+    for module_id, module_title in modules:
+        counts["modules"] += 1
+        yield _line({"type": "module", "title": module_title})
+        while lesson_index < len(lessons) and lessons[lesson_index].module_id == module_id:
+            lesson = lessons[lesson_index]
+            lesson_index += 1
+            counts["lessons"] += 1
+            yield _line({"type": "lesson", "title": lesson.title})
+            while block is not None and block.lesson_id == lesson.id:
+                counts["blocks"] += 1
+                yield _line({"type": "block", "block_type": block.type,
+                             "content": json.loads(block.data) if block.data else {}})
+                block = next(blocks, None)
+    blocks.close()
+    yield _line({"type": "end", **counts})
+
+
+def export_filename(course):
+    return f"course-{course.share_id}.ndjson"
+
+
+# --- Import --- #
+
+def _title(obj, number):
+    title = obj.get("title")
+    if not isinstance(title, str) or not title.strip():
+        raise CourseImportError(f"{obj['type']} needs a title", number)
+    if len(title) > TITLE_MAX_LENGTH:
+        raise CourseImportError(f"title is longer than {TITLE_MAX_LENGTH} characters", number)
+    return title
+
+
+def _read_lines(lines):
+    """(line number, object) for each non-blank line."""
+    for number, raw in enumerate(lines, 1):
+        if not raw.strip():
+            continue
+        try:
+            obj = json.loads(raw)
+        except ValueError as e:
+            raise CourseImportError(f"invalid JSON ({e})", number) from None
+        if not isinstance(obj, dict) or not isinstance(obj.get("type"), str):
+            raise CourseImportError("expected an object with a type", number)
+        yield number, obj
+
+
+class _Importer:
+    """Buffers lessons and blocks and writes them in executemany batches."""
+
+    def __init__(self, connection, course_id, batch_size):
+        self.connection = connection
+        self.course_id = course_id
+        self.batch_size = batch_size
+        self.counts = {"modules": 0, "lessons": 0, "blocks": 0}
+        self.module_id = None
+        self.module_keys = sequential_keys()
+        self.lesson_keys = None
+        self.block_keys = None
+        self.lessons = []   # rows waiting for ids
+        self.blocks = []    # (index into self.lessons, row)
+        # RETURNING lets a whole batch of lessons come back with ids in one round trip
+        self.returning = connection.dialect.insert_executemany_returning
+
+    def add_module(self, title):
+        self.flush()
+        self.module_id = self.connection.execute(insert(Module).values(
+            course_id=self.course_id, title=title, position=next(self.module_keys))).inserted_primary_key[0]
+        self.lesson_keys = sequential_keys()
+        self.block_keys = None
+        self.counts["modules"] += 1
+
+    def add_lesson(self, title):
+        self.lessons.append({"module_id": self.module_id, "title": title, "position": next(self.lesson_keys)})
+        self.block_keys = sequential_keys()
+        self.counts["lessons"] += 1
+        if len(self.lessons) >= self.batch_size:
+            self.flush(keep_last=True)
+
+    def add_block(self, block_type, content):
+        self.blocks.append((len(self.lessons) - 1, {
+            "type": block_type, "data": json.dumps(content), "position": next(self.block_keys), "version": 1,
+        }))
+        self.counts["blocks"] += 1
+        if len(self.blocks) >= self.batch_size:
+            self.flush(keep_last=True)
+
+    def flush(self, keep_last=False):
+        """Insert the buffered lessons, then their blocks."""
+        ids = self._insert_lessons(self.lessons)
+        if self.blocks:
+            rows = []
+            for index, row in self.blocks:
+                row["lesson_id"] = ids[index]
+                rows.append(row)
+            self.connection.execute(insert(ContentBlock), rows)
+        self.blocks = []
+        if keep_last and self.lessons:
+            # The current lesson may still get blocks; later ones refer to it by id
+            self.lessons = [ids[-1]]
+        else:
+            self.lessons = []
+
+    def _insert_lessons(self, lessons):
+        ids = [row for row in lessons if isinstance(row, int)]   # already inserted
+        pending = [row for row in lessons if not isinstance(row, int)]
+        if pending and self.returning:
+            # Rows may come back in any order. A batch never spans modules
+            # (add_module flushes), so the position key identifies each lesson.
+            result = self.connection.execute(insert(Lesson).returning(Lesson.position, Lesson.id), pending)
+            by_position = dict(result.all())
+            ids.extend(by_position[row["position"]] for row in pending)
+        else:
+            for row in pending:
+                ids.append(self.connection.execute(insert(Lesson).values(**row)).inserted_primary_key[0])
+        return ids
+
+
+def import_course(lines, user_id, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Create a course for ``user_id`` from an iterable of NDJSON lines.
+
+    Everything is written in one transaction; on any error nothing is kept and
+    CourseImportError says which line was wrong. Returns ``(course_id, counts)``.
+    """
+    try:
+        course_id, counts = _import(lines, user_id, batch_size)
+        search.reindex_course(course_id)
+        lesson_render.render_course(course_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return course_id, counts
+
+
+def _import(lines, user_id, batch_size):
+    objects = _read_lines(lines)
+    number, header = next(objects, (None, None))
+    if header is None:
+        raise CourseImportError("empty file")
+    if header.get("type") != "course" or header.get("format") != FORMAT_NAME:
+        raise CourseImportError(f"not a {FORMAT_NAME} course export", number)
+    if header.get("version") != FORMAT_VERSION:
+        raise CourseImportError(f"unsupported format version {header.get('version')!r}", number)
+
+    values = {field: header.get(field) for field in COURSE_FIELDS}
+    values["title"] = _title(header, number)
+    for field in COURSE_FIELDS:
+        if values[field] is not None and not isinstance(values[field], str):
+            raise CourseImportError(f"{field} must be a string", number)
+    connection = db.session.connection()
+    course_id = connection.execute(insert(Course).values(user_id=user_id, **values)).inserted_primary_key[0]
+    importer = _Importer(connection, course_id, batch_size)
+
+    for number, obj in objects:
+        kind = obj["type"]
+        if kind == "module":
+            importer.add_module(_title(obj, number))
+        elif kind == "lesson":
+            if importer.module_id is None:
+                raise CourseImportError("lesson before any module", number)
+            importer.add_lesson(_title(obj, number))
+        elif kind == "block":
+            if importer.block_keys is None:
+                raise CourseImportError("block before any lesson", number)
+            if obj.get("block_type") not in BLOCK_TYPES:
+                raise CourseImportError(f"invalid block_type {obj.get('block_type')!r}", number)
+            if not isinstance(obj.get("content"), dict):
+                raise CourseImportError("block content must be an object", number)
+            importer.add_block(obj["block_type"], obj["content"])
+        elif kind == "end":
+            importer.flush()
+            expected = {key: obj.get(key) for key in importer.counts}
+            if expected != importer.counts:
+                raise CourseImportError(f"counts {importer.counts} do not match the end line {expected}", number)
+            if next(objects, None) is not None:
+                raise CourseImportError("content after the end line")
+            return course_id, importer.counts
+        else:
+            raise CourseImportError(f"unknown type {kind!r}", number)
+    raise CourseImportError("file ends without an end line (truncated?)")
@@ -0,0 +1,30 @@
+// course_view.js: quiz checking on public course pages (view_course.html and static exports)
+document.addEventListener('DOMContentLoaded', function() {
+    // Add basic quiz checking functionality
+    const quizForms = document.querySelectorAll('.quiz-options');
+    quizForms.forEach(form => {
+        const checkButton = form.querySelector('.check-quiz-btn');
+        const feedbackDiv = form.querySelector('.quiz-feedback');
+        const correctAnswerIndex = form.dataset.correct;
+
+        checkButton.addEventListener('click', () => {
+            const selectedOption = form.querySelector('input[type="radio"]:checked');
+            feedbackDiv.textContent = ''; // Clear previous feedback
+            feedbackDiv.className = 'quiz-feedback'; // Reset class
+
+            if (!selectedOption) {
+                feedbackDiv.textContent = 'Please select an answer.';
+                feedbackDiv.classList.add('incorrect');
+                return;
+            }
+
+            if (selectedOption.value == correctAnswerIndex) {
+                feedbackDiv.textContent = 'Correct!';
+                feedbackDiv.classList.add('correct');
+            } else {
+                feedbackDiv.textContent = 'Incorrect. Try again!';
+                feedbackDiv.classList.add('incorrect');
+            }
+        });
+    });
+});
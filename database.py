@@ -0,0 +1,77 @@
+# database.py
+"""
+Database engine profiles.
+
+The profile comes from the DATABASE_URL scheme:
+
+* ``sqlite`` (default, ``instance/minicourse.db``): WAL journal so readers
+  don't block the writer, ``synchronous=NORMAL``, a busy timeout so
+  concurrent gunicorn workers wait for the write lock instead of failing with
+  "database is locked", plus a memory-mapped file and a larger page cache.
+  The pragmas are set on every new connection.
+* ``mysql``: PyMySQL driver with a bounded connection pool, pre-ping, and
+  recycling below the server's idle timeout.
+
+Every setting can be overridden through the environment (see ``DB_*`` below).
+"""
+import os
+import sqlite3
+
+from sqlalchemy import event
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": int(os.environ.get("DB_SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "mmap_size": int(os.environ.get("DB_SQLITE_MMAP_BYTES", 256 * 1024 * 1024)),
+    "cache_size": -int(os.environ.get("DB_SQLITE_CACHE_KB", 64 * 1024)),  # negative = KiB
+    "temp_store": "MEMORY",
+}
+
+
+def database_profile(uri: str) -> str:
+    return "mysql" if uri.startswith("mysql") else "sqlite"
+
+
+def configure_database(app, instance_path):
+    """Set SQLALCHEMY_DATABASE_URI and SQLALCHEMY_ENGINE_OPTIONS for the selected profile."""
+    uri = os.environ.get("DATABASE_URL") or f"sqlite:///{os.path.join(instance_path, 'minicourse.db')}"
+    profile = database_profile(uri)
+
+    if profile == "mysql":
+        if uri.startswith("mysql://"):
+            uri = "mysql+pymysql://" + uri[len("mysql://"):]
+        if "charset=" not in uri:
+            uri += ("&" if "?" in uri else "?") + "charset=utf8mb4"
+        options = {
+            "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+            "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 5)),
+            "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 10)),
+            "pool_pre_ping": True,
+            # Below MySQL's default wait_timeout and most proxies' idle cutoffs
+            "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 280)),
+        }
+    else:
+        options = {
+            # sqlite3's own lock wait, in seconds; busy_timeout below covers the rest
+            "connect_args": {"timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000},
+        }
+
+    app.config["DB_PROFILE"] = profile
+    app.config["SQLALCHEMY_DATABASE_URI"] = uri
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def install_engine_hooks(engine):
+    """Attach per-connection setup to ``engine`` (call before its first connection)."""
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _set_sqlite_pragmas)
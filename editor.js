@@ -44,8 +44,27 @@ document.addEventListener("DOMContentLoaded", function() {
         };
     }
 
+    // The whole course tree (modules → lessons → blocks), fetched once from
+    // /editor/api/course/<id>/tree so opening a lesson needs no extra request.
+    // Any write drops it; the next lesson view re-fetches it.
+    let courseTree = null;
+
+    async function getLessonFromTree(lessonId) {
+        if (!courseTree) {
+            courseTree = await apiRequest(`/editor/api/course/${courseId}/tree`);
+        }
+        for (const module of courseTree.modules) {
+            const lesson = module.lessons.find(l => String(l.id) === String(lessonId));
+            if (lesson) return lesson;
+        }
+        return null;
+    }
+
     // Function to make API requests (remains the same)
     async function apiRequest(url, method = "GET", body = null) {
+        if (method !== "GET") {
+            courseTree = null; // structure or content is changing
+        }
         const options = {
             method: method,
             headers: {
@@ -73,6 +92,82 @@ document.addEventListener("DOMContentLoaded", function() {
         }
     }
 
+    // --- Batched edits --- //
+    // Structural edits and saves are queued and sent together to /editor/batch,
+    // which applies them in one transaction. Items created client-side get a
+    // temporary id ("tmp-3") until the batch returns their server ids.
+    let pendingOps = [];
+    let pendingWaiters = [];
+    let flushChain = Promise.resolve();
+    let tempIdCounter = 0;
+    const serverIds = {}; // temp id -> server id
+
+    function newTempId() {
+        return `tmp-${++tempIdCounter}`;
+    }
+
+    function resolveId(id) {
+        return serverIds[id] || id;
+    }
+
+    function batchId(id) {
+        // Temp ids stay strings; server ids go over the wire as numbers
+        const resolved = resolveId(id);
+        return String(resolved).startsWith("tmp-") ? resolved : Number(resolved);
+    }
+
+    // Queue an operation; resolves with the temp → server id map once sent.
+    function queueOp(op, immediate = false) {
+        pendingOps.push(op);
+        const done = new Promise((resolve, reject) => pendingWaiters.push({ resolve, reject }));
+        if (immediate) {
+            flushOps();
+        } else {
+            scheduleFlush();
+        }
+        return done;
+    }
+
+    // Send everything queued so far. Batches go out one at a time so a batch
+    // never refers to temp ids an earlier, still in-flight batch is creating.
+    function flushOps() {
+        flushChain = flushChain.then(async () => {
+            if (!pendingOps.length) return;
+            const ops = pendingOps.map(op => {
+                const resolved = { ...op };
+                for (const field of ["id", "module_id", "lesson_id"]) {
+                    if (field in resolved) resolved[field] = batchId(resolved[field]);
+                }
+                return resolved;
+            });
+            const waiters = pendingWaiters;
+            pendingOps = [];
+            pendingWaiters = [];
+            try {
+                const data = await apiRequest("/editor/batch", "POST", { course_id: Number(courseId), ops });
+                Object.assign(serverIds, data.ids);
+                applyServerIds(data.ids);
+                waiters.forEach(w => w.resolve(data.ids));
+            } catch (error) {
+                waiters.forEach(w => w.reject(error));
+            }
+        });
+        return flushChain;
+    }
+
+    const scheduleFlush = debounce(flushOps, 500);
+
+    // Swap temp ids in the DOM for the server ids they were given
+    function applyServerIds(ids) {
+        for (const [tempId, serverId] of Object.entries(ids)) {
+            document.querySelectorAll(`[data-id="${tempId}"]`).forEach(el => { el.dataset.id = serverId; });
+            document.querySelectorAll(`[data-module-id="${tempId}"]`).forEach(el => { el.dataset.moduleId = serverId; });
+            editorPanel.querySelectorAll("input[name=\"current_module_id\"], input[name=\"current_lesson_id\"]").forEach(input => {
+                if (input.value === tempId) input.value = serverId;
+            });
+        }
+    }
+
     // Function to initialize Quill editor (remains the same)
     function initializeQuill(containerId, initialContent = "") {
         if (quillInstances[containerId]) {
@@ -128,6 +223,8 @@ document.addEventListener("DOMContentLoaded", function() {
     // --- Editor Panel Loading & Saving --- //
 
     async function loadEditorContent(itemType, itemId) {
+        await flushOps(); // the item may only exist in the queue so far
+        itemId = resolveId(itemId);
         console.log(`Loading editor content for ${itemType} ID: ${itemId}`);
         const editorPanels = {
             "course": document.getElementById("course-settings-view"),
@@ -152,7 +249,7 @@ document.addEventListener("DOMContentLoaded", function() {
                 targetPanel.querySelector("input[name=\"module_title\"]").value = data.title;
                 targetPanel.querySelector("input[name=\"current_module_id\"]").value = itemId;
             } else if (itemType === "lesson") {
-                const data = await apiRequest(`/editor/api/lesson/${itemId}/details`);
+                const data = (await getLessonFromTree(itemId)) || await apiRequest(`/editor/api/lesson/${itemId}/details`);
                 targetPanel.querySelector("input[name=\"lesson_title\"]").value = data.title;
                 targetPanel.querySelector("input[name=\"current_lesson_id\"]").value = itemId;
                 renderContentBlocks(itemId, data.blocks);
@@ -199,7 +296,7 @@ document.addEventListener("DOMContentLoaded", function() {
         const quill = quillInstances["intro-content-editor"];
         if (quill) {
             const content = quill.root.innerHTML;
-            await apiRequest(`/editor/course/${courseId}/intro`, "POST", { content });
+            await queueOp({ op: "update_intro", content }, true);
             alert("Introduction saved.");
         }
     });
@@ -209,7 +306,7 @@ document.addEventListener("DOMContentLoaded", function() {
         const quill = quillInstances["conclusion-content-editor"];
         if (quill) {
             const content = quill.root.innerHTML;
-            await apiRequest(`/editor/course/${courseId}/conclusion`, "POST", { content });
+            await queueOp({ op: "update_conclusion", content }, true);
             alert("Conclusion saved.");
         }
     });
@@ -219,9 +316,9 @@ document.addEventListener("DOMContentLoaded", function() {
         const moduleId = editorPanel.querySelector("input[name=\"current_module_id\"]").value;
         const title = editorPanel.querySelector("input[name=\"module_title\"]").value;
         if (moduleId && title) {
-            const data = await apiRequest(`/editor/module/${moduleId}`, "PUT", { title });
-            const moduleLi = structurePanel.querySelector(`li[data-type=\"module\"][data-id=\"${moduleId}\"] .item-title`);
-            if (moduleLi) moduleLi.textContent = data.module.title;
+            await queueOp({ op: "update_module", id: moduleId, title }, true);
+            const moduleLi = structurePanel.querySelector(`li[data-type=\"module\"][data-id=\"${resolveId(moduleId)}\"] .item-title`);
+            if (moduleLi) moduleLi.textContent = title;
             alert("Module title saved.");
         }
     });
@@ -231,9 +328,9 @@ document.addEventListener("DOMContentLoaded", function() {
         const lessonId = editorPanel.querySelector("input[name=\"current_lesson_id\"]").value;
         const title = editorPanel.querySelector("input[name=\"lesson_title\"]").value;
         if (lessonId && title) {
-            const data = await apiRequest(`/editor/lesson/${lessonId}`, "PUT", { title });
-            const lessonLi = structurePanel.querySelector(`li[data-type=\"lesson\"][data-id=\"${lessonId}\"] .item-title`);
-            if (lessonLi) lessonLi.textContent = data.lesson.title;
+            await queueOp({ op: "update_lesson", id: lessonId, title }, true);
+            const lessonLi = structurePanel.querySelector(`li[data-type=\"lesson\"][data-id=\"${resolveId(lessonId)}\"] .item-title`);
+            if (lessonLi) lessonLi.textContent = title;
             alert("Lesson title saved.");
         }
     });
@@ -247,8 +344,8 @@ document.addEventListener("DOMContentLoaded", function() {
             blocksArea.innerHTML = "<p>No content blocks yet. Add one below!</p>";
             return;
         }
-        // Sort blocks by order before rendering
-        blocks.sort((a, b) => a.order - b.order);
+        // Sort blocks by order before rendering (orders are fractional string keys)
+        blocks.sort((a, b) => (a.order < b.order ? -1 : a.order > b.order ? 1 : 0));
         blocks.forEach(block => {
             const blockElement = createBlockElement(lessonId, block);
             blocksArea.appendChild(blockElement);
@@ -261,6 +358,7 @@ document.addEventListener("DOMContentLoaded", function() {
         blockElement.dataset.blockId = block.id;
         blockElement.dataset.order = block.order;
         blockElement.dataset.blockType = block.block_type; // Add block type for AI targeting
+        savedBlocks[block.id] = { content: block.content, version: block.version };
 
         let editorHTML = "";
         let aiControlsHTML = ""; // To hold AI buttons/suggestions
@@ -278,9 +376,9 @@ document.addEventListener("DOMContentLoaded", function() {
                 editorHTML = `
                     <div class=\"block-editor form-group\">
                         <label>Image URL:</label>
-                        <input type=\"text\" class=\"form-control image-url\" value=\"${block.content.url || \"\"}\">
+                        <input type=\"text\" class=\"form-control image-url\" value=\"${block.content.url || ""}\">
                         <label>Alt Text:</label>
-                        <input type=\"text\" class=\"form-control image-alt\" value=\"${block.content.alt || \"\"}\">
+                        <input type=\"text\" class=\"form-control image-alt\" value=\"${block.content.alt || ""}\">
                     </div>`;
                 aiControlsHTML = `
                     <button type=\"button\" class=\"btn btn-info btn-sm ai-btn\" id=\"ai-suggest-image-btn\" title=\"Suggest image ideas based on lesson title\">🖼️ AI Suggest Image</button>
@@ -291,7 +389,7 @@ document.addEventListener("DOMContentLoaded", function() {
                 editorHTML = `
                     <div class=\"block-editor form-group\">
                         <label>Video URL (YouTube/Vimeo):</label>
-                        <input type=\"text\" class=\"form-control video-url\" value=\"${block.content.url || \"\"}\">
+                        <input type=\"text\" class=\"form-control video-url\" value=\"${block.content.url || ""}\">
                         <span class=\"tooltip-container\" data-concept=\"bp6_media\"><span class=\"tooltip-icon\">?</span><span class=\"tooltip-text\">Keep videos short (&lt; 5 mins)!</span></span>
                     </div>`;
                 // No AI controls for video currently
@@ -306,11 +404,11 @@ document.addEventListener("DOMContentLoaded", function() {
                 editorHTML = `
                     <div class=\"block-editor form-group quiz-editor\">
                         <label>Question:</label>
-                        <input type=\"text\" class=\"form-control quiz-question\" value=\"${block.content.question || \"\"}\">
+                        <input type=\"text\" class=\"form-control quiz-question\" value=\"${block.content.question || ""}\">
                         <label>Type:</label>
                         <select class=\"form-control quiz-type\">
-                            <option value=\"mc\" ${block.content.type === \"mc\" ? \"selected\" : \"\"}>Multiple Choice</option>
-                            <option value=\"tf\" ${block.content.type === \"tf\" ? \"selected\" : \"\"}>True/False</option>
+                            <option value=\"mc\" ${block.content.type === "mc" ? "selected" : ""}>Multiple Choice</option>
+                            <option value=\"tf\" ${block.content.type === "tf" ? "selected" : ""}>True/False</option>
                         </select>
                         <label>Options (Select Correct Answer):</label>
                         <div class=\"quiz-options-editor\">
@@ -415,21 +513,107 @@ document.addEventListener("DOMContentLoaded", function() {
         }
 
         try {
-            await apiRequest(`/editor/block/${blockId}`, "PUT", { content });
+            await flushOps(); // any queued structural edits go first
+            await saveBlockPatch(blockId, content);
             alert("Block saved.");
         } catch (error) {
-            // Error already handled by apiRequest
+            // Error already handled
+        }
+    }
+
+    // --- Block autosave via JSON Patch --- //
+    // Only the difference from the last saved content is sent, tagged with the
+    // version it was made against; the server answers with the new version.
+    const savedBlocks = {}; // block id -> { content, version } as last saved
+
+    function diffText(before, after, path) {
+        // Work in code points, which is what the server's offsets count
+        before = Array.from(before);
+        after = Array.from(after);
+        let start = 0;
+        while (start < before.length && start < after.length && before[start] === after[start]) start++;
+        let end = 0;
+        while (end < before.length - start && end < after.length - start &&
+               before[before.length - 1 - end] === after[after.length - 1 - end]) end++;
+        return [{ op: "splice", path, offset: start, remove: before.length - start - end,
+                  value: after.slice(start, after.length - end).join("") }];
+    }
+
+    function diffContent(before, after, path = "") {
+        if (typeof before === "string" && typeof after === "string") {
+            return before === after ? [] : diffText(before, after, path);
+        }
+        if (Array.isArray(before) && Array.isArray(after)) {
+            const ops = [];
+            const shared = Math.min(before.length, after.length);
+            for (let i = 0; i < shared; i++) ops.push(...diffContent(before[i], after[i], `${path}/${i}`));
+            for (let i = shared; i < after.length; i++) ops.push({ op: "add", path: `${path}/-`, value: after[i] });
+            for (let i = before.length - 1; i >= shared; i--) ops.push({ op: "remove", path: `${path}/${i}` });
+            return ops;
+        }
+        const isObject = v => v && typeof v === "object" && !Array.isArray(v);
+        if (isObject(before) && isObject(after)) {
+            const ops = [];
+            for (const key of Object.keys(after)) {
+                const childPath = `${path}/${key.replace(/~/g, "~0").replace(/\//g, "~1")}`;
+                if (key in before) {
+                    ops.push(...diffContent(before[key], after[key], childPath));
+                } else {
+                    ops.push({ op: "add", path: childPath, value: after[key] });
+                }
+            }
+            for (const key of Object.keys(before)) {
+                if (!(key in after)) ops.push({ op: "remove", path: `${path}/${key.replace(/~/g, "~0").replace(/\//g, "~1")}` });
+            }
+            return ops;
+        }
+        return before === after ? [] : [{ op: "replace", path, value: after }];
+    }
+
+    async function putBlock(blockId, body) {
+        courseTree = null; // content is changing
+        const response = await fetch(`/editor/block/${blockId}`, {
+            method: "PUT",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify(body),
+        });
+        const data = await response.json().catch(() => ({ message: response.statusText }));
+        return { status: response.status, data };
+    }
+
+    async function saveBlockPatch(blockId, content) {
+        const saved = savedBlocks[blockId];
+        const patch = saved ? diffContent(saved.content, content) : null;
+        if (patch && !patch.length) return; // nothing changed
+        let { status, data } = saved
+            ? await putBlock(blockId, { version: saved.version, patch })
+            : await putBlock(blockId, { content });
+
+        if (status === 409) {
+            // Changed in another tab or by a co-author since we loaded it
+            if (!confirm("This block was changed elsewhere. Overwrite it with your version?")) {
+                savedBlocks[blockId] = { content: data.content, version: data.version };
+                throw new Error("Save cancelled");
+            }
+            ({ status, data } = await putBlock(blockId, { version: data.version, content }));
+        }
+        if (status !== 200) {
+            alert(`Error: ${data.message || "Unknown error"}`);
+            throw new Error(data.message);
         }
+        savedBlocks[blockId] = { content, version: data.version ?? data.block.version };
     }
 
     // Delete Content Block
     async function deleteContentBlock(blockId, blockElement) {
         if (confirm("Are you sure you want to delete this content block?")) {
+            // Hidden until the batch is acknowledged, shown again if it fails
+            blockElement.style.display = "none";
             try {
-                await apiRequest(`/editor/block/${blockId}`, "DELETE");
+                await queueOp({ op: "delete_block", id: blockId });
                 blockElement.remove();
-                alert("Block deleted.");
             } catch (error) {
+                blockElement.style.display = "";
                 // Error handled by apiRequest
             }
         }
@@ -444,8 +628,12 @@ document.addEventListener("DOMContentLoaded", function() {
             return;
         }
         try {
-            const data = await apiRequest(`/editor/lesson/${lessonId}/blocks`, "POST", { block_type: blockType });
-            const newBlockElement = createBlockElement(lessonId, data.block);
+            // Sent straight away: the block's editor needs its server id and default content
+            const tempId = newTempId();
+            const ids = await queueOp({ op: "add_block", lesson_id: lessonId, block_type: blockType, temp_id: tempId }, true);
+            const data = await apiRequest(`/editor/api/lesson/${resolveId(lessonId)}/details`);
+            const block = data.blocks.find(b => b.id === ids[tempId]);
+            const newBlockElement = createBlockElement(lessonId, block);
             const blocksArea = document.getElementById("content-blocks-area");
             // Remove the "No content blocks yet" message if present
             const placeholder = blocksArea.querySelector("p");
@@ -479,14 +667,11 @@ document.addEventListener("DOMContentLoaded", function() {
         // Handle Add Lesson button
         if (target.classList.contains("add-lesson-btn")) {
             const moduleId = target.dataset.moduleId;
-            try {
-                const data = await apiRequest(`/editor/module/${moduleId}/lessons`, "POST");
-                const lessonList = structurePanel.querySelector(`.lesson-list[data-module-id=\"${moduleId}\"]`);
-                const newLessonLi = createStructureListItem("lesson", data.lesson);
-                lessonList.appendChild(newLessonLi);
-            } catch (error) {
-                // Error handled by apiRequest
-            }
+            const tempId = newTempId();
+            const lessonList = structurePanel.querySelector(`.lesson-list[data-module-id=\"${moduleId}\"]`);
+            const newLessonLi = createStructureListItem("lesson", { id: tempId, title: "New Lesson" });
+            lessonList.appendChild(newLessonLi);
+            queueOp({ op: "add_lesson", module_id: moduleId, temp_id: tempId }).catch(() => newLessonLi.remove());
         }
 
         // Handle Delete button
@@ -495,16 +680,14 @@ document.addEventListener("DOMContentLoaded", function() {
             const itemType = itemLi.dataset.type;
             const itemId = itemLi.dataset.id;
             if (confirm(`Are you sure you want to delete this ${itemType}?`)) {
-                try {
-                    await apiRequest(`/editor/${itemType}/${itemId}`, "DELETE");
-                    itemLi.remove();
-                    // If the deleted item was active, load default view (e.g., course settings)
-                    if (itemLi.classList.contains("active")) {
-                        structurePanel.querySelector("li[data-type=\"course\"]").click();
-                    }
-                } catch (error) {
-                    // Error handled by apiRequest
+                itemLi.remove();
+                // If the deleted item was active, load default view (e.g., course settings)
+                if (itemLi.classList.contains("active")) {
+                    structurePanel.querySelector("li[data-type=\"course\"]").click();
                 }
+                queueOp({ op: `delete_${itemType}`, id: itemId }).catch(() => {
+                    // Error handled by apiRequest
+                });
             }
         }
 
@@ -521,13 +704,10 @@ document.addEventListener("DOMContentLoaded", function() {
 
     // Add Module Button
     document.getElementById("add-module-btn")?.addEventListener("click", async () => {
-        try {
-            const data = await apiRequest(`/editor/course/${courseId}/modules`, "POST");
-            const newModuleLi = createStructureListItem("module", data.module);
-            moduleList.appendChild(newModuleLi);
-        } catch (error) {
-            // Error handled by apiRequest
-        }
+        const tempId = newTempId();
+        const newModuleLi = createStructureListItem("module", { id: tempId, title: "New Module" });
+        moduleList.appendChild(newModuleLi);
+        queueOp({ op: "add_module", temp_id: tempId }).catch(() => newModuleLi.remove());
     });
 
     // Function to create structure list items (Module/Lesson)
@@ -557,9 +737,45 @@ document.addEventListener("DOMContentLoaded", function() {
         return li;
     }
 
+    // --- Reordering --- //
+    // Moves update the DOM straight away and are synced as one full sibling
+    // ordering per list via /editor/reorder/bulk once the user pauses, so a
+    // burst of moves costs a single request.
+    const pendingOrderSyncs = new Map(); // "type:parentId" -> { itemType, parentId, list }
+
+    function orderedIds(itemType, list) {
+        const selector = itemType === "block" ? ":scope > .content-block" : `:scope > li[data-type="${itemType}"]`;
+        return Array.from(list.querySelectorAll(selector)).map(el => itemType === "block" ? el.dataset.blockId : el.dataset.id);
+    }
+
+    const flushOrderSyncs = debounce(async () => {
+        await flushOps(); // moved items may still have temp ids
+        const syncs = Array.from(pendingOrderSyncs.values());
+        pendingOrderSyncs.clear();
+        for (const { itemType, parentId, list } of syncs) {
+            try {
+                await apiRequest("/editor/reorder/bulk", "POST", {
+                    item_type: itemType,
+                    parent_id: resolveId(parentId),
+                    ordered_ids: orderedIds(itemType, list),
+                });
+            } catch (error) {
+                // Error already alerted by apiRequest
+            }
+        }
+    }, 600);
+
+    function parentIdFor(itemType, itemElement) {
+        if (itemType === "module") return courseId;
+        if (itemType === "lesson") return itemElement.parentNode.dataset.moduleId;
+        return editorPanel.querySelector("input[name=\"current_lesson_id\"]").value;
+    }
+
     // Function to handle moving items (Modules, Lessons, Blocks)
-    async function moveItem(itemType, itemId, direction) {
-        const itemElement = document.querySelector(`[data-${itemType === \"block\" ? \"block-id\" : \"id\"}=\"${itemId}\"]`);
+    function moveItem(itemType, itemId, direction) {
+        const itemElement = itemType === "block"
+            ? document.querySelector(`.content-block[data-block-id="${itemId}"]`)
+            : structurePanel.querySelector(`li[data-type="${itemType}"][data-id="${itemId}"]`);
         if (!itemElement) return;
 
         const parentList = itemElement.parentNode;
@@ -567,20 +783,16 @@ document.addEventListener("DOMContentLoaded", function() {
 
         if (!sibling) return; // Already at top/bottom
 
-        try {
-            // API call to update order on the backend
-            await apiRequest(`/editor/${itemType}/${itemId}/move`, "POST", { direction });
-
-            // Update DOM order
-            if (direction === "up") {
-                parentList.insertBefore(itemElement, sibling);
-            } else {
-                parentList.insertBefore(sibling, itemElement);
-            }
-            // Optionally update data-order attributes if needed, though backend is source of truth
-        } catch (error) {
-            alert(`Failed to move ${itemType}.`);
+        // Update DOM order
+        if (direction === "up") {
+            parentList.insertBefore(itemElement, sibling);
+        } else {
+            parentList.insertBefore(sibling, itemElement);
         }
+
+        const parentId = parentIdFor(itemType, itemElement);
+        pendingOrderSyncs.set(`${itemType}:${parentId}`, { itemType, parentId, list: parentList });
+        flushOrderSyncs();
     }
 
     // --- Initial Load --- //
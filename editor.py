@@ -1,27 +1,112 @@
 # -*- coding: utf-8 -*-
-from flask import Blueprint, jsonify, request, abort, render_template
+from flask import (Blueprint, jsonify, request, abort, render_template, flash, redirect, url_for, current_app,
+                   Response, stream_with_context)
 from flask_login import login_required, current_user
+from flask_wtf import FlaskForm
+from wtforms import StringField, TextAreaField, SubmitField
+from wtforms.validators import DataRequired, Length
 from course import Course, Module, Lesson, ContentBlock
 from main import db
-from sqlalchemy import func
+from sqlalchemy.orm import contains_eager, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from positions import (PARENT_COLUMNS, key_between, last_position, neighbour_positions,
+                       needs_rebalance, schedule_rebalance, write_order)
+from json_patch import JsonPatchError, apply_patch
+from export import export_filename, iter_course_zip
+import course_io
+from course_copy import copy_course
+import search
+import lesson_render
+import io
 import json # For handling JSON content in ContentBlock
+from datetime import datetime
 
 editor_bp = Blueprint("editor", __name__)
 
-# Helper function to get course and check ownership
-def get_course_or_404(course_id):
-    course = Course.query.get_or_404(course_id)
+# ── Forms ──────────────────────────────────────────────────────────────
+class CourseSettingsForm(FlaskForm):
+    title = StringField("Course Title", validators=[DataRequired(), Length(max=120)])
+    description = TextAreaField("Course Description")
+    outcome = TextAreaField("Learning Outcome", validators=[DataRequired()])
+    audience = TextAreaField("Target Audience")
+    submit = SubmitField("Save Settings")
+
+# --- Ownership helpers --- #
+# Each helper loads the item together with its course in a single joined query,
+# so checking ownership never walks the lazy block→lesson→module→course chain.
+
+def _check_owner(item, course):
+    if item is None:
+        abort(404)
     if course.user_id != current_user.id:
         abort(403) # Forbidden
-    return course
+    return item
+
+# Helper function to get course and check ownership
+def get_course_or_404(course_id):
+    course = db.session.get(Course, course_id)
+    return _check_owner(course, course)
+
+def get_module_or_404(module_id):
+    module = (
+        Module.query.join(Module.course)
+        .options(contains_eager(Module.course))
+        .filter(Module.id == module_id)
+        .first()
+    )
+    return _check_owner(module, module and module.course)
+
+def get_lesson_or_404(lesson_id):
+    lesson = (
+        Lesson.query.join(Lesson.module).join(Module.course)
+        .options(contains_eager(Lesson.module).contains_eager(Module.course))
+        .filter(Lesson.id == lesson_id)
+        .first()
+    )
+    return _check_owner(lesson, lesson and lesson.module.course)
+
+def get_block_or_404(block_id):
+    block = (
+        ContentBlock.query.join(ContentBlock.lesson).join(Lesson.module).join(Module.course)
+        .options(contains_eager(ContentBlock.lesson)
+                 .contains_eager(Lesson.module)
+                 .contains_eager(Module.course))
+        .filter(ContentBlock.id == block_id)
+        .first()
+    )
+    return _check_owner(block, block and block.lesson.module.course)
+
+def touch_course(course):
+    """
+    Bump the course's revision so cached public pages (keyed on it) go stale.
+
+    Module, lesson and block changes don't touch the course row by themselves.
+    """
+    course.updated_at = datetime.utcnow()
+    course.revision = Course.revision + 1
+
+def place_item(model, item, before=None, after=None):
+    """
+    Give ``item`` a key sorting between ``before`` and ``after``.
+
+    Only this row changes. If the key has grown too long, its siblings are
+    rebalanced in the background once the request commits.
+    """
+    item.position = key_between(before, after)
+    if needs_rebalance(item.position):
+        schedule_rebalance(model, getattr(item, PARENT_COLUMNS[model].key))
 
 # --- Course Editor Main Route --- #
 @editor_bp.route("/course/<int:course_id>", methods=["GET", "POST"])
 @login_required
 def edit_course(course_id):
-    course = get_course_or_404(course_id)
-    # Import form here to avoid circular dependency if form uses models
-    from src.routes.main import CourseSettingsForm
+    # Load the structure panel (modules → lessons) up front instead of lazily per module
+    course = (
+        Course.query.options(selectinload(Course.modules).selectinload(Module.lessons))
+        .filter_by(id=course_id)
+        .first()
+    )
+    _check_owner(course, course)
     form = CourseSettingsForm(obj=course) # Pre-populate form with course data
 
     if form.validate_on_submit(): # Handles basic course settings update
@@ -69,38 +154,32 @@ def update_conclusion(course_id):
 @login_required
 def add_module(course_id):
     course = get_course_or_404(course_id)
-    # Determine the order for the new module
-    max_order = db.session.query(func.max(Module.order)).filter_by(course_id=course.id).scalar()
-    new_order = (max_order or 0) + 1
-    new_module = Module(course_id=course.id, title="New Module", order=new_order)
+    # New modules go after the current last one
+    new_module = Module(course_id=course.id, title="New Module")
+    place_item(Module, new_module, before=last_position(Module, course.id))
     db.session.add(new_module)
+    touch_course(course)
     db.session.commit()
     return jsonify({"message": "Module added", "module": {"id": new_module.id, "title": new_module.title, "order": new_module.order}})
 
 @editor_bp.route("/module/<int:module_id>", methods=["PUT", "DELETE"])
 @login_required
 def modify_module(module_id):
-    module = Module.query.get_or_404(module_id)
-    course = get_course_or_404(module.course_id) # Checks ownership
+    module = get_module_or_404(module_id) # Checks ownership
 
     if request.method == "PUT":
         data = request.get_json()
         if not data or "title" not in data:
             abort(400, "Missing title")
         module.title = data["title"]
+        touch_course(module.course)
         db.session.commit()
         return jsonify({"message": "Module updated", "module": {"id": module.id, "title": module.title}})
 
     elif request.method == "DELETE":
-        # Adjust order of subsequent modules before deleting
-        modules_to_shift = Module.query.filter(
-            Module.course_id == module.course_id,
-            Module.order > module.order
-        ).order_by(Module.order).all()
-        for m in modules_to_shift:
-            m.order -= 1
-
+        # Fractional positions leave gaps harmlessly, so siblings stay untouched
         db.session.delete(module)
+        touch_course(module.course)
         db.session.commit()
         return jsonify({"message": "Module deleted"})
 
@@ -108,72 +187,67 @@ def modify_module(module_id):
 @editor_bp.route("/module/<int:module_id>/lessons", methods=["POST"])
 @login_required
 def add_lesson(module_id):
-    module = Module.query.get_or_404(module_id)
-    course = get_course_or_404(module.course_id) # Check ownership
-    max_order = db.session.query(func.max(Lesson.order)).filter_by(module_id=module.id).scalar()
-    new_order = (max_order or 0) + 1
-    new_lesson = Lesson(module_id=module.id, title="New Lesson", order=new_order)
+    module = get_module_or_404(module_id) # Check ownership
+    new_lesson = Lesson(module_id=module.id, title="New Lesson")
+    place_item(Lesson, new_lesson, before=last_position(Lesson, module.id))
     db.session.add(new_lesson)
+    touch_course(module.course)
     db.session.commit()
     return jsonify({"message": "Lesson added", "lesson": {"id": new_lesson.id, "title": new_lesson.title, "order": new_lesson.order}})
 
 @editor_bp.route("/lesson/<int:lesson_id>", methods=["PUT", "DELETE"])
 @login_required
 def modify_lesson(lesson_id):
-    lesson = Lesson.query.get_or_404(lesson_id)
-    course = get_course_or_404(lesson.module.course_id) # Check ownership
+    lesson = get_lesson_or_404(lesson_id) # Check ownership
 
     if request.method == "PUT": # Update title
         data = request.get_json()
         if not data or "title" not in data:
             abort(400, "Missing title")
         lesson.title = data["title"]
+        touch_course(lesson.module.course)
         db.session.commit()
         return jsonify({"message": "Lesson updated", "lesson": {"id": lesson.id, "title": lesson.title}})
 
     elif request.method == "DELETE":
-        # Adjust order of subsequent lessons in the same module
-        lessons_to_shift = Lesson.query.filter(
-            Lesson.module_id == lesson.module_id,
-            Lesson.order > lesson.order
-        ).order_by(Lesson.order).all()
-        for l in lessons_to_shift:
-            l.order -= 1
-
+        # Fractional positions leave gaps harmlessly, so siblings stay untouched
         db.session.delete(lesson)
+        touch_course(lesson.module.course)
         db.session.commit()
         return jsonify({"message": "Lesson deleted"})
 
 # --- Content Blocks --- #
+def default_block_content(block_type):
+    """Starting content for a new block of ``block_type`` (None if the type is unknown)."""
+    if block_type == "text":
+        return {"html": "<p>New text block</p>"}
+    elif block_type == "image":
+        return {"url": "", "alt": ""}
+    elif block_type == "video":
+        return {"url": ""}
+    elif block_type == "quiz":
+        return {"question": "New Quiz Question?", "type": "mc", "options": ["Option 1", "Option 2"], "correct_answer": 0}
+    elif block_type == "action":
+        return {"html": "<p>New action step</p>"}
+    return None
+
 @editor_bp.route("/lesson/<int:lesson_id>/blocks", methods=["POST"])
 @login_required
 def add_content_block(lesson_id):
-    lesson = Lesson.query.get_or_404(lesson_id)
-    course = get_course_or_404(lesson.module.course_id) # Check ownership
+    lesson = get_lesson_or_404(lesson_id) # Check ownership
     data = request.get_json()
     if not data or "block_type" not in data:
         abort(400, "Missing block_type")
 
     block_type = data["block_type"]
-    # Default content based on type
-    default_content = {}
-    if block_type == "text":
-        default_content = {"html": "<p>New text block</p>"}
-    elif block_type == "image":
-        default_content = {"url": "", "alt": ""}
-    elif block_type == "video":
-        default_content = {"url": ""}
-    elif block_type == "quiz":
-        default_content = {"question": "New Quiz Question?", "type": "mc", "options": ["Option 1", "Option 2"], "correct_answer": 0}
-    elif block_type == "action":
-        default_content = {"html": "<p>New action step</p>"}
-    else:
+    default_content = default_block_content(block_type)
+    if default_content is None:
         abort(400, "Invalid block_type")
 
-    max_order = db.session.query(func.max(ContentBlock.order)).filter_by(lesson_id=lesson.id).scalar()
-    new_order = (max_order or 0) + 1
-    new_block = ContentBlock(lesson_id=lesson.id, block_type=block_type, content=default_content, order=new_order)
+    new_block = ContentBlock(lesson_id=lesson.id, block_type=block_type, content=default_content)
+    place_item(ContentBlock, new_block, before=last_position(ContentBlock, lesson.id))
     db.session.add(new_block)
+    touch_course(lesson.module.course)
     db.session.commit()
     # Return the full block data so frontend can render it
     return jsonify({"message": "Content block added", "block": {"id": new_block.id, "block_type": new_block.block_type, "content": new_block.content, "order": new_block.order}})
@@ -181,102 +255,435 @@ def add_content_block(lesson_id):
 @editor_bp.route("/block/<int:block_id>", methods=["PUT", "DELETE"])
 @login_required
 def modify_content_block(block_id):
-    block = ContentBlock.query.get_or_404(block_id)
-    course = get_course_or_404(block.lesson.module.course_id) # Check ownership
+    block = get_block_or_404(block_id) # Check ownership
 
     if request.method == "PUT": # Update content
         data = request.get_json()
-        if not data or "content" not in data:
-            abort(400, "Missing content")
+        if not data or ("content" not in data and "patch" not in data):
+            abort(400, "Missing content or patch")
+        if "patch" in data and not isinstance(data.get("version"), int):
+            abort(400, "A patch needs the block version it was made against")
+
+        # Optimistic concurrency: the client says which version it edited
+        expected = data.get("version", block.version)
+        if expected != block.version:
+            return block_conflict(block)
+        if "patch" in data:
+            try:
+                content = apply_patch(block.content, data["patch"])
+            except JsonPatchError as e:
+                abort(422, f"Patch does not apply: {e}")
+        else:
+            content = data["content"]
         # Basic validation/sanitization might be needed here depending on content type
-        block.content = data["content"]
+        if not isinstance(content, dict):
+            abort(400, "Block content must be an object")
+
+        # Compare-and-swap, so a write that slipped in since we loaded the row wins
+        updated = (ContentBlock.query
+                   .filter_by(id=block.id, version=expected)
+                   .update({ContentBlock.data: json.dumps(content), ContentBlock.version: expected + 1},
+                           synchronize_session=False))
+        if not updated:
+            db.session.rollback()
+            return block_conflict(db.session.get(ContentBlock, block_id))
+        # The UPDATE above bypasses the ORM flush hooks
+        search.index_block(block.id)
+        lesson_render.mark_lesson(block.lesson_id)
+        touch_course(block.lesson.module.course)
         db.session.commit()
-        return jsonify({"message": "Block updated", "block": {"id": block.id, "content": block.content}})
+        if "patch" in data:
+            return jsonify({"version": expected + 1})
+        return jsonify({"message": "Block updated", "block": {"id": block.id, "content": content, "version": expected + 1}})
 
     elif request.method == "DELETE":
-        # Adjust order of subsequent blocks in the same lesson
-        blocks_to_shift = ContentBlock.query.filter(
-            ContentBlock.lesson_id == block.lesson_id,
-            ContentBlock.order > block.order
-        ).order_by(ContentBlock.order).all()
-        for b in blocks_to_shift:
-            b.order -= 1
-
+        # Fractional positions leave gaps harmlessly, so siblings stay untouched
         db.session.delete(block)
+        touch_course(block.lesson.module.course)
         db.session.commit()
         return jsonify({"message": "Block deleted"})
 
+def block_conflict(block):
+    """409 carrying the block's current state, so the client can rebase its edit."""
+    response = jsonify({"message": "Block was changed elsewhere", "version": block.version, "content": block.content})
+    response.status_code = 409
+    return response
+
+# --- Batch mutations --- #
+# op name -> (field holding the referenced id, model it refers to)
+BATCH_REFS = {
+    "update_module": ("id", Module),
+    "delete_module": ("id", Module),
+    "add_lesson": ("module_id", Module),
+    "update_lesson": ("id", Lesson),
+    "delete_lesson": ("id", Lesson),
+    "add_block": ("lesson_id", Lesson),
+    "update_block": ("id", ContentBlock),
+    "delete_block": ("id", ContentBlock),
+}
+BATCH_OPS = set(BATCH_REFS) | {"add_module", "update_intro", "update_conclusion"}
+
+def load_batch_items(course, ops):
+    """
+    Load every existing item the ops refer to, at most one query per model.
+
+    Each query is restricted to ``course``, so an id from someone else's course
+    simply isn't found. Returns ``{(model, id): item}``.
+    """
+    wanted = {Module: set(), Lesson: set(), ContentBlock: set()}
+    for op in ops:
+        field, model = BATCH_REFS.get(op.get("op"), (None, None))
+        if model is not None and isinstance(op.get(field), int):
+            wanted[model].add(op[field])
+
+    items = {}
+    if wanted[Module]:
+        query = Module.query.filter(Module.id.in_(wanted[Module]), Module.course_id == course.id)
+        items.update(((Module, m.id), m) for m in query)
+    if wanted[Lesson]:
+        query = (Lesson.query.join(Lesson.module)
+                 .filter(Lesson.id.in_(wanted[Lesson]), Module.course_id == course.id))
+        items.update(((Lesson, l.id), l) for l in query)
+    if wanted[ContentBlock]:
+        query = (ContentBlock.query.join(ContentBlock.lesson).join(Lesson.module)
+                 .filter(ContentBlock.id.in_(wanted[ContentBlock]), Module.course_id == course.id))
+        items.update(((ContentBlock, b.id), b) for b in query)
+    return items
+
+@editor_bp.route("/batch", methods=["POST"])
+@login_required
+def batch_mutations():
+    """
+    Apply an ordered list of editor operations in one transaction.
+
+    Body: ``{"course_id": ..., "ops": [{"op": "add_module", "temp_id": "m1"},
+    {"op": "add_lesson", "module_id": "m1", "temp_id": "l1"}, ...]}``.
+    Ops that create an item take a client ``temp_id`` (a string), which later
+    ops may use anywhere an id is expected. Ownership is checked once, on the
+    course, and every referenced item must belong to it. ``update_block`` on
+    an existing block carries the ``version`` it was made against, and a stale
+    one fails the batch with 409 as the PUT endpoint does. Nothing is committed
+    unless every op succeeds. The response maps each temp id to its server id.
+    """
+    data = request.get_json()
+    if not data or "course_id" not in data or not isinstance(data.get("ops"), list):
+        abort(400, "Missing course_id or ops")
+    ops = data["ops"]
+    if len(ops) > current_app.config.get("EDITOR_BATCH_MAX_OPS", 500):
+        abort(400, "Too many operations in one batch")
+    if not all(isinstance(op, dict) and op.get("op") in BATCH_OPS for op in ops):
+        abort(400, "Unknown operation in batch")
+
+    course = get_course_or_404(data["course_id"])
+    items = load_batch_items(course, ops)
+    created = {}   # temp id -> new item
+    deleted = set()
+    tails = {}     # (model, parent) -> largest key handed out so far
+
+    def resolve(index, model, ref):
+        item = created.get(ref) if isinstance(ref, str) else items.get((model, ref))
+        if item is None or not isinstance(item, model):
+            abort(404, f"Operation {index}: {model.__name__} {ref!r} not found in this course")
+        if id(item) in deleted:
+            abort(400, f"Operation {index}: {model.__name__} {ref!r} was deleted earlier in the batch")
+        return item
+
+    def append(index, op, model, item, parent):
+        temp_id = op.get("temp_id")
+        if not isinstance(temp_id, str) or temp_id in created:
+            abort(400, f"Operation {index}: temp_id must be a new string")
+        tail_key = (model, id(parent))
+        if tail_key not in tails:
+            tails[tail_key] = last_position(model, parent.id) if parent.id is not None else None
+        place_item(model, item, before=tails[tail_key])
+        tails[tail_key] = item.position
+        db.session.add(item)
+        created[temp_id] = item
+
+    # Inserts are sent together by the final flush rather than one by one
+    with db.session.no_autoflush:
+        for index, op in enumerate(ops):
+            name = op["op"]
+            if name in ("update_intro", "update_conclusion"):
+                if not isinstance(op.get("content"), str):
+                    abort(400, f"Operation {index}: missing content")
+                setattr(course, "intro_content" if name == "update_intro" else "conclusion_content", op["content"])
+            elif name == "add_module":
+                append(index, op, Module, Module(course=course, course_id=course.id,
+                                                 title=op.get("title") or "New Module"), course)
+            elif name == "add_lesson":
+                module = resolve(index, Module, op.get("module_id"))
+                append(index, op, Lesson, Lesson(module=module, module_id=module.id,
+                                                 title=op.get("title") or "New Lesson"), module)
+            elif name == "add_block":
+                lesson = resolve(index, Lesson, op.get("lesson_id"))
+                default = default_block_content(op.get("block_type"))
+                if default is None:
+                    abort(400, f"Operation {index}: invalid block_type")
+                content = op.get("content") or default
+                if not isinstance(content, dict):
+                    abort(400, f"Operation {index}: block content must be an object")
+                append(index, op, ContentBlock, ContentBlock(lesson=lesson, lesson_id=lesson.id,
+                                                             block_type=op["block_type"], content=content), lesson)
+            else:
+                action, _, kind = name.partition("_")
+                field, model = BATCH_REFS[name]
+                item = resolve(index, model, op.get(field))
+                if action == "delete":
+                    if item in db.session.new:
+                        db.session.flush()   # created earlier in this batch
+                    db.session.delete(item)
+                    deleted.add(id(item))
+                elif kind == "block":
+                    if not isinstance(op.get("content"), dict):
+                        abort(400, f"Operation {index}: missing content")
+                    if item in db.session.new:   # created earlier in this batch
+                        item.content = op["content"]
+                        continue
+                    expected = op.get("version")
+                    if not isinstance(expected, int):
+                        abort(400, f"Operation {index}: update_block needs the block version it was made against")
+                    # Same compare-and-swap as the PUT endpoint
+                    updated = (ContentBlock.query
+                               .filter_by(id=item.id, version=expected)
+                               .update({ContentBlock.data: json.dumps(op["content"]),
+                                        ContentBlock.version: expected + 1},
+                                       synchronize_session=False))
+                    if not updated:
+                        db.session.rollback()
+                        return block_conflict(db.session.get(ContentBlock, item.id))
+                    # Later ops in the batch see the row as written
+                    set_committed_value(item, "data", json.dumps(op["content"]))
+                    set_committed_value(item, "version", expected + 1)
+                    search.index_block(item.id)   # the UPDATE above bypasses the ORM flush hooks
+                    lesson_render.mark_lesson(item.lesson_id)
+                else:
+                    if not op.get("title"):
+                        abort(400, f"Operation {index}: missing title")
+                    item.title = op["title"]
+
+    if ops:
+        touch_course(course)
+    db.session.flush()
+    ids = {temp_id: item.id for temp_id, item in created.items() if id(item) not in deleted}
+    db.session.commit()
+    return jsonify({"message": f"Applied {len(ops)} operations", "ids": ids})
+
 # --- Reordering API --- #
+def get_reorder_item(item_type, item_id):
+    """Load a module/lesson/block for reordering; returns (model, item, course)."""
+    if item_type == "module":
+        item = get_module_or_404(item_id)
+        return Module, item, item.course
+    elif item_type == "lesson":
+        item = get_lesson_or_404(item_id)
+        return Lesson, item, item.module.course
+    elif item_type == "block":
+        item = get_block_or_404(item_id)
+        return ContentBlock, item, item.lesson.module.course
+    abort(400, "Invalid item_type")
+
 @editor_bp.route("/reorder", methods=["POST"])
 @login_required
 def reorder_items():
+    """
+    Move one item among its siblings.
+
+    Send the neighbours it should land between as ``after_id`` / ``before_id``
+    (item ids, either may be null), or a 1-based ``new_order`` index. Given
+    one neighbour, the sibling on its other side is looked up. Either way
+    only the moved row is written.
+    """
     data = request.get_json()
-    if not data or "item_type" not in data or "item_id" not in data or "new_order" not in data:
+    if not data or "item_type" not in data or "item_id" not in data:
+        abort(400, "Missing parameters for reordering")
+    if "new_order" not in data and "after_id" not in data and "before_id" not in data:
         abort(400, "Missing parameters for reordering")
 
     item_type = data["item_type"]
-    item_id = data["item_id"]
-    new_order = int(data["new_order"]) # 1-based index from frontend?
+    model, item, course = get_reorder_item(item_type, data["item_id"])
+    parent = PARENT_COLUMNS[model]
+    parent_id = getattr(item, parent.key)
+
+    if "new_order" in data:
+        try:
+            new_order = int(data["new_order"]) # 1-based index from frontend
+        except (TypeError, ValueError):
+            abort(400, "new_order must be an integer")
+        sibling_keys = [row[0] for row in
+                        db.session.query(model.position)
+                        .filter(parent == parent_id, model.id != item.id)
+                        .order_by(model.position)
+                        .all()]
+        index = max(0, min(new_order - 1, len(sibling_keys)))
+        before = sibling_keys[index - 1] if index > 0 else None
+        after = sibling_keys[index] if index < len(sibling_keys) else None
+    else:
+        siblings = db.session.query(model.position).filter(parent == parent_id, model.id != item.id)
+
+        def neighbour_key(neighbour_id):
+            if neighbour_id is None:
+                return None
+            key = siblings.filter(model.id == neighbour_id).scalar()
+            if key is None:
+                abort(400, "Neighbour is not a sibling of the moved item")
+            return key
+        before = neighbour_key(data.get("after_id"))
+        after = neighbour_key(data.get("before_id"))
+        # Place against the real adjacent sibling, not just the one the client named
+        if before is not None:
+            next_key = siblings.filter(model.position > before).order_by(model.position).limit(1).scalar()
+            if after is None:
+                after = next_key
+            elif next_key != after:
+                abort(400, "Neighbours are not adjacent")
+        elif after is not None:
+            before = (siblings.filter(model.position < after)
+                      .order_by(model.position.desc()).limit(1).scalar())
+
+    if (before is None or before < item.position) and (after is None or item.position < after):
+        return jsonify({"message": "No change in order"})
+    if before is not None and after is not None and before >= after:
+        abort(400, "Neighbours are out of order")
 
+    place_item(model, item, before=before, after=after)
+    touch_course(course)
+    db.session.commit()
+    return jsonify({"message": f"{item_type.capitalize()} reordered successfully",
+                    "item": {"id": item.id, "order": item.position}})
+
+@editor_bp.route("/reorder/bulk", methods=["POST"])
+@login_required
+def bulk_reorder_items():
+    """
+    Apply a complete sibling ordering in one statement.
+
+    Body: ``{"item_type": "module" | "lesson" | "block", "parent_id": <course,
+    module or lesson id>, "ordered_ids": [...]}``. ``ordered_ids`` must list
+    every sibling under the parent exactly once.
+    """
+    data = request.get_json()
+    if not data or "item_type" not in data or "parent_id" not in data or "ordered_ids" not in data:
+        abort(400, "Missing parameters for reordering")
+
+    item_type = data["item_type"]
+    parent_id = data["parent_id"]
+    # Ownership is checked once, on the parent
     if item_type == "module":
-        item = Module.query.get_or_404(item_id)
-        course = get_course_or_404(item.course_id)
-        siblings = Module.query.filter_by(course_id=item.course_id).order_by(Module.order).all()
-        target_class = Module
-        filter_attr = Module.course_id
-        parent_id = item.course_id
+        model, course = Module, get_course_or_404(parent_id)
     elif item_type == "lesson":
-        item = Lesson.query.get_or_404(item_id)
-        course = get_course_or_404(item.module.course_id)
-        siblings = Lesson.query.filter_by(module_id=item.module_id).order_by(Lesson.order).all()
-        target_class = Lesson
-        filter_attr = Lesson.module_id
-        parent_id = item.module_id
+        model, course = Lesson, get_module_or_404(parent_id).course
     elif item_type == "block":
-        item = ContentBlock.query.get_or_404(item_id)
-        course = get_course_or_404(item.lesson.module.course_id)
-        siblings = ContentBlock.query.filter_by(lesson_id=item.lesson_id).order_by(ContentBlock.order).all()
-        target_class = ContentBlock
-        filter_attr = ContentBlock.lesson_id
-        parent_id = item.lesson_id
+        model, course = ContentBlock, get_lesson_or_404(parent_id).module.course
     else:
         abort(400, "Invalid item_type")
 
-    old_order = item.order
-    if new_order == old_order:
-        return jsonify({"message": "No change in order"})
+    try:
+        ordered_ids = [int(i) for i in data["ordered_ids"]]
+    except (TypeError, ValueError):
+        abort(400, "ordered_ids must be a list of ids")
+    sibling_ids = {row[0] for row in
+                   db.session.query(model.id).filter(PARENT_COLUMNS[model] == parent_id).all()}
+    if len(ordered_ids) != len(sibling_ids) or set(ordered_ids) != sibling_ids:
+        abort(400, "ordered_ids must list every sibling exactly once")
+
+    write_order(model, ordered_ids)
+    if model is ContentBlock:
+        lesson_render.mark_lesson(parent_id)   # block order is part of the lesson's HTML
+    touch_course(course)
+    db.session.commit()
+    return jsonify({"message": f"{item_type.capitalize()}s reordered successfully", "count": len(ordered_ids)})
 
-    # Shift other items
-    if new_order < old_order:
-        # Moving up: Shift items between new_order and old_order down by 1
-        items_to_shift = target_class.query.filter(
-            filter_attr == parent_id,
-            target_class.order >= new_order,
-            target_class.order < old_order
-        ).all()
-        for sibling in items_to_shift:
-            sibling.order += 1
-    else: # new_order > old_order
-        # Moving down: Shift items between old_order and new_order up by 1
-        items_to_shift = target_class.query.filter(
-            filter_attr == parent_id,
-            target_class.order > old_order,
-            target_class.order <= new_order
-        ).all()
-        for sibling in items_to_shift:
-            sibling.order -= 1
-
-    # Set the new order for the moved item
-    item.order = new_order
+@editor_bp.route("/<item_type>/<int:item_id>/move", methods=["POST"])
+@login_required
+def move_item(item_type, item_id):
+    """Move an item one step up or down (the structure panel's arrow buttons)."""
+    data = request.get_json()
+    direction = (data or {}).get("direction")
+    if direction not in ("up", "down"):
+        abort(400, "direction must be 'up' or 'down'")
+
+    model, item, course = get_reorder_item(item_type, item_id)
+    neighbours = neighbour_positions(model, item, direction)
+    if not neighbours:
+        return jsonify({"message": "Already at the edge", "item": {"id": item.id, "order": item.position}})
+
+    # Jump over the adjacent sibling: land between it and the one beyond
+    beyond = neighbours[1] if len(neighbours) > 1 else None
+    if direction == "up":
+        place_item(model, item, before=beyond, after=neighbours[0])
+    else:
+        place_item(model, item, before=neighbours[0], after=beyond)
+    touch_course(course)
     db.session.commit()
+    return jsonify({"message": f"{item_type.capitalize()} moved {direction}",
+                    "item": {"id": item.id, "order": item.position}})
+
+# --- Static export --- #
+@editor_bp.route("/course/<int:course_id>/export.zip", methods=["GET"])
+@login_required
+def export_course_zip(course_id):
+    """Download the course as a static site, streamed as each page renders (see export.py)."""
+    course = get_course_or_404(course_id)
+    response = Response(stream_with_context(iter_course_zip(course.id)), mimetype="application/zip")
+    response.headers["Content-Disposition"] = f'attachment; filename="{export_filename(course)}"'
+    return response
+
+# --- Course JSON import/export --- #
+@editor_bp.route("/course/<int:course_id>/export.ndjson", methods=["GET"])
+@login_required
+def export_course_json(course_id):
+    """Download the course in the portable NDJSON format (see course_io.py)."""
+    course = get_course_or_404(course_id)
+    response = Response(stream_with_context(course_io.iter_course_json(course.id)),
+                        mimetype="application/x-ndjson")
+    response.headers["Content-Disposition"] = f'attachment; filename="{course_io.export_filename(course)}"'
+    return response
+
+@editor_bp.route("/course/import", methods=["POST"])
+@login_required
+def import_course_json():
+    """Create a course from an uploaded export (multipart ``file`` or the raw request body)."""
+    upload = request.files.get("file")
+    # The raw request stream reads lines a byte at a time; buffer it
+    source = upload.stream if upload else io.BufferedReader(request.stream, 64 * 1024)
+    try:
+        course_id, counts = course_io.import_course(source, current_user.id)
+    except course_io.CourseImportError as e:
+        abort(400, f"Import failed: {e}")
+    return jsonify({"message": "Course imported", "course_id": course_id, "counts": counts,
+                    "edit_url": url_for("editor.edit_course", course_id=course_id)}), 201
+
+# --- Duplication and templates --- #
+def copied_course_response(course_id, message):
+    return jsonify({"message": message, "course_id": course_id,
+                    "edit_url": url_for("editor.edit_course", course_id=course_id)}), 201
+
+@editor_bp.route("/course/<int:course_id>/duplicate", methods=["POST"])
+@login_required
+def duplicate_course(course_id):
+    """Copy one of the user's courses, whole tree included (see course_copy.py)."""
+    course = get_course_or_404(course_id)
+    return copied_course_response(copy_course(course, current_user.id, f"Copy of {course.title}"),
+                                  "Course duplicated")
 
-    # Optional: Renumber all siblings sequentially to ensure no gaps
-    # all_siblings = target_class.query.filter(filter_attr == parent_id).order_by(target_class.order).all()
-    # for i, sibling in enumerate(all_siblings):
-    #     sibling.order = i + 1
-    # db.session.commit()
+@editor_bp.route("/template/<share_id>", methods=["POST"])
+@login_required
+def create_from_template(share_id):
+    """Start a new course for the user from any shared course."""
+    course = Course.query.filter_by(share_id=share_id).first_or_404()
+    return copied_course_response(copy_course(course, current_user.id), "Course created from template")
 
-    return jsonify({"message": f"{item_type.capitalize()} reordered successfully"})
+# --- Search --- #
+@editor_bp.route("/api/search", methods=["GET"])
+@login_required
+def search_content():
+    """Ranked full-text hits across the user's courses, lessons and blocks (see search.py)."""
+    query = request.args.get("q", "").strip()
+    limit = max(1, min(request.args.get("limit", 20, type=int), 50))
+    if not search.search_index_exists(db.session.connection()):
+        abort(503, "Search index has not been built; run `flask --app wsgi db upgrade`")
+    return jsonify({"query": query, "results": search.search(current_user.id, query, limit)})
 
 # --- API to get item details for editor --- #
 @editor_bp.route("/api/course/<int:course_id>/details", methods=["GET"])
@@ -307,22 +714,63 @@ def get_conclusion_content(course_id):
 @editor_bp.route("/api/module/<int:module_id>/details", methods=["GET"])
 @login_required
 def get_module_details(module_id):
-    module = Module.query.get_or_404(module_id)
-    get_course_or_404(module.course_id) # Check ownership
+    module = get_module_or_404(module_id) # Check ownership
     return jsonify({"id": module.id, "title": module.title})
 
 @editor_bp.route("/api/lesson/<int:lesson_id>/details", methods=["GET"])
 @login_required
 def get_lesson_details(lesson_id):
-    lesson = Lesson.query.options(joinedload(Lesson.content_blocks)).get_or_404(lesson_id)
-    get_course_or_404(lesson.module.course_id) # Check ownership
-    blocks = sorted(lesson.content_blocks, key=lambda b: b.order)
+    lesson = get_lesson_or_404(lesson_id) # Check ownership
+    # Lesson.blocks is ordered by position
     return jsonify({
         "id": lesson.id,
         "title": lesson.title,
-        "blocks": [
-            {"id": b.id, "block_type": b.block_type, "content": b.content, "order": b.order}
-            for b in blocks
-        ]
+        "blocks": [b.to_dict() for b in lesson.blocks]
+    })
+
+@editor_bp.route("/api/course/<int:course_id>/tree", methods=["GET"])
+@login_required
+def get_course_tree(course_id):
+    """
+    Whole course structure (modules → lessons → blocks) as one JSON document.
+
+    Eager loading keeps this at four queries no matter how large the course is.
+    """
+    course = (
+        Course.query.options(
+            selectinload(Course.modules)
+            .selectinload(Module.lessons)
+            .selectinload(Lesson.blocks)
+        )
+        .filter_by(id=course_id)
+        .first()
+    )
+    _check_owner(course, course)
+    return jsonify({
+        "id": course.id,
+        "title": course.title,
+        "description": course.description,
+        "outcome": course.outcome,
+        "audience": course.audience,
+        "intro_content": course.intro_content,
+        "conclusion_content": course.conclusion_content,
+        "share_id": course.share_id,
+        "modules": [
+            {
+                "id": m.id,
+                "title": m.title,
+                "order": m.position,
+                "lessons": [
+                    {
+                        "id": l.id,
+                        "title": l.title,
+                        "order": l.position,
+                        "blocks": [b.to_dict() for b in l.blocks],
+                    }
+                    for l in m.lessons
+                ],
+            }
+            for m in course.modules
+        ],
     })
 
@@ -0,0 +1,138 @@
+# export.py
+"""
+Static-site export of a course as a ZIP bundle.
+
+The bundle holds ``index.html`` (the introduction), one page per lesson,
+``conclusion.html`` and a shared ``assets/`` folder. It can be unpacked
+straight onto a CDN. Pages link to each other relatively.
+
+The ZIP is produced as a stream. Each page is rendered, compressed and handed
+to the caller before the next lesson's HTML is loaded, so memory stays flat
+however large the course is and the first bytes go out immediately. Lesson
+bodies are the HTML stored at write time (lesson_render.py).
+"""
+import os
+import zipfile
+from collections import namedtuple
+
+from flask import current_app, render_template
+from sqlalchemy.orm import selectinload
+
+from course import Course, Module
+from lesson_render import lesson_html
+
+Page = namedtuple("Page", "kind filename title html lesson_id")
+SidebarEntry = namedtuple("SidebarEntry", "kind filename title")
+
+ASSET_FILES = {
+    "assets/course.css": ("style.css", "course_view.css"),
+    "assets/course.js": ("course_view.js",),
+}
+
+
+class _ZipStream:
+    """Write-only file object that hands out whatever ZipFile has written so far."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def course_outline(course):
+    """Pages in reading order plus the sidebar (module headings interleaved)."""
+    pages = [Page("intro", "index.html", "Introduction", course.intro_content or "", None)]
+    sidebar = [SidebarEntry("intro", "index.html", "Introduction")]
+    number = 0
+    for module in course.modules:
+        sidebar.append(SidebarEntry("module", None, module.title))
+        for lesson in module.lessons:
+            number += 1
+            filename = f"lesson-{number:03d}.html"
+            pages.append(Page("lesson", filename, lesson.title, None, lesson.id))
+            sidebar.append(SidebarEntry("lesson", filename, lesson.title))
+    pages.append(Page("conclusion", "conclusion.html", "Conclusion", course.conclusion_content or "", None))
+    sidebar.append(SidebarEntry("conclusion", "conclusion.html", "Conclusion"))
+    return pages, sidebar
+
+
+def _asset_bytes(sources):
+    parts = []
+    for name in sources:
+        with open(os.path.join(current_app.root_path, name), "rb") as f:
+            parts.append(f.read())
+    return b"\n".join(parts)
+
+
+def iter_course_zip(course_id):
+    """Yield the course's static-site ZIP in chunks, one page at a time."""
+    # Structure only (titles and ids); lesson HTML is loaded per lesson below
+    course = (
+        Course.query.options(selectinload(Course.modules).selectinload(Module.lessons))
+        .filter_by(id=course_id)
+        .one()
+    )
+    pages, sidebar = course_outline(course)
+
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as bundle:
+        for arcname, sources in ASSET_FILES.items():
+            bundle.writestr(arcname, _asset_bytes(sources))
+        yield stream.drain()
+
+        for index, page in enumerate(pages):
+            html = render_template(
+                "export_page.html",
+                course=course,
+                page=page,
+                lesson_html=lesson_html(page.lesson_id) if page.kind == "lesson" else None,
+                sidebar=sidebar,
+                prev_page=pages[index - 1] if index > 0 else None,
+                next_page=pages[index + 1] if index + 1 < len(pages) else None,
+            )
+            bundle.writestr(page.filename, html)
+            yield stream.drain()
+    yield stream.drain()   # central directory
+
+
+def export_filename(course):
+    return f"course-{course.share_id}.zip"
+
+
+def export_course_to_file(course_id, path):
+    """Write the bundle for ``course_id`` to ``path``; returns bytes written."""
+    written = 0
+    tmp_path = path + ".part"
+    with open(tmp_path, "wb") as f:
+        for chunk in iter_course_zip(course_id):
+            f.write(chunk)
+            written += len(chunk)
+    os.replace(tmp_path, path)   # never leave a half-written bundle behind
+    return written
+
+
+# --- Parallel export (flask export public) --- #
+
+_worker_app = None
+
+
+def init_export_worker():
+    """Process-pool initializer: each worker process builds its own app and engine."""
+    global _worker_app
+    from main import create_app
+    _worker_app = create_app()
+
+
+def export_in_worker(course_id, path):
+    with _worker_app.app_context():
+        return course_id, export_course_to_file(course_id, path)
@@ -0,0 +1,40 @@
+# gunicorn.conf.py
+"""
+Gunicorn settings.
+
+The app is imported once in the master (``preload_app``) and forked into the
+workers, so workers start in milliseconds and share the imported code's
+memory. Anything that holds a socket or thread must not be shared across the
+fork: the SQLAlchemy pool is disposed in ``post_fork``, and the AI job pool,
+the rebalance thread and the SQLite cache connections re-create themselves per
+process.
+
+Each worker writes its metrics to ``METRICS_DIR`` for ``/metrics`` to sum
+(see metrics.py); ``on_starting`` clears snapshots left by a previous run.
+
+Schema migrations are not run here; see ``flask --app wsgi db upgrade``.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+# Threads keep SSE streams and job polling from tying up a whole worker
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+preload_app = True
+
+
+def on_starting(server):
+    # Counters restart with the server; old snapshots would be summed in forever
+    import shutil
+
+    shutil.rmtree(server.app.wsgi().config["METRICS_DIR"], ignore_errors=True)
+
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be reused by several children
+    from main import db
+
+    app = worker.app.wsgi()
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,136 @@
+# json_patch.py
+"""
+JSON Patch (RFC 6902) for content block payloads.
+
+Supports add, remove, replace, move, copy and test. There is also one
+extension op for long strings such as a text block's HTML, so an edit costs
+the size of the change and not the whole string:
+
+    {"op": "splice", "path": "/html", "offset": 120, "remove": 3, "value": "new"}
+
+``apply_patch`` never mutates its input.
+"""
+import copy
+
+
+class JsonPatchError(ValueError):
+    """The patch is malformed or does not apply to the document."""
+
+
+def _parse_pointer(pointer):
+    """Split a JSON Pointer (RFC 6901) into unescaped reference tokens."""
+    if not isinstance(pointer, str) or (pointer and not pointer.startswith("/")):
+        raise JsonPatchError(f"Invalid JSON pointer {pointer!r}")
+    if pointer == "":
+        return []
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _index(container, token, allow_end=False):
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise JsonPatchError(f"Invalid array index {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise JsonPatchError(f"Array index {index} out of range")
+    return index
+
+
+def _resolve(doc, tokens):
+    """Return the value at ``tokens`` inside ``doc``."""
+    for token in tokens:
+        if isinstance(doc, dict):
+            if token not in doc:
+                raise JsonPatchError(f"Member {token!r} not found")
+            doc = doc[token]
+        elif isinstance(doc, list):
+            doc = doc[_index(doc, token)]
+        else:
+            raise JsonPatchError(f"Cannot descend into {type(doc).__name__}")
+    return doc
+
+
+def _add(doc, tokens, value):
+    if not tokens:
+        return value
+    parent = _resolve(doc, tokens[:-1])
+    if isinstance(parent, dict):
+        parent[tokens[-1]] = value
+    elif isinstance(parent, list):
+        parent.insert(_index(parent, tokens[-1], allow_end=True), value)
+    else:
+        raise JsonPatchError("Target parent is not a container")
+    return doc
+
+
+def _remove(doc, tokens):
+    if not tokens:
+        raise JsonPatchError("Cannot remove the whole document")
+    parent = _resolve(doc, tokens[:-1])
+    if isinstance(parent, dict):
+        if tokens[-1] not in parent:
+            raise JsonPatchError(f"Member {tokens[-1]!r} not found")
+        return parent.pop(tokens[-1])
+    if isinstance(parent, list):
+        return parent.pop(_index(parent, tokens[-1]))
+    raise JsonPatchError("Target parent is not a container")
+
+
+def _replace(doc, tokens, value):
+    if not tokens:
+        return value
+    parent = _resolve(doc, tokens[:-1])
+    _resolve(parent, tokens[-1:])   # must already exist
+    if isinstance(parent, list):
+        parent[_index(parent, tokens[-1])] = value
+    else:
+        parent[tokens[-1]] = value
+    return doc
+
+
+def _splice(doc, tokens, op):
+    target = _resolve(doc, tokens)
+    offset, remove, value = op.get("offset"), op.get("remove", 0), op.get("value", "")
+    if not isinstance(target, str):
+        raise JsonPatchError("splice target is not a string")
+    if not (isinstance(offset, int) and isinstance(remove, int) and isinstance(value, str)):
+        raise JsonPatchError("splice needs integer offset/remove and a string value")
+    if offset < 0 or remove < 0 or offset + remove > len(target):
+        raise JsonPatchError("splice range out of bounds")
+    return _replace(doc, tokens, target[:offset] + value + target[offset + remove:])
+
+
+def apply_patch(document, patch):
+    """Return a copy of ``document`` with the ``patch`` operations applied in order."""
+    if not isinstance(patch, list):
+        raise JsonPatchError("Patch must be a list of operations")
+    doc = copy.deepcopy(document)
+    for op in patch:
+        if not isinstance(op, dict) or "op" not in op:
+            raise JsonPatchError("Each operation needs an 'op'")
+        name = op["op"]
+        tokens = _parse_pointer(op.get("path"))
+        if name in ("add", "replace", "test") and "value" not in op:
+            raise JsonPatchError(f"'{name}' needs a value")
+
+        if name == "add":
+            doc = _add(doc, tokens, copy.deepcopy(op["value"]))
+        elif name == "remove":
+            _remove(doc, tokens)
+        elif name == "replace":
+            doc = _replace(doc, tokens, copy.deepcopy(op["value"]))
+        elif name in ("move", "copy"):
+            source = _parse_pointer(op.get("from"))
+            if name == "move" and tokens[:len(source)] == source and tokens != source:
+                raise JsonPatchError("Cannot move a value into one of its children")
+            value = _remove(doc, source) if name == "move" else copy.deepcopy(_resolve(doc, source))
+            doc = _add(doc, tokens, value)
+        elif name == "test":
+            if _resolve(doc, tokens) != op["value"]:
+                raise JsonPatchError(f"Test failed at {op.get('path')!r}")
+        elif name == "splice":
+            doc = _splice(doc, tokens, op)
+        else:
+            raise JsonPatchError(f"Unknown op {name!r}")
+    return doc
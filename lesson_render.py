@@ -0,0 +1,255 @@
+# lesson_render.py
+"""
+Lessons pre-rendered to HTML when their blocks are written.
+
+Each lesson row stores:
+
+* ``rendered_html``: its blocks, in order, rendered through
+  ``_lesson_blocks.html``;
+* ``embeds``: JSON metadata for its video and image blocks (provider, video
+  id, embed URL; image source and alt text), parsed once here rather than
+  in the template on every view;
+* ``render_version``: the ``RENDER_VERSION`` it was rendered with.
+
+The public view and the static export then fetch one row instead of loading
+and rendering every block. The HTML never contains block ids, so copied
+courses can carry their lessons' HTML over as is.
+
+Renders are kept current like the search index. A session ``after_flush``
+hook notes the lessons whose blocks were inserted, changed, moved or
+deleted, and ``before_commit`` re-renders them in the same transaction. Code
+that writes blocks with bulk statements calls ``mark_lesson`` or
+``render_course`` itself. Readers fall back to rendering on the fly when a
+row is missing its render or has an older ``render_version``.
+``flask render check`` finds lessons whose stored render doesn't match their
+blocks, and ``flask render rebuild`` re-renders them.
+"""
+import json
+import re
+from urllib.parse import parse_qs, urlparse
+
+from flask import current_app
+from sqlalchemy import bindparam, event, inspect, select, update
+from sqlalchemy.orm import Session
+
+from main import db
+from course import Module, Lesson, ContentBlock
+
+# Bump when _lesson_blocks.html, _content_block.html or the embed rules change:
+# stored renders become stale, views render on the fly until `flask render rebuild`
+RENDER_VERSION = 1
+RENDER_BATCH_SIZE = 200
+
+VIDEO_ID = re.compile(r"^[\w-]{1,64}$")
+_PENDING = "lesson_render_pending"
+
+
+# --- Rendering --- #
+
+def video_embed(url):
+    """Embed metadata for a YouTube or Vimeo link; ``provider`` is None for anything else."""
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or "").lower()
+    if host.startswith("www.") or host.startswith("m."):
+        host = host.split(".", 1)[1]
+    path = [part for part in parsed.path.split("/") if part]
+    provider, video_id = None, None
+    if host == "youtu.be":
+        provider, video_id = "youtube", path[0] if path else None
+    elif host in ("youtube.com", "youtube-nocookie.com"):
+        provider = "youtube"
+        if path[:1] == ["watch"]:
+            video_id = parse_qs(parsed.query).get("v", [None])[0]
+        elif len(path) >= 2 and path[0] in ("embed", "shorts", "live", "v"):
+            video_id = path[1]
+    elif host in ("vimeo.com", "player.vimeo.com"):
+        provider = "vimeo"
+        video_id = next((part for part in reversed(path) if part.isdigit()), None)
+
+    if provider == "youtube" and video_id and VIDEO_ID.match(video_id):
+        return {"kind": "video", "provider": "youtube", "video_id": video_id,
+                "embed_url": f"https://www.youtube.com/embed/{video_id}", "url": url}
+    if provider == "vimeo" and video_id:
+        return {"kind": "video", "provider": "vimeo", "video_id": video_id,
+                "embed_url": f"https://player.vimeo.com/video/{video_id}", "url": url}
+    return {"kind": "video", "provider": None, "url": url}
+
+
+def block_embed(block_type, content):
+    """Embed metadata for a video or image block (None for other blocks or an empty URL)."""
+    url = (content.get("url") or "").strip()
+    if not url:
+        return None
+    if block_type == "video":
+        return video_embed(url)
+    if block_type == "image":
+        return {"kind": "image", "src": url, "alt": content.get("alt") or "Course Image"}
+    return None
+
+
+def render_blocks(blocks):
+    """Render ``[(block_type, content), ...]`` in order; returns ``(html, embeds)``."""
+    views, embeds = [], []
+    for block_type, content in blocks:
+        embed = block_embed(block_type, content)
+        if embed is not None:
+            embeds.append(embed)
+        views.append({"block_type": block_type, "content": content, "embed": embed})
+    html = current_app.jinja_env.get_template("_lesson_blocks.html").render(blocks=views)
+    return html, embeds
+
+
+def _decode(data):
+    return json.loads(data) if data else {}
+
+
+def _load_blocks(connection, lesson_ids):
+    """``{lesson_id: [(block_type, content), ...]}`` in position order, one query."""
+    blocks = {lesson_id: [] for lesson_id in lesson_ids}
+    for lesson_id, block_type, data in connection.execute(
+            select(ContentBlock.lesson_id, ContentBlock.type, ContentBlock.data)
+            .where(ContentBlock.lesson_id.in_(lesson_ids))
+            .order_by(ContentBlock.lesson_id, ContentBlock.position, ContentBlock.id)):
+        blocks[lesson_id].append((block_type, _decode(data)))
+    return blocks
+
+
+def _batches(ids, size=RENDER_BATCH_SIZE):
+    ids = sorted(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def _store(connection, rendered):
+    """Write ``{lesson_id: (html, embeds)}`` with one executemany UPDATE."""
+    if not rendered:
+        return
+    table = Lesson.__table__
+    connection.execute(
+        update(table).where(table.c.id == bindparam("lesson_id"))
+        .values(rendered_html=bindparam("html"), embeds=bindparam("embeds_json"),
+                render_version=RENDER_VERSION),
+        [{"lesson_id": lesson_id, "html": html, "embeds_json": json.dumps(embeds)}
+         for lesson_id, (html, embeds) in rendered.items()],
+    )
+
+
+def render_lessons(lesson_ids, connection=None):
+    """Re-render and store the given lessons (the caller commits). Returns how many."""
+    connection = connection or db.session.connection()
+    count = 0
+    for batch in _batches(set(lesson_ids)):
+        blocks = _load_blocks(connection, batch)
+        _store(connection, {lesson_id: render_blocks(blocks[lesson_id]) for lesson_id in batch})
+        count += len(batch)
+    return count
+
+
+def render_course(course_id, connection=None):
+    """Re-render every lesson of a course (after bulk inserts such as import)."""
+    connection = connection or db.session.connection()
+    lesson_ids = [row[0] for row in connection.execute(
+        select(Lesson.id).join(Module, Module.id == Lesson.module_id).where(Module.course_id == course_id))]
+    return render_lessons(lesson_ids, connection)
+
+
+def mark_lesson(lesson_id, session=None):
+    """Re-render ``lesson_id`` when the session commits (for writes that bypass the ORM)."""
+    session = session or db.session()
+    session.info.setdefault(_PENDING, set()).add(lesson_id)
+
+
+def lesson_html(lesson_id, connection=None):
+    """A lesson's HTML: the stored render if it is current, else rendered now (not stored)."""
+    connection = connection or db.session.connection()
+    row = connection.execute(select(Lesson.rendered_html, Lesson.render_version)
+                             .where(Lesson.id == lesson_id)).first()
+    if row is None:
+        return None
+    if row.rendered_html is not None and row.render_version == RENDER_VERSION:
+        return row.rendered_html
+    return render_blocks(_load_blocks(connection, [lesson_id])[lesson_id])[0]
+
+
+# --- Consistency --- #
+
+def check_rendered_lessons(fix=False):
+    """
+    Compare every lesson's stored render with a fresh one.
+
+    Returns ``(checked, stale_ids)``. With ``fix``, stale lessons are
+    re-rendered and committed batch by batch.
+    """
+    connection = db.session.connection()
+    lesson_ids = [row[0] for row in connection.execute(select(Lesson.id))]
+    stale = []
+    for batch in _batches(lesson_ids):
+        stored = {row.id: row for row in connection.execute(
+            select(Lesson.id, Lesson.rendered_html, Lesson.embeds, Lesson.render_version)
+            .where(Lesson.id.in_(batch)))}
+        blocks = _load_blocks(connection, batch)
+        rendered = {}
+        for lesson_id in batch:
+            html, embeds = render_blocks(blocks[lesson_id])
+            row = stored[lesson_id]
+            if (row.render_version != RENDER_VERSION or row.rendered_html != html
+                    or _decode(row.embeds) != embeds):
+                rendered[lesson_id] = (html, embeds)
+        stale.extend(rendered)
+        if fix and rendered:
+            _store(connection, rendered)
+            db.session.commit()
+            connection = db.session.connection()
+    return len(lesson_ids), stale
+
+
+def rebuild_rendered_lessons(course_id=None):
+    """Re-render every lesson (or one course's). Returns the number of lessons."""
+    if course_id is not None:
+        count = render_course(course_id)
+    else:
+        connection = db.session.connection()
+        count = render_lessons([row[0] for row in connection.execute(select(Lesson.id))], connection)
+    db.session.commit()
+    return count
+
+
+# --- Incremental updates from ORM flushes --- #
+
+_RENDERED_ATTRS = ("type", "data", "position", "lesson_id")
+
+
+@event.listens_for(Session, "after_flush")
+def _note_changed_lessons(session, flush_context):
+    pending = set()
+    for obj in session.new:
+        if isinstance(obj, ContentBlock):
+            pending.add(obj.lesson_id)
+        elif isinstance(obj, Lesson):
+            pending.add(obj.id)   # a new lesson gets its (empty) render too
+    for obj in session.dirty:
+        if isinstance(obj, ContentBlock):
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in _RENDERED_ATTRS):
+                pending.add(obj.lesson_id)
+                pending.update(state.attrs.lesson_id.history.deleted)   # moved out of that lesson
+    for obj in session.deleted:
+        if isinstance(obj, ContentBlock):
+            pending.add(obj.lesson_id)
+    pending.discard(None)
+    if pending:
+        session.info.setdefault(_PENDING, set()).update(pending)
+
+
+@event.listens_for(Session, "before_commit")
+def _render_noted_lessons(session):
+    if session.new or session.dirty or session.deleted:
+        session.flush()   # notes anything not flushed yet
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        render_lessons(pending, session.connection())
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_noted_lessons(session, previous_transaction):
+    session.info.pop(_PENDING, None)
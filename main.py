@@ -8,14 +8,6 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 import uuid
-# ----- TEMPORARY: wipe stale SQLite file so the new schema can be created -----
-import os
-
-db_path = os.path.join(os.getcwd(), "instance", "minicourse.db")
-if os.path.exists(db_path):
-    print("• Removing old SQLite DB so we can recreate it with the new schema")
-    os.remove(db_path)
-# ----------------------------------------------------------------------------- 
 
 # Initialize extensions
 db = SQLAlchemy()
@@ -29,16 +21,69 @@ def create_app():
     
     app.config["SECRET_KEY"] = os.environ.get("FLASK_SECRET_KEY", "dev-secret-key-12345") # Use a fixed dev key for now
 
-    # Configure SQLite database in instance folder relative to app root
-    instance_path = os.path.join(app.root_path, "instance")
+    # Database: tuned SQLite in the instance folder by default, or DATABASE_URL (see database.py).
+    # INSTANCE_PATH moves the folder (and the SQLite side stores below) elsewhere, e.g. for bench/
+    instance_path = os.environ.get("INSTANCE_PATH") or os.path.join(app.root_path, "instance")
     os.makedirs(instance_path, exist_ok=True)
-    db_path = os.path.join(instance_path, "minicourse.db")
-    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    app.instance_path = instance_path
+    from database import configure_database, install_engine_hooks
+    configure_database(app, instance_path)
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # Schema changes run via `flask --app wsgi db upgrade` before the server starts;
+    # set AUTO_MIGRATE=1 to apply them inside create_app instead (see migrations.py)
+    app.config["AUTO_MIGRATE"] = os.environ.get("AUTO_MIGRATE", "0") == "1"
     app.config["WTF_CSRF_ENABLED"] = False # Disable CSRF for easier testing with JS fetch
 
+    # Background AI jobs (see ai_jobs.py): pool size and max queued jobs per worker process
+    app.config["AI_JOB_WORKERS"] = int(os.environ.get("AI_JOB_WORKERS", 4))
+    app.config["AI_JOB_QUEUE_SIZE"] = int(os.environ.get("AI_JOB_QUEUE_SIZE", 32))
+    app.config["AI_BATCH_CONCURRENCY"] = int(os.environ.get("AI_BATCH_CONCURRENCY", 8))  # generate_all provider calls in flight per process
+
+    # AI response cache (see cache.py): in-memory LRU backed by a SQLite file shared by all workers.
+    # Bump AI_MODEL_VERSION whenever the model or prompts change so stale answers are not served.
+    app.config["AI_CACHE_ENABLED"] = os.environ.get("AI_CACHE_ENABLED", "1") != "0"
+    app.config["AI_CACHE_SIZE"] = int(os.environ.get("AI_CACHE_SIZE", 512))
+    app.config["AI_CACHE_PATH"] = os.path.join(instance_path, "ai_cache.sqlite3")
+    app.config["AI_MODEL_VERSION"] = os.environ.get("AI_MODEL_VERSION") or (
+        f"openai:{os.environ.get('AI_MODEL', 'gpt-4o-mini')}" if os.environ.get("AI_PROVIDER") == "openai" else "stub-1")
+
+    # Identical AI calls in flight at the same time share one upstream call (see coalesce.py)
+    app.config["AI_COALESCE_ENABLED"] = os.environ.get("AI_COALESCE_ENABLED", "1") != "0"
+    app.config["AI_COALESCE_PATH"] = os.path.join(instance_path, "ai_coalesce.sqlite3")
+    app.config["AI_COALESCE_WAIT_SECONDS"] = float(os.environ.get("AI_COALESCE_WAIT_SECONDS", 60))
+
+    # AI admission control (see rate_limit.py): token buckets and in-flight caps,
+    # per user and for the whole site, shared by all workers through a SQLite file
+    app.config["AI_RATE_LIMIT_ENABLED"] = os.environ.get("AI_RATE_LIMIT_ENABLED", "1") != "0"
+    app.config["AI_RATE_LIMIT_PATH"] = os.path.join(instance_path, "ai_limits.sqlite3")
+    app.config["AI_RATE_USER_PER_MINUTE"] = float(os.environ.get("AI_RATE_USER_PER_MINUTE", 20))
+    app.config["AI_RATE_USER_BURST"] = int(os.environ.get("AI_RATE_USER_BURST", 10))
+    app.config["AI_RATE_USER_CONCURRENT"] = int(os.environ.get("AI_RATE_USER_CONCURRENT", 2))
+    app.config["AI_RATE_GLOBAL_PER_MINUTE"] = float(os.environ.get("AI_RATE_GLOBAL_PER_MINUTE", 300))
+    app.config["AI_RATE_GLOBAL_BURST"] = int(os.environ.get("AI_RATE_GLOBAL_BURST", 60))
+    app.config["AI_RATE_GLOBAL_CONCURRENT"] = int(os.environ.get("AI_RATE_GLOBAL_CONCURRENT", 16))
+
+    # Prometheus metrics at /metrics (see metrics.py). Each worker process writes its
+    # numbers to METRICS_DIR and the endpoint sums them; set METRICS_TOKEN to require
+    # "Authorization: Bearer <token>" on scrapes.
+    app.config["METRICS_DIR"] = os.environ.get("METRICS_DIR") or os.path.join(instance_path, "metrics")
+    app.config["METRICS_FLUSH_SECONDS"] = float(os.environ.get("METRICS_FLUSH_SECONDS", 1))
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+
+    # Per-request SQL profiling (see query_profiler.py): Server-Timing header, a log line
+    # per request, slow-query and N+1 warnings. Off by default.
+    app.config["QUERY_PROFILER_ENABLED"] = os.environ.get("QUERY_PROFILER", "0") == "1"
+    app.config["QUERY_PROFILER_SLOW_MS"] = float(os.environ.get("QUERY_PROFILER_SLOW_MS", 100))
+    app.config["QUERY_PROFILER_N_PLUS_ONE"] = int(os.environ.get("QUERY_PROFILER_N_PLUS_ONE", 5))
+
     # Initialize extensions with app
     db.init_app(app)
+    import metrics
+    import query_profiler
+    with app.app_context():
+        install_engine_hooks(db.engine)
+        metrics.init_app(app, db.engine)
+        query_profiler.init_app(app, db.engine)
     login_manager.init_app(app)
     login_manager.login_view = "auth_bp.login" # Use blueprint name
 
@@ -46,6 +91,15 @@ def create_app():
     # Import models directly from root
     from user import User
     from course import Course   # only Course exists now
+    from ai_jobs import AIJob, ai_job_queue
+    from cache import ai_response_cache
+    from rate_limit import ai_rate_limiter
+    from coalesce import ai_coalescer
+
+    ai_job_queue.init_app(app)
+    ai_response_cache.init_app(app)
+    ai_rate_limiter.init_app(app)
+    ai_coalescer.init_app(app)
 
 
     @login_manager.user_loader
@@ -62,18 +116,29 @@ def create_app():
     app.register_blueprint(auth_bp, url_prefix="/auth")
     app.register_blueprint(editor_bp, url_prefix="/editor")
     app.register_blueprint(ai_bp) # Registered with /ai prefix in ai_routes.py
+    app.register_blueprint(metrics.metrics_bp)
 
-    with app.app_context():
-        print(f"Database URI: {app.config['SQLALCHEMY_DATABASE_URI']}")
-        db.create_all() # Create database tables if they don't exist
-        print("Database tables created (if not exist).")
+    from cli import register_cli
+    register_cli(app)
+
+    if app.config["AUTO_MIGRATE"]:
+        from migrations import upgrade
+        with app.app_context():
+            applied = upgrade(app)
+            if applied:
+                app.logger.info(f"Applied migrations: {', '.join(applied)}")
 
     return app
 
-app = create_app()
+# No app is created at import time: gunicorn loads wsgi:app, and the CLI uses
+# `flask --app wsgi`. Importing this module has no side effects.
 
 if __name__ == "__main__":
     print("Starting Flask development server...")
+    app = create_app()
+    from migrations import upgrade
+    with app.app_context():
+        upgrade(app)
     # Make sure to listen on 0.0.0.0 for external access if needed (e.g., via expose_port)
     port = int(os.getenv("PORT", 5000))
     app.run(debug=True, host="0.0.0.0", port=port)
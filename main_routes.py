@@ -1,4 +1,5 @@
 # main_routes.py  – place in project root next to main.py
+import hashlib
 from datetime import datetime
 from flask import (
     Blueprint,
@@ -8,13 +9,31 @@ from flask import (
     redirect,
     request,
     flash,
+    make_response,
+    session,
+    current_app,
+    jsonify,
 )
 from flask_login import login_required, current_user
+from sqlalchemy import and_, delete, func, or_, select
+from sqlalchemy.orm import selectinload
 from main import db                       # ← your SQLAlchemy db instance
-from course import Course                 # ← your Course model
+from course import Course, Module, Lesson, ContentBlock  # ← your course models
+from cache import LRUTTLCache
+import search
+import lesson_render
 
 main_bp = Blueprint("main_bp", __name__)
 
+# Rendered public course pages, keyed by (share_id, item, viewer, revision).
+# The revision is Course.revision, which every editor write bumps, so an edit
+# simply makes the old entries unreachable; LRU eviction cleans them up.
+page_cache = LRUTTLCache(maxsize=256)
+
+# Bump when view_course.html changes so browsers drop their copies.
+# (Lesson bodies carry their own lesson_render.RENDER_VERSION in the key.)
+PAGE_TEMPLATE_VERSION = "3"
+
 # ------------------------------------------------------------------
 # Home / landing
 # ------------------------------------------------------------------
@@ -31,16 +50,125 @@ def index():
 # ------------------------------------------------------------------
 # Dashboard
 # ------------------------------------------------------------------
+DASHBOARD_PAGE_SIZE = 24
+DESCRIPTION_PREVIEW_CHARS = 120   # the card shows ~100; no need to load the rest
+
+
+def _encode_cursor(row):
+    return f"{row.updated_at.isoformat()}_{row.id}"
+
+
+def _decode_cursor(cursor):
+    try:
+        updated_at, course_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(updated_at), int(course_id)
+    except (AttributeError, ValueError):
+        abort(400, "Invalid cursor")
+
+
+def dashboard_page(user_id, cursor=None, limit=DASHBOARD_PAGE_SIZE):
+    """
+    One page of a user's courses, newest first, plus a cursor for the next page.
+
+    Keyset pagination on (updated_at, id) walks ix_course_user_updated, so
+    page 50 costs the same as page 1. Only the displayed columns are loaded,
+    and module/lesson/block counts come from one grouped subquery over the
+    page's courses. The whole page is a single statement.
+    """
+    page = (
+        select(Course.id, Course.title, Course.share_id, Course.updated_at,
+               func.substr(Course.description, 1, DESCRIPTION_PREVIEW_CHARS).label("description"))
+        .where(Course.user_id == user_id)
+        .order_by(Course.updated_at.desc(), Course.id.desc())
+        .limit(limit + 1)   # one extra row tells us whether there is a next page
+    )
+    if cursor:
+        updated_at, course_id = _decode_cursor(cursor)
+        page = page.where(or_(Course.updated_at < updated_at,
+                              and_(Course.updated_at == updated_at, Course.id < course_id)))
+    page = page.subquery()
+
+    counts = (
+        select(Module.course_id,
+               func.count(func.distinct(Module.id)).label("module_count"),
+               func.count(func.distinct(Lesson.id)).label("lesson_count"),
+               func.count(ContentBlock.id).label("block_count"))
+        .join(page, page.c.id == Module.course_id)
+        .outerjoin(Lesson, Lesson.module_id == Module.id)
+        .outerjoin(ContentBlock, ContentBlock.lesson_id == Lesson.id)
+        .group_by(Module.course_id)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(page,
+               func.coalesce(counts.c.module_count, 0).label("module_count"),
+               func.coalesce(counts.c.lesson_count, 0).label("lesson_count"),
+               func.coalesce(counts.c.block_count, 0).label("block_count"))
+        .outerjoin(counts, counts.c.course_id == page.c.id)
+        .order_by(page.c.updated_at.desc(), page.c.id.desc())
+    ).all()
+
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def _page_limit():
+    return max(1, min(request.args.get("limit", DASHBOARD_PAGE_SIZE, type=int), 100))
+
+
 @main_bp.route("/dashboard")
 @login_required
 def dashboard():
-    """User dashboard listing their own courses."""
-    user_courses = (
-        Course.query.filter_by(user_id=current_user.id)
-        .order_by(Course.updated_at.desc())
-        .all()
-    )
-    return render_template("dashboard.html", courses=user_courses)
+    """User dashboard listing their own courses, one page at a time."""
+    courses, next_cursor = dashboard_page(current_user.id, request.args.get("after"), _page_limit())
+    return render_template("dashboard.html", courses=courses, next_cursor=next_cursor,
+                           first_page=not request.args.get("after"))
+
+
+@main_bp.route("/api/courses")
+@login_required
+def dashboard_courses_api():
+    """JSON version of the dashboard: ``?after=<next_cursor>&limit=<n>``."""
+    courses, next_cursor = dashboard_page(current_user.id, request.args.get("after"), _page_limit())
+    return jsonify({
+        "courses": [
+            {
+                "id": c.id,
+                "title": c.title,
+                "description": c.description,
+                "share_id": c.share_id,
+                "updated_at": c.updated_at.isoformat(),
+                "module_count": c.module_count,
+                "lesson_count": c.lesson_count,
+                "block_count": c.block_count,
+            }
+            for c in courses
+        ],
+        "next_cursor": next_cursor,
+    })
+
+
+@main_bp.route("/course/<int:course_id>/delete", methods=["POST"])
+@login_required
+def delete_course(course_id):
+    """Delete a course and its whole tree with four set-based DELETEs."""
+    course = db.session.get(Course, course_id)
+    if course is None:
+        abort(404)
+    if course.user_id != current_user.id:
+        abort(403)
+
+    search.remove_course(course_id)
+    module_ids = select(Module.id).where(Module.course_id == course_id)
+    lesson_ids = select(Lesson.id).where(Lesson.module_id.in_(module_ids))
+    db.session.execute(delete(ContentBlock).where(ContentBlock.lesson_id.in_(lesson_ids)))
+    db.session.execute(delete(Lesson).where(Lesson.module_id.in_(module_ids)))
+    db.session.execute(delete(Module).where(Module.course_id == course_id))
+    db.session.execute(delete(Course).where(Course.id == course_id))
+    db.session.commit()
+
+    flash("Course deleted.", "success")
+    return redirect(url_for("main_bp.dashboard"))
 
 
 # ------------------------------------------------------------------
@@ -82,10 +210,100 @@ def create_course():
 # ------------------------------------------------------------------
 # Public course view
 # ------------------------------------------------------------------
+def _course_outline(course):
+    """Ordered list of (item_type, item_id) a learner steps through."""
+    outline = [("intro", course.id)]
+    for module in course.modules:            # relationships are ordered by position
+        outline.extend(("lesson", lesson.id) for lesson in module.lessons)
+    outline.append(("conclusion", course.id))
+    return outline
+
+
+def _render_course_page(share_id, item_type, item_id):
+    # The outline only needs titles and ids; the lesson body is stored pre-rendered
+    course = (
+        Course.query.options(selectinload(Course.modules).selectinload(Module.lessons))
+        .filter_by(share_id=share_id)
+        .first()
+    )
+    if not course:
+        abort(404)
+
+    current_item = None
+    lesson_html = None
+    if item_type == "lesson":
+        current_item = next((l for m in course.modules for l in m.lessons if l.id == item_id), None)
+        if current_item is None:
+            abort(404)
+        lesson_html = lesson_render.lesson_html(item_id)
+    else:
+        if item_type not in ("intro", "conclusion"):
+            item_type = "intro"
+        item_id = course.id
+
+    outline = _course_outline(course)
+    index = outline.index((item_type, item_id))
+
+    def item_url(position):
+        if 0 <= position < len(outline):
+            t, i = outline[position]
+            return url_for("main_bp.view_course", course_share_id=share_id, item_type=t, item_id=i)
+        return None
+
+    return render_template(
+        "view_course.html",
+        course=course,
+        current_item_type=item_type,
+        current_item_id=item_id,
+        current_item=current_item,
+        lesson_html=lesson_html,
+        intro_content=course.intro_content,
+        conclusion_content=course.conclusion_content,
+        prev_item_url=item_url(index - 1),
+        next_item_url=item_url(index + 1),
+    )
+
+
 @main_bp.route("/course/<course_share_id>")
 def view_course(course_share_id):
-    """Public view of a course identified by its share_id."""
-    course = Course.query.filter_by(share_id=course_share_id).first()
-    if not course:
+    """
+    Public view of a course identified by its share_id.
+
+    Only the course's revision is read up front: it yields a strong ETag, so
+    revalidating browsers and proxies get a 304 without any rendering, and
+    otherwise keys the rendered-HTML cache.
+    """
+    revision = (
+        db.session.query(Course.revision)
+        .filter_by(share_id=course_share_id)
+        .scalar()
+    )
+    if revision is None:
         abort(404)
-    return render_template("view_course.html", course=course)
+
+    item_type = request.args.get("item_type", "intro")
+    item_id = request.args.get("item_id", type=int)
+    # The navbar shows who is logged in, so pages are per viewer
+    viewer = current_user.get_id() if current_user.is_authenticated else None
+
+    key = (course_share_id, item_type, item_id, viewer, revision, PAGE_TEMPLATE_VERSION,
+           lesson_render.RENDER_VERSION)
+    etag = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+    cache_control = f"{'private' if viewer else 'public'}, max-age=0, must-revalidate"
+
+    if etag in request.if_none_match:
+        response = make_response("", 304)
+    else:
+        # Flash messages are rendered into the page, so never serve or store them from cache
+        has_flashes = bool(session.get("_flashes"))
+        html = None if has_flashes else page_cache.get(key)
+        if html is None:
+            html = _render_course_page(course_share_id, item_type, item_id)
+            if not has_flashes:
+                page_cache.set(key, html, ttl=current_app.config.get("PUBLIC_PAGE_CACHE_TTL", 3600))
+        response = make_response(html)
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    response.vary.add("Cookie")
+    return response
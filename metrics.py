@@ -0,0 +1,318 @@
+# metrics.py
+"""
+Prometheus metrics, served at ``GET /metrics``.
+
+Collected per worker process:
+
+* request latency histograms and in-flight gauges, by blueprint and endpoint;
+* AIService call latency and errors, by method;
+* database queries: count and duration per statement, and queries per
+  request, by endpoint.
+
+Gunicorn runs several worker processes, and a scrape reaches only one of
+them. So each worker writes a snapshot of its numbers to
+``METRICS_DIR/<pid>.json`` (at most once per ``METRICS_FLUSH_SECONDS``, after
+a request), and ``/metrics`` sums the snapshots of every worker. Counters and
+histograms of workers that have exited are kept, so totals never go
+backwards. In-flight gauges only count live workers. gunicorn.conf.py clears
+the directory when the server starts.
+
+Only the standard library is used; the output is the Prometheus text format.
+"""
+import atexit
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+from flask import Blueprint, Response, abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+AI_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+# name -> (type, help, label names, buckets)
+METRICS = {
+    "minicourse_http_request_duration_seconds": (
+        "histogram", "Time to produce a response (streamed bodies excluded).",
+        ("blueprint", "endpoint", "method", "status"), LATENCY_BUCKETS),
+    "minicourse_http_requests_in_flight": (
+        "gauge", "Requests being handled right now.", ("blueprint", "endpoint"), None),
+    "minicourse_ai_call_duration_seconds": (
+        "histogram", "AIService call latency, cache hits included.", ("method", "outcome"), AI_BUCKETS),
+    "minicourse_ai_call_errors_total": (
+        "counter", "AIService calls that raised.", ("method", "error"), None),
+    "minicourse_db_query_duration_seconds": (
+        "histogram", "Time per SQL statement.", ("endpoint",), QUERY_BUCKETS),
+    "minicourse_db_queries_per_request": (
+        "histogram", "SQL statements issued while handling one request.", ("endpoint",), QUERY_COUNT_BUCKETS),
+    "minicourse_worker_processes": (
+        "gauge", "Live worker processes contributing to these metrics.", (), None),
+}
+
+
+class Registry:
+    """This process's metric values: ``{name: {label values: value}}``."""
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        # A forked worker must not report the master's numbers as its own
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.values = {name: {} for name in METRICS}
+
+    def _series(self, name):
+        if self._pid != os.getpid():
+            self._reset()
+        return self.values[name]
+
+    def inc(self, name, labels, amount=1):
+        series = self._series(name)
+        with self._lock:
+            series[labels] = series.get(labels, 0) + amount
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][3]
+        series = self._series(name)
+        with self._lock:
+            state = series.get(labels)
+            if state is None:
+                state = series[labels] = {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    state["buckets"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def snapshot(self):
+        """JSON-ready copy: ``{name: [[label values, value], ...]}``."""
+        if self._pid != os.getpid():
+            self._reset()
+        with self._lock:
+            return {name: [[list(labels), dict(value, buckets=list(value["buckets"])) if isinstance(value, dict)
+                            else value] for labels, value in series.items()]
+                    for name, series in self.values.items()}
+
+
+registry = Registry()
+_flush_state = {"pid": None, "last": 0.0}
+
+
+# --- Snapshots shared between workers --- #
+
+def _snapshot_path(directory, pid):
+    return os.path.join(directory, f"{pid}.json")
+
+
+def flush(directory):
+    """Write this process's snapshot (atomically, so readers never see half a file)."""
+    os.makedirs(directory, exist_ok=True)
+    path = _snapshot_path(directory, os.getpid())
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(tmp_path, path)
+    _flush_state["last"] = time.monotonic()
+
+
+def _maybe_flush(app):
+    directory = app.config["METRICS_DIR"]
+    if _flush_state["pid"] != os.getpid():
+        # First request in this process: also write the final numbers on exit
+        _flush_state["pid"] = os.getpid()
+        _flush_state["last"] = 0.0
+        atexit.register(flush, directory)
+    if time.monotonic() - _flush_state["last"] >= app.config["METRICS_FLUSH_SECONDS"]:
+        flush(directory)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(total, name, labels, value):
+    kind = METRICS[name][0]
+    series = total.setdefault(name, {})
+    if kind == "histogram":
+        state = series.setdefault(labels, {"buckets": [0] * len(value["buckets"]), "sum": 0.0, "count": 0})
+        state["buckets"] = [a + b for a, b in zip(state["buckets"], value["buckets"])]
+        state["sum"] += value["sum"]
+        state["count"] += value["count"]
+    else:
+        series[labels] = series.get(labels, 0) + value
+
+
+def collect(directory):
+    """Sum the snapshots of every worker (this one live, the others from disk)."""
+    total, live = {}, 0
+    snapshots = [(os.getpid(), registry.snapshot())]
+    if os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            if not filename.endswith(".json") or filename == f"{os.getpid()}.json":
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as f:
+                    snapshots.append((int(filename[:-len(".json")]), json.load(f)))
+            except (OSError, ValueError):
+                continue   # a worker exiting mid-read; its last numbers come next scrape
+    for pid, snapshot in snapshots:
+        alive = pid == os.getpid() or _alive(pid)
+        live += alive
+        for name, series in snapshot.items():
+            if name not in METRICS or (METRICS[name][0] == "gauge" and not alive):
+                continue
+            for labels, value in series:
+                _merge(total, name, tuple(labels), value)
+    total["minicourse_worker_processes"] = {(): live}
+    return total
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values, extra=""):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render(total):
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for name, (kind, help_text, label_names, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(total.get(name, {}).items()):
+            if kind != "histogram":
+                lines.append(f"{name}{_label_text(label_names, labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, value["buckets"]):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{name}_bucket{_label_text(label_names, labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{name}_bucket{_label_text(label_names, labels, le)} {value['count']}")
+            lines.append(f"{name}_sum{_label_text(label_names, labels)} {value['sum']}")
+            lines.append(f"{name}_count{_label_text(label_names, labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Instrumentation --- #
+
+def _endpoint_labels():
+    return (request.blueprint or "app", request.endpoint or "unmatched")
+
+
+def _before_request():
+    g._metrics_started = time.perf_counter()
+    g._metrics_queries = 0
+    registry.inc("minicourse_http_requests_in_flight", _endpoint_labels())
+
+
+def _after_request(response):
+    g._metrics_status = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    started = g.pop("_metrics_started", None)
+    if started is None:
+        return
+    blueprint, endpoint = _endpoint_labels()
+    registry.inc("minicourse_http_requests_in_flight", (blueprint, endpoint), -1)
+    status = g.pop("_metrics_status", 500)
+    registry.observe("minicourse_http_request_duration_seconds",
+                     (blueprint, endpoint, request.method, str(status)), time.perf_counter() - started)
+    registry.observe("minicourse_db_queries_per_request", (endpoint,), g.pop("_metrics_queries", 0))
+    _maybe_flush(current_app)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["metrics_started"].pop()
+    endpoint = "background"
+    if has_request_context():
+        endpoint = request.endpoint or "unmatched"
+        g._metrics_queries = g.get("_metrics_queries", 0) + 1
+    registry.observe("minicourse_db_query_duration_seconds", (endpoint,), time.perf_counter() - started)
+
+
+def ai_call_metrics(method_name):
+    """Time an AIService method (or stream, until it is exhausted) and count its errors."""
+    def record(started, error=None):
+        registry.observe("minicourse_ai_call_duration_seconds",
+                         (method_name, "error" if error else "ok"), time.perf_counter() - started)
+        if error is not None:
+            registry.inc("minicourse_ai_call_errors_total", (method_name, type(error).__name__))
+
+    def decorator(fn):
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def stream_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    result = yield from fn(*args, **kwargs)
+                except GeneratorExit:
+                    raise   # the client went away; not the provider's fault
+                except Exception as e:
+                    record(started, e)
+                    raise
+                record(started)
+                return result
+            return stream_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                record(started, e)
+                raise
+            record(started)
+            return result
+        return wrapper
+    return decorator
+
+
+def init_app(app, engine):
+    """Hook request timing into ``app`` and query timing into ``engine``."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# --- Endpoint --- #
+
+metrics_bp = Blueprint("metrics_bp", __name__)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics_route():
+    """Prometheus scrape target; requires ``Authorization: Bearer $METRICS_TOKEN`` if that is set."""
+    token = current_app.config.get("METRICS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        abort(401)
+    body = render(collect(current_app.config["METRICS_DIR"]))
+    return Response(body, mimetype="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,162 @@
+# migrations.py
+"""
+Versioned schema migrations.
+
+Each migration has a number and is recorded in ``schema_migrations`` once it
+has run, so ``upgrade()`` only applies the ones a database is missing. They
+are also written to be idempotent (they check the live schema first), so a
+database created from the current models by the baseline simply records the
+later steps as done.
+
+To change the schema: update the model, then append a migration here that
+brings existing databases to the same shape. Never edit one that has shipped.
+"""
+import os
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import inspect, text
+
+from main import db
+
+try:
+    import fcntl
+except ImportError:          # Windows dev machines: no cross-process lock
+    fcntl = None
+
+
+# --- Helpers --- #
+
+def column_names(table):
+    return {c["name"] for c in inspect(db.engine).get_columns(table)}
+
+
+def add_column_if_missing(table, column, ddl):
+    """``ALTER TABLE table ADD COLUMN column ddl`` unless the column already exists."""
+    if column not in column_names(table):
+        db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+# --- Migrations --- #
+
+def baseline():
+    """Create any missing tables from the current models."""
+    db.create_all()
+
+
+def fractional_positions():
+    """Module/lesson/block positions became fractional string keys (positions.py)."""
+    from positions import convert_integer_positions
+    convert_integer_positions()
+
+
+def ai_job_progress():
+    add_column_if_missing("ai_job", "progress", "TEXT")
+
+
+def content_block_version():
+    add_column_if_missing("content_block", "version", "INTEGER NOT NULL DEFAULT 1")
+
+
+def course_indexes():
+    """Composite indexes for the dashboard, sibling ordering and cascading deletes."""
+    from course import Course, Module, Lesson, ContentBlock
+    conn = db.session.connection()
+    for model in (Course, Module, Lesson, ContentBlock):
+        for index in model.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def search_index():
+    """Full-text index (search.py), filled from the existing content."""
+    from sqlalchemy.exc import OperationalError
+    from search import rebuild_search_index
+    try:
+        rebuild_search_index()
+    except OperationalError as e:   # SQLite built without FTS5
+        db.session.rollback()
+        current_app.logger.warning(f"Skipping search index: {e}")
+
+
+def lesson_rendered_html():
+    """Pre-rendered lesson HTML (lesson_render.py), filled from the existing blocks."""
+    add_column_if_missing("lesson", "rendered_html", "TEXT")
+    add_column_if_missing("lesson", "embeds", "TEXT")
+    add_column_if_missing("lesson", "render_version", "INTEGER")
+    from lesson_render import rebuild_rendered_lessons
+    rebuild_rendered_lessons()
+
+
+def course_revision():
+    """Integer revision for the public page cache and ETag (updated_at is second-granular on MySQL)."""
+    add_column_if_missing("course", "revision", "INTEGER NOT NULL DEFAULT 1")
+
+
+MIGRATIONS = [
+    (1, "baseline", baseline),
+    (2, "fractional_positions", fractional_positions),
+    (3, "ai_job_progress", ai_job_progress),
+    (4, "content_block_version", content_block_version),
+    (5, "course_indexes", course_indexes),
+    (6, "search_index", search_index),
+    (7, "lesson_rendered_html", lesson_rendered_html),
+    (8, "course_revision", course_revision),
+]
+
+
+# --- Runner --- #
+
+def _ensure_version_table():
+    db.session.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INTEGER PRIMARY KEY,"
+        " name VARCHAR(120) NOT NULL,"
+        " applied_at DATETIME NOT NULL)"
+    ))
+    db.session.commit()
+
+
+def applied_versions():
+    _ensure_version_table()
+    return {row[0] for row in db.session.execute(text("SELECT version FROM schema_migrations"))}
+
+
+@contextmanager
+def _migration_lock(app):
+    """Serialize upgrades between processes on this host (e.g. workers booting together)."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(app.instance_path, "migrate.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def upgrade(app):
+    """Apply pending migrations in order. Returns the names of those applied."""
+    os.makedirs(app.instance_path, exist_ok=True)
+    applied = []
+    with _migration_lock(app):
+        done = applied_versions()
+        for version, name, migrate in MIGRATIONS:
+            if version in done:
+                continue
+            app.logger.info(f"Applying migration {version}: {name}")
+            migrate()
+            db.session.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": version, "n": name, "t": datetime.utcnow()},
+            )
+            db.session.commit()
+            applied.append(name)
+    return applied
+
+
+def pending():
+    """Migrations not yet applied to the configured database."""
+    done = applied_versions()
+    return [(version, name) for version, name, _ in MIGRATIONS if version not in done]
@@ -0,0 +1,281 @@
+# positions.py
+"""
+Fractional (lexorank-style) sort keys for modules, lessons and blocks.
+
+A position is a string of base-36 digits read as a fraction, so a key that
+sorts between any two others always exists. Moving an item only rewrites
+that item's key; siblings are left alone. Keys only use 0-9a-z, so they sort
+the same under SQLite's binary collation and MySQL's case-insensitive ones.
+
+Keys get longer as items are squeezed into the same gap. Once a key passes
+POSITION_MAX_LENGTH, the siblings are rebalanced to short, evenly spaced keys
+on a background thread, after the transaction that wrote it commits.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+
+from flask import current_app
+from sqlalchemy import MetaData, case, event, func, inspect, text
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateTable
+
+from main import db
+from course import Module, Lesson, ContentBlock
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+
+# Rebalance a sibling list once any key grows past this many characters
+POSITION_MAX_LENGTH = 24
+
+# model -> column holding the parent id its positions are scoped to
+PARENT_COLUMNS = {
+    Module: Module.course_id,
+    Lesson: Lesson.module_id,
+    ContentBlock: ContentBlock.lesson_id,
+}
+
+
+def _digit(key, i):
+    return DIGITS.index(key[i]) if i < len(key) else 0
+
+
+def _midpoint(a: str, b):
+    """Key strictly between fractions ``a`` and ``b`` (``b=None`` means 1.0)."""
+    if b is not None:
+        # Share the common prefix, then find a midpoint in the remainder
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else "0") == b[n]:
+            n += 1
+        if n:
+            return b[:n] + _midpoint(a[n:], b[n:])
+    digit_a = _digit(a, 0)
+    digit_b = DIGITS.index(b[0]) if b is not None else BASE
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b) // 2]
+    # Consecutive digits: keep a's first digit and split the rest
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def key_between(before=None, after=None) -> str:
+    """Return a key sorting after ``before`` and before ``after`` (either may be None)."""
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f"{before!r} must sort before {after!r}")
+    if after is None and before:
+        # Appending is the common case: bump the last digit instead of halving
+        # the remaining space, so keys grow one char per ~17 appends, not ~5.
+        last = DIGITS.index(before[-1])
+        if last < BASE - 1:
+            return before[:-1] + DIGITS[last + 1]
+    return _midpoint(before or "", after)
+
+
+def evenly_spaced_keys(count: int) -> list:
+    """``count`` short keys spread evenly over the whole key space."""
+    width = 1
+    while BASE ** width <= count:
+        width += 1
+    span = BASE ** width
+    keys = []
+    for i in range(1, count + 1):
+        value = i * span // (count + 1)
+        digits = []
+        for _ in range(width):
+            value, rem = divmod(value, BASE)
+            digits.append(DIGITS[rem])
+        keys.append("".join(reversed(digits)).rstrip("0"))
+    return keys
+
+
+def sequential_keys(width: int = 4):
+    """Increasing fixed-width keys for appending items whose total count isn't known yet."""
+    for value in range(1, BASE ** width):
+        if value % BASE:   # a trailing "0" would equal the shorter key
+            digits = []
+            for _ in range(width):
+                value, rem = divmod(value, BASE)
+                digits.append(DIGITS[rem])
+            yield "".join(reversed(digits))
+
+
+def last_position(model, parent_id):
+    """Current largest key among the siblings under ``parent_id``."""
+    return db.session.query(func.max(model.position)).filter(PARENT_COLUMNS[model] == parent_id).scalar()
+
+
+def neighbour_positions(model, item, direction):
+    """Keys of the next two siblings above ("up") or below ("down") ``item``."""
+    parent = PARENT_COLUMNS[model]
+    query = db.session.query(model.position).filter(parent == getattr(item, parent.key))
+    if direction == "up":
+        query = query.filter(model.position < item.position).order_by(model.position.desc())
+    else:
+        query = query.filter(model.position > item.position).order_by(model.position)
+    return [row[0] for row in query.limit(2).all()]
+
+
+def needs_rebalance(key: str) -> bool:
+    return len(key) > POSITION_MAX_LENGTH
+
+
+def write_order(model, ordered_ids):
+    """
+    Give ``ordered_ids`` evenly spaced keys in that order.
+
+    This is one ``UPDATE ... SET position = CASE id WHEN ... END`` statement,
+    however many rows there are. The caller commits.
+    """
+    if not ordered_ids:
+        return
+    keys = evenly_spaced_keys(len(ordered_ids))
+    db.session.query(model).filter(model.id.in_(ordered_ids)).update(
+        {model.position: case(dict(zip(ordered_ids, keys)), value=model.id)},
+        synchronize_session=False,
+    )
+
+
+def rebalance_siblings(model, parent_id):
+    """Rewrite every sibling's key to an evenly spaced one, preserving order."""
+    ids = [row[0] for row in
+           db.session.query(model.id)
+           .filter(PARENT_COLUMNS[model] == parent_id)
+           .order_by(model.position, model.id)
+           .all()]
+    write_order(model, ids)
+    db.session.commit()
+    return len(ids)
+
+
+# --- Background rebalancing --- #
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_pending = set()
+_REBALANCE_PENDING = "rebalance_pending"
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rebalance")
+            _executor_pid = os.getpid()
+            _pending.clear()
+        return _executor
+
+
+def _run_rebalance(app, model, parent_id):
+    try:
+        with app.app_context():
+            try:
+                count = rebalance_siblings(model, parent_id)
+                app.logger.info(f"Rebalanced {count} {model.__tablename__} positions under parent {parent_id}")
+            except Exception as e:
+                app.logger.error(f"Rebalancing {model.__tablename__} under {parent_id} failed: {e}")
+            finally:
+                db.session.remove()
+    finally:
+        with _executor_lock:
+            _pending.discard((model, parent_id))
+
+
+def _submit_rebalance(app, model, parent_id):
+    executor = _get_executor()
+    with _executor_lock:
+        if (model, parent_id) in _pending:
+            return
+        _pending.add((model, parent_id))
+    executor.submit(_run_rebalance, app, model, parent_id)
+
+
+def schedule_rebalance(model, parent_id, session=None):
+    """
+    Rebalance the siblings under ``parent_id`` on a background thread once
+    the session commits (deduplicated).
+
+    Waiting for the commit matters: the key that triggered this was computed
+    against the current neighbours, so the rebalance must see it in place.
+    """
+    if parent_id is None:   # a parent created in this transaction; its children have short keys
+        return
+    session = session or db.session()
+    session.info.setdefault(_REBALANCE_PENDING, set()).add(
+        (current_app._get_current_object(), model, parent_id))
+
+
+@event.listens_for(Session, "after_commit")
+def _submit_scheduled_rebalances(session):
+    for app, model, parent_id in session.info.pop(_REBALANCE_PENDING, ()):
+        _submit_rebalance(app, model, parent_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_scheduled_rebalances(session, previous_transaction):
+    session.info.pop(_REBALANCE_PENDING, None)
+
+
+# --- Conversion from integer positions --- #
+
+def convert_integer_positions():
+    """
+    Convert module/lesson/content_block positions from integers to fractional keys.
+
+    Existing integer order is kept. On SQLite the tables are rebuilt, because
+    an INTEGER column would coerce numeric-looking keys such as "5" back to
+    integers.
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    converted = []
+    for model in PARENT_COLUMNS:
+        table = model.__tablename__
+        columns = {c["name"]: c for c in inspector.get_columns(table)}
+        if "position" not in columns or not str(columns["position"]["type"]).upper().startswith(("INT", "BIGINT", "SMALLINT")):
+            continue
+
+        parent = PARENT_COLUMNS[model].key
+        rows = db.session.execute(
+            text(f"SELECT id, {parent}, position FROM {table} ORDER BY {parent}, position, id")
+        ).all()
+        # Rows arrive grouped by parent, so one pass assigns every sibling list
+        new_keys = []
+        for _, siblings in groupby(rows, key=itemgetter(1)):
+            ids = [r[0] for r in siblings]
+            new_keys.extend({"id": item_id, "key": key} for item_id, key in zip(ids, evenly_spaced_keys(len(ids))))
+
+        if engine.dialect.name == "sqlite":
+            _rebuild_sqlite_table(model, columns)
+        else:
+            db.session.execute(text(f"ALTER TABLE {table} MODIFY position VARCHAR(255) NOT NULL"))
+
+        if new_keys:
+            db.session.execute(text(f"UPDATE {table} SET position = :key WHERE id = :id"), new_keys)
+        db.session.commit()
+        converted.append(table)
+    return converted
+
+
+def _rebuild_sqlite_table(model, existing_columns):
+    """Recreate ``model``'s table with the current schema, keeping its rows."""
+    table = model.__table__
+    scratch = MetaData()
+    for other in db.metadata.tables.values():   # so foreign keys can resolve
+        other.to_metadata(scratch)
+    new_table = table.to_metadata(scratch, name=f"{table.name}_new")
+    columns = ", ".join(c.name for c in table.columns if c.name in existing_columns)
+    conn = db.session.connection()
+    # SQLite's recommended sequence: create new, copy, drop old, rename new.
+    # Renaming the old table instead would repoint other tables' foreign keys at it.
+    conn.execute(text(f"DROP TABLE IF EXISTS {new_table.name}"))   # left over from an interrupted run
+    conn.execute(CreateTable(new_table))
+    conn.execute(text(f"INSERT INTO {new_table.name} ({columns}) SELECT {columns} FROM {table.name}"))
+    conn.execute(text(f"DROP TABLE {table.name}"))
+    conn.execute(text(f"ALTER TABLE {new_table.name} RENAME TO {table.name}"))
+    for index in table.indexes:
+        index.create(conn)
@@ -0,0 +1,72 @@
+# query_plans.py
+"""
+Query-plan checks for the hot editor and dashboard queries.
+
+``check_query_plans()`` asks the database how it would run each query in
+``hot_queries()`` and reports any that scan a whole table instead of
+using an index. Run it with ``flask --app wsgi db check-plans`` after changing
+indexes or queries.
+"""
+from sqlalchemy import func, select, text
+
+from main import db
+from course import Course, Module, Lesson, ContentBlock
+
+
+def hot_queries():
+    """(name, statement) pairs shaped like the queries the routes issue."""
+    return [
+        ("dashboard", select(Course).where(Course.user_id == 1)
+            .order_by(Course.updated_at.desc(), Course.id.desc())),
+        ("public course by share_id", select(Course.revision).where(Course.share_id == "abc")),
+        ("course modules", select(Module).where(Module.course_id == 1).order_by(Module.position)),
+        ("module lessons", select(Lesson).where(Lesson.module_id == 1).order_by(Lesson.position)),
+        ("lesson blocks", select(ContentBlock).where(ContentBlock.lesson_id == 1)
+            .order_by(ContentBlock.position)),
+        ("lessons of many modules (selectinload)", select(Lesson).where(Lesson.module_id.in_([1, 2, 3]))
+            .order_by(Lesson.position)),
+        ("append module: max position", select(func.max(Module.position)).where(Module.course_id == 1)),
+        ("append lesson: max position", select(func.max(Lesson.position)).where(Lesson.module_id == 1)),
+        ("append block: max position", select(func.max(ContentBlock.position))
+            .where(ContentBlock.lesson_id == 1)),
+        ("move: neighbour above", select(ContentBlock.position)
+            .where(ContentBlock.lesson_id == 1, ContentBlock.position < "m")
+            .order_by(ContentBlock.position.desc()).limit(2)),
+        ("block ownership join", select(ContentBlock)
+            .join(Lesson, Lesson.id == ContentBlock.lesson_id)
+            .join(Module, Module.id == Lesson.module_id)
+            .join(Course, Course.id == Module.course_id)
+            .where(ContentBlock.id == 1)),
+        ("course tree lessons in module order", select(Lesson.id).join(Module, Module.id == Lesson.module_id)
+            .where(Module.course_id == 1).order_by(Module.position, Lesson.position)),
+    ]
+
+
+def _sqlite_problems(rows):
+    # "SCAN t" without "USING ... INDEX" reads the whole table. A temp B-tree
+    # sort is fine when merging several index ranges (IN lists, joins).
+    return [row[-1] for row in rows if row[-1].startswith("SCAN ") and " USING " not in row[-1]]
+
+
+def _mysql_problems(rows):
+    # EXPLAIN columns: id, select_type, table, partitions, type, possible_keys, key, ...
+    return [f"full scan of {row[2]}" for row in rows if row[4] == "ALL"]
+
+
+def check_query_plans():
+    """Return ``[(name, plan_lines, problems)]`` for every hot query."""
+    dialect = db.engine.dialect
+    if dialect.name == "sqlite":
+        prefix, read_problems = "EXPLAIN QUERY PLAN ", _sqlite_problems
+    elif dialect.name == "mysql":
+        prefix, read_problems = "EXPLAIN ", _mysql_problems
+    else:
+        raise RuntimeError(f"No query-plan check for {dialect.name}")
+
+    results = []
+    for name, statement in hot_queries():
+        sql = str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+        rows = db.session.execute(text(prefix + sql)).all()
+        plan = [" | ".join(str(v) for v in row) for row in rows]
+        results.append((name, plan, read_problems(rows)))
+    return results
@@ -0,0 +1,152 @@
+# query_profiler.py
+"""
+Opt-in SQL profiling per request (``QUERY_PROFILER=1``).
+
+Lazy relationship chains (block -> lesson -> module -> course) and template
+loops over ``module.lessons`` hide query storms. With the profiler on, every
+request records its statements from SQLAlchemy engine events and reports:
+
+* a ``Server-Timing`` header (``db;dur=..;desc="N queries"`` and
+  ``app;dur=..``), shown in the browser's network panel;
+* one structured log line (JSON after ``query_profile``) with the count,
+  total time, and statements that ran more than once;
+* a ``slow_query`` warning for each statement slower than
+  ``QUERY_PROFILER_SLOW_MS``;
+* an ``n_plus_one`` warning when the same parameterized statement runs
+  ``QUERY_PROFILER_N_PLUS_ONE`` times or more in one request, with the line
+  of app code that issued it.
+
+Statements are grouped by their SQL text. SQLAlchemy binds parameters, so a
+lazy load repeated for 20 rows shows up as one statement with count 20.
+Parameter values are never logged.
+"""
+import json
+import logging
+import os
+import re
+import time
+import traceback
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+STATEMENT_LOG_CHARS = 300
+SELECT_LIST = re.compile(r"^SELECT .+? FROM ", re.IGNORECASE | re.DOTALL)
+
+
+class RequestProfile:
+    """Statements issued while handling one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.db_seconds = 0.0
+        self.statements = Counter()
+        self.seconds_by_statement = Counter()
+        self.call_sites = {}   # statement -> "file:line in function", once it looks like N+1
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.db_seconds += seconds
+        self.statements[statement] += 1
+        self.seconds_by_statement[statement] += seconds
+
+    def duplicates(self):
+        return [{"statement": _shorten(statement), "count": count,
+                 "ms": round(self.seconds_by_statement[statement] * 1000, 2),
+                 "call_site": self.call_sites.get(statement)}
+                for statement, count in self.statements.most_common() if count > 1]
+
+    def server_timing(self):
+        app_ms = (time.perf_counter() - self.started) * 1000
+        return (f'db;dur={self.db_seconds * 1000:.1f};desc="{self.count} queries", '
+                f"app;dur={app_ms:.1f}")
+
+
+def _shorten(statement):
+    # The column list is long and says little; keep the FROM/WHERE that identify the query
+    statement = SELECT_LIST.sub("SELECT ... FROM ", " ".join(statement.split()), count=1)
+    return statement if len(statement) <= STATEMENT_LOG_CHARS else statement[:STATEMENT_LOG_CHARS] + "..."
+
+
+def _call_site():
+    """The innermost frame in this app's own code (not SQLAlchemy's, Flask's or ours)."""
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if (filename.startswith(APP_ROOT) and "site-packages" not in filename
+                and filename != os.path.abspath(__file__)):
+            return f"{os.path.relpath(filename, APP_ROOT)}:{frame.lineno} in {frame.name}"
+    return None
+
+
+def _log(level, event_name, **fields):
+    current_app.logger.log(level, "%s %s", event_name, json.dumps(fields, default=str))
+
+
+# --- Engine events --- #
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("profiler_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["profiler_started"].pop()
+    if not has_request_context():
+        return
+    profile = g.get("_query_profile")
+    if profile is None:
+        return
+    profile.record(statement, seconds)
+    config = current_app.config
+    if seconds * 1000 >= config["QUERY_PROFILER_SLOW_MS"]:
+        _log(logging.WARNING, "slow_query", endpoint=request.endpoint, ms=round(seconds * 1000, 2),
+             statement=_shorten(statement), call_site=_call_site())
+    if profile.statements[statement] == config["QUERY_PROFILER_N_PLUS_ONE"]:
+        # Logged once per statement when it crosses the threshold; the final
+        # count is in the request's query_profile line
+        profile.call_sites[statement] = _call_site()
+        _log(logging.WARNING, "n_plus_one", endpoint=request.endpoint, method=request.method,
+             path=request.path, count=profile.statements[statement], statement=_shorten(statement),
+             call_site=profile.call_sites[statement])
+
+
+# --- Request hooks --- #
+
+def _before_request():
+    g._query_profile = RequestProfile()
+
+
+def _after_request(response):
+    profile = g.get("_query_profile")
+    if profile is not None:
+        timing = profile.server_timing()
+        existing = response.headers.get("Server-Timing")
+        response.headers["Server-Timing"] = f"{existing}, {timing}" if existing else timing
+        g._query_profile_status = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    profile = g.pop("_query_profile", None)
+    if profile is None:
+        return
+    _log(logging.INFO, "query_profile", method=request.method, path=request.path,
+         endpoint=request.endpoint, status=g.pop("_query_profile_status", 500), queries=profile.count,
+         db_ms=round(profile.db_seconds * 1000, 2),
+         duration_ms=round((time.perf_counter() - profile.started) * 1000, 2),
+         duplicates=profile.duplicates())
+
+
+def init_app(app, engine):
+    """Profile every request of ``app`` if QUERY_PROFILER_ENABLED is set."""
+    if not app.config.get("QUERY_PROFILER_ENABLED"):
+        return
+    if app.logger.level == logging.NOTSET:
+        app.logger.setLevel(logging.INFO)   # the per-request line is INFO
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
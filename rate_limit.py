@@ -0,0 +1,171 @@
+# rate_limit.py
+"""
+Admission control for the AI endpoints.
+
+Every AI call must pass two limits, once per user and once for the whole
+site:
+
+* a token bucket: ``*_PER_MINUTE`` tokens refill steadily up to ``*_BURST``,
+  and each call spends one (a course-wide batch spends more);
+* a concurrency cap: at most ``*_CONCURRENT`` calls may be in flight. A call
+  holds a lease from admission until its job or stream ends.
+
+State lives in a small SQLite file, so every gunicorn worker on the host
+enforces the same limits. Each decision is one short write transaction.
+Leases expire after ``lease_ttl`` seconds, so a worker that dies mid-call
+doesn't hold a slot forever. Admissions and rejections (by reason) are
+counted in the same file for ``/ai/limits/stats``.
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# Nothing tells us when a running call will end, so concurrency rejections
+# suggest a short fixed wait
+CONCURRENCY_RETRY_AFTER = 2.0
+
+
+class RateLimited(Exception):
+    """The call was refused; ``retry_after`` is in seconds."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AIRateLimiter:
+    """Token buckets and concurrency leases shared by every process on the host."""
+
+    def __init__(self, path=None, enabled=True, user_per_minute=20, user_burst=10, user_concurrent=2,
+                 global_per_minute=300, global_burst=60, global_concurrent=16, lease_ttl=600):
+        self.path = path
+        self.enabled = enabled
+        self.user_per_minute = user_per_minute
+        self.user_burst = user_burst
+        self.user_concurrent = user_concurrent
+        self.global_per_minute = global_per_minute
+        self.global_burst = global_burst
+        self.global_concurrent = global_concurrent
+        self.lease_ttl = lease_ttl
+        self._local = threading.local()
+
+    def init_app(self, app):
+        self.enabled = app.config.get("AI_RATE_LIMIT_ENABLED", self.enabled)
+        self.path = app.config.get("AI_RATE_LIMIT_PATH", self.path)
+        for name in ("user_per_minute", "user_burst", "user_concurrent",
+                     "global_per_minute", "global_burst", "global_concurrent", "lease_ttl"):
+            setattr(self, name, app.config.get(f"AI_RATE_{name.upper()}", getattr(self, name)))
+
+    def _connect(self):
+        # Per thread and per process, like SQLiteCacheStore
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS bucket ("
+                         " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS lease ("
+                         " id TEXT PRIMARY KEY, user_key TEXT NOT NULL, expires_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_lease_user_key ON lease (user_key)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counter ("
+                         " name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _tokens(conn, key, per_minute, burst, now):
+        row = conn.execute("SELECT tokens, updated_at FROM bucket WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return float(burst)
+        return min(float(burst), row[0] + (now - row[1]) * per_minute / 60.0)
+
+    @staticmethod
+    def _count(conn, name):
+        conn.execute("INSERT INTO counter (name, value) VALUES (?, 1)"
+                     " ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,))
+
+    def acquire(self, user_id, cost=1):
+        """
+        Admit one AI call for ``user_id`` or raise RateLimited.
+
+        Returns a lease id to pass to ``release()`` when the call ends (None
+        when limiting is disabled).
+        """
+        if not self.enabled:
+            return None
+        user_key = f"user:{user_id}"
+        scopes = [
+            ("user", user_key, self.user_per_minute, self.user_burst, self.user_concurrent),
+            ("global", "global", self.global_per_minute, self.global_burst, self.global_concurrent),
+        ]
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")   # one writer at a time across all workers
+        try:
+            conn.execute("DELETE FROM lease WHERE expires_at <= ?", (now,))
+            refused, spend = [], []
+            for scope, key, per_minute, burst, concurrent in scopes:
+                if per_minute > 0:
+                    need = min(cost, burst)   # a call larger than the burst would never fit
+                    tokens = self._tokens(conn, key, per_minute, burst, now)
+                    if tokens < need:
+                        refused.append((f"{scope}_rate", (need - tokens) * 60.0 / per_minute))
+                    spend.append((key, tokens - need))
+                if concurrent > 0:
+                    if scope == "user":
+                        active = conn.execute("SELECT COUNT(*) FROM lease WHERE user_key = ?",
+                                              (user_key,)).fetchone()[0]
+                    else:
+                        active = conn.execute("SELECT COUNT(*) FROM lease").fetchone()[0]
+                    if active >= concurrent:
+                        refused.append((f"{scope}_concurrency", CONCURRENCY_RETRY_AFTER))
+
+            if refused:
+                reason, retry_after = max(refused, key=lambda r: r[1])
+                self._count(conn, "rejected")
+                self._count(conn, f"rejected:{reason}")
+                conn.execute("COMMIT")
+                raise RateLimited(reason, retry_after)
+
+            conn.executemany("INSERT OR REPLACE INTO bucket (key, tokens, updated_at) VALUES (?, ?, ?)",
+                             [(key, tokens, now) for key, tokens in spend])
+            lease_id = uuid.uuid4().hex
+            conn.execute("INSERT INTO lease (id, user_key, expires_at) VALUES (?, ?, ?)",
+                         (lease_id, user_key, now + self.lease_ttl))
+            self._count(conn, "admitted")
+            conn.execute("COMMIT")
+            return lease_id
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def release(self, lease_id):
+        """End the call holding ``lease_id`` (no-op for None or an expired lease)."""
+        if lease_id is not None:
+            self._connect().execute("DELETE FROM lease WHERE id = ?", (lease_id,))
+
+    def stats(self):
+        limits = {name: getattr(self, name) for name in (
+            "user_per_minute", "user_burst", "user_concurrent",
+            "global_per_minute", "global_burst", "global_concurrent")}
+        if not self.enabled:
+            return {"enabled": False, "limits": limits}
+        conn = self._connect()
+        return {
+            "enabled": True,
+            "limits": limits,
+            "active_leases": conn.execute("SELECT COUNT(*) FROM lease WHERE expires_at > ?",
+                                          (time.time(),)).fetchone()[0],
+            "counters": dict(conn.execute("SELECT name, value FROM counter ORDER BY name").fetchall()),
+        }
+
+
+# Shared instance used by ai_routes.py; configured in create_app()
+ai_rate_limiter = AIRateLimiter()
@@ -0,0 +1,346 @@
+# search.py
+"""
+Full-text search over a user's courses, lessons and block content.
+
+One row per searchable item lives in ``search_index``:
+- on SQLite, an FTS5 virtual table (porter stemming, bm25 ranking, native snippets)
+- on MySQL, an InnoDB table with a FULLTEXT index
+
+The row id encodes the item (``item_id * 4 + kind``), so updating or
+deleting one document is a primary-key operation.
+
+The index is kept up to date incrementally. A session ``after_flush`` hook
+re-indexes every Course, Lesson and ContentBlock the flush inserted, changed
+or deleted, in the same transaction. Code that writes with bulk UPDATE or
+DELETE statements, which bypass the ORM, calls ``index_block`` /
+``remove_course`` / ``reindex_course`` itself. ``flask search rebuild``
+re-creates the whole index.
+"""
+import html
+import json
+import re
+from html.parser import HTMLParser
+
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.orm import Session
+
+from main import db
+from course import Course, Module, Lesson, ContentBlock
+
+KIND_CODES = {"course": 1, "lesson": 2, "block": 3}
+KIND_NAMES = {code: kind for kind, code in KIND_CODES.items()}
+
+# Snippet markers that cannot occur in indexed text; swapped for <mark> after escaping
+_OPEN, _CLOSE = "\x02", "\x03"
+
+
+def row_id(kind, item_id):
+    return item_id * 4 + KIND_CODES[kind]
+
+
+# --- Text extraction --- #
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+
+    def handle_data(self, data):
+        self.parts.append(data)
+
+
+def html_to_text(markup):
+    if not markup:
+        return ""
+    parser = _TextExtractor()
+    parser.feed(markup)
+    parser.close()
+    return " ".join(" ".join(parser.parts).split())
+
+
+def block_text(content):
+    """Searchable text of a block payload (text/action HTML, quiz, image alt)."""
+    parts = [html_to_text(content.get("html"))]
+    parts.append(content.get("question") or "")
+    parts.extend(str(option) for option in content.get("options") or [])
+    parts.append(content.get("alt") or "")
+    return " ".join(p for p in parts if p)
+
+
+# --- Schema --- #
+
+def create_search_index(connection):
+    if connection.dialect.name == "sqlite":
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            " title, body,"
+            " kind UNINDEXED, course_id UNINDEXED, lesson_id UNINDEXED, user_id UNINDEXED,"
+            " tokenize = 'porter unicode61 remove_diacritics 2')"
+        ))
+    else:
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS search_index ("
+            " rowid BIGINT PRIMARY KEY,"
+            " title TEXT, body MEDIUMTEXT,"
+            " kind TINYINT NOT NULL, course_id INT NOT NULL, lesson_id INT NULL, user_id INT NOT NULL,"
+            " INDEX ix_search_index_user (user_id),"
+            " INDEX ix_search_index_course (course_id),"
+            " FULLTEXT INDEX ft_search_index (title, body)"
+            ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+        ))
+
+
+_index_exists = set()   # engine URLs known to have the table
+
+
+def search_index_exists(connection):
+    url = str(connection.engine.url)
+    if url not in _index_exists and inspect(connection).has_table("search_index"):
+        _index_exists.add(url)
+    return url in _index_exists
+
+
+# --- Writing --- #
+
+def _write(connection, docs):
+    """Replace the index rows for ``docs``: dicts with rowid/title/body/kind/course_id/lesson_id/user_id."""
+    if not docs:
+        return
+    connection.execute(text("DELETE FROM search_index WHERE rowid = :rowid"),
+                       [{"rowid": d["rowid"]} for d in docs])
+    connection.execute(text(
+        "INSERT INTO search_index (rowid, title, body, kind, course_id, lesson_id, user_id)"
+        " VALUES (:rowid, :title, :body, :kind, :course_id, :lesson_id, :user_id)"
+    ), docs)
+
+
+def _delete(connection, rowids):
+    if rowids:
+        connection.execute(text("DELETE FROM search_index WHERE rowid = :rowid"),
+                           [{"rowid": r} for r in rowids])
+
+
+def _lesson_owners(connection, lesson_ids):
+    """lesson id -> (course_id, user_id, lesson title), in one query."""
+    if not lesson_ids:
+        return {}
+    rows = connection.execute(
+        select(Lesson.id, Module.course_id, Course.user_id, Lesson.title)
+        .join(Module, Module.id == Lesson.module_id)
+        .join(Course, Course.id == Module.course_id)
+        .where(Lesson.id.in_(lesson_ids))
+    )
+    return {r[0]: (r[1], r[2], r[3]) for r in rows}
+
+
+def _decode(data):
+    return json.loads(data) if data else {}
+
+
+def _course_doc(course_id, user_id, title, description, outcome):
+    return {"rowid": row_id("course", course_id), "title": title or "",
+            "body": " ".join(p for p in (description, outcome) if p),
+            "kind": KIND_CODES["course"], "course_id": course_id, "lesson_id": None, "user_id": user_id}
+
+
+def _lesson_doc(lesson_id, course_id, user_id, title):
+    return {"rowid": row_id("lesson", lesson_id), "title": title or "", "body": "",
+            "kind": KIND_CODES["lesson"], "course_id": course_id, "lesson_id": lesson_id, "user_id": user_id}
+
+
+def _block_doc(block_id, lesson_id, course_id, user_id, lesson_title, content):
+    # Blocks carry their lesson's title so a hit can say where it is
+    return {"rowid": row_id("block", block_id), "title": lesson_title or "", "body": block_text(content),
+            "kind": KIND_CODES["block"], "course_id": course_id, "lesson_id": lesson_id, "user_id": user_id}
+
+
+def index_block(block_id, connection=None):
+    """Re-index one block from the database (for writes that bypass the ORM)."""
+    connection = connection or db.session.connection()
+    if not search_index_exists(connection):
+        return
+    row = connection.execute(select(ContentBlock.lesson_id, ContentBlock.data)
+                             .where(ContentBlock.id == block_id)).first()
+    if row is None:
+        _delete(connection, [row_id("block", block_id)])
+        return
+    owner = _lesson_owners(connection, [row.lesson_id]).get(row.lesson_id)
+    if owner:
+        _write(connection, [_block_doc(block_id, row.lesson_id, *owner, _decode(row.data))])
+
+
+def remove_course(course_id, connection=None):
+    """Drop a course and everything in it from the index (call before deleting the rows)."""
+    connection = connection or db.session.connection()
+    if not search_index_exists(connection):
+        return
+    if connection.dialect.name == "sqlite":
+        # course_id is UNINDEXED, so collect the rowids through the real tables
+        lesson_ids = [r[0] for r in connection.execute(
+            select(Lesson.id).join(Module, Module.id == Lesson.module_id).where(Module.course_id == course_id))]
+        block_ids = [r[0] for r in connection.execute(
+            select(ContentBlock.id).where(ContentBlock.lesson_id.in_(lesson_ids)))] if lesson_ids else []
+        _delete(connection, [row_id("course", course_id)]
+                + [row_id("lesson", i) for i in lesson_ids]
+                + [row_id("block", i) for i in block_ids])
+    else:
+        connection.execute(text("DELETE FROM search_index WHERE course_id = :c"), {"c": course_id})
+
+
+def reindex_course(course_id, connection=None):
+    """Rebuild the index rows of one course (after bulk inserts such as import or duplicate)."""
+    connection = connection or db.session.connection()
+    if not search_index_exists(connection):
+        return 0
+    remove_course(course_id, connection)
+    course = connection.execute(select(Course.user_id, Course.title, Course.description, Course.outcome)
+                                .where(Course.id == course_id)).first()
+    if course is None:
+        return 0
+    docs = [_course_doc(course_id, *course)]
+    lessons = {}
+    for lesson_id, title in connection.execute(
+            select(Lesson.id, Lesson.title).join(Module, Module.id == Lesson.module_id)
+            .where(Module.course_id == course_id)):
+        lessons[lesson_id] = title
+        docs.append(_lesson_doc(lesson_id, course_id, course.user_id, title))
+    if lessons:
+        for block_id, lesson_id, data in connection.execute(
+                select(ContentBlock.id, ContentBlock.lesson_id, ContentBlock.data)
+                .where(ContentBlock.lesson_id.in_(list(lessons)))):
+            docs.append(_block_doc(block_id, lesson_id, course_id, course.user_id, lessons[lesson_id],
+                                   _decode(data)))
+    _write(connection, docs)
+    return len(docs)
+
+
+def rebuild_search_index():
+    """Re-create the index from scratch. Returns the number of documents."""
+    connection = db.session.connection()
+    connection.execute(text("DROP TABLE IF EXISTS search_index"))
+    create_search_index(connection)
+    total = 0
+    for (course_id,) in connection.execute(select(Course.id)).all():
+        total += reindex_course(course_id, connection)
+    db.session.commit()
+    return total
+
+
+# --- Incremental updates from ORM flushes --- #
+
+_INDEXED_ATTRS = {
+    Course: ("title", "description", "outcome"),
+    Lesson: ("title",),
+    ContentBlock: ("data",),
+}
+
+
+def _changed(obj):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in _INDEXED_ATTRS[type(obj)])
+
+
+@event.listens_for(Session, "after_flush")
+def _update_search_index(session, flush_context):
+    touched = [o for o in session.new if type(o) in _INDEXED_ATTRS]
+    touched += [o for o in session.dirty if type(o) in _INDEXED_ATTRS and _changed(o)]
+    deleted = [o for o in session.deleted if type(o) in _INDEXED_ATTRS]
+    if not touched and not deleted:
+        return
+
+    connection = session.connection()
+    if not search_index_exists(connection):
+        return
+    kinds = {Course: "course", Lesson: "lesson", ContentBlock: "block"}
+    _delete(connection, [row_id(kinds[type(o)], o.id) for o in deleted])
+
+    docs = []
+    courses = [o for o in touched if isinstance(o, Course)]
+    for course in courses:
+        docs.append(_course_doc(course.id, course.user_id, course.title, course.description, course.outcome))
+
+    lessons = [o for o in touched if isinstance(o, Lesson)]
+    blocks = {o.id: (o.lesson_id, o.content) for o in touched if isinstance(o, ContentBlock)}
+    if lessons:
+        # Blocks carry their lesson's title, so a renamed lesson re-indexes its blocks too
+        for block_id, lesson_id, data in connection.execute(
+                select(ContentBlock.id, ContentBlock.lesson_id, ContentBlock.data)
+                .where(ContentBlock.lesson_id.in_([l.id for l in lessons]))):
+            blocks.setdefault(block_id, (lesson_id, _decode(data)))
+    owners = _lesson_owners(connection, {l.id for l in lessons} | {lesson_id for lesson_id, _ in blocks.values()})
+    for lesson in lessons:
+        if lesson.id in owners:
+            course_id, user_id, _ = owners[lesson.id]
+            docs.append(_lesson_doc(lesson.id, course_id, user_id, lesson.title))
+    for block_id, (lesson_id, content) in blocks.items():
+        if lesson_id in owners:
+            docs.append(_block_doc(block_id, lesson_id, *owners[lesson_id], content))
+    _write(connection, docs)
+
+
+# --- Querying --- #
+
+def _terms(query):
+    return re.findall(r"\w+", query.lower())[:12]
+
+
+def _fts5_query(terms):
+    # Every term must match; the last one as a prefix so results appear while typing
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _mark(value):
+    return html.escape(value).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+
+def _python_snippet(body, terms, width=80):
+    lowered = body.lower()
+    hits = [lowered.find(t) for t in terms if lowered.find(t) >= 0]
+    start = max(0, min(hits) - width // 2) if hits else 0
+    window = body[start:start + width]
+    for term in terms:
+        window = re.sub(f"(?i)({re.escape(term)}\\w*)", f"{_OPEN}\\1{_CLOSE}", window)
+    return ("…" if start else "") + window + ("…" if start + width < len(body) else "")
+
+
+def search(user_id, query, limit=20):
+    """Ranked hits for ``query`` among ``user_id``'s content, with highlighted snippets."""
+    terms = _terms(query)
+    if not terms:
+        return []
+    connection = db.session.connection()
+    if connection.dialect.name == "sqlite":
+        rows = connection.execute(text(
+            "SELECT s.rowid, s.kind, s.course_id, s.lesson_id, c.title,"
+            f" highlight(search_index, 0, '{_OPEN}', '{_CLOSE}'),"
+            f" snippet(search_index, 1, '{_OPEN}', '{_CLOSE}', '…', 16)"
+            " FROM search_index s JOIN course c ON c.id = s.course_id"
+            " WHERE search_index MATCH :q AND s.user_id = :user_id"
+            " ORDER BY bm25(search_index, 5.0, 1.0) LIMIT :limit"
+        ), {"q": _fts5_query(terms), "user_id": user_id, "limit": limit}).all()
+    else:
+        boolean_query = " ".join(f"+{t}*" for t in terms)
+        rows = [
+            (r[0], r[1], r[2], r[3], r[4], _python_snippet(r[5] or "", terms), _python_snippet(r[6] or "", terms))
+            for r in connection.execute(text(
+                "SELECT s.rowid, s.kind, s.course_id, s.lesson_id, c.title, s.title, s.body"
+                " FROM search_index s JOIN course c ON c.id = s.course_id"
+                " WHERE MATCH(s.title, s.body) AGAINST (:q IN BOOLEAN MODE) AND s.user_id = :user_id"
+                " ORDER BY MATCH(s.title, s.body) AGAINST (:q IN BOOLEAN MODE) DESC LIMIT :limit"
+            ), {"q": boolean_query, "user_id": user_id, "limit": limit})
+        ]
+
+    return [
+        {
+            "kind": KIND_NAMES[kind],
+            "id": rowid // 4,
+            "course_id": course_id,
+            "course_title": course_title,
+            "lesson_id": lesson_id,
+            "title": _mark(title or ""),
+            "snippet": _mark(snippet or ""),
+        }
+        for rowid, kind, course_id, lesson_id, course_title, title, snippet in rows
+    ]
@@ -0,0 +1,35 @@
+# tests/conftest.py
+"""An app on a throwaway SQLite database, migrated like a fresh deployment."""
+import os
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    os.environ.pop("DATABASE_URL", None)
+    os.environ.update({"INSTANCE_PATH": str(tmp_path_factory.mktemp("instance")), "AUTO_MIGRATE": "1"})
+    from main import create_app
+    return create_app()
+
+
+@pytest.fixture
+def user_id(app):
+    from main import db
+    from user import User
+
+    with app.app_context():
+        user = User(name="tester", email=f"tester{User.query.count()}@example.com")
+        user.set_password("pw")
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+    return client
@@ -0,0 +1,52 @@
+# tests/test_batch.py
+import json
+
+from main import db
+from course import Course, Module, Lesson, ContentBlock
+
+
+def _block(app, user_id):
+    with app.app_context():
+        block = ContentBlock(type="text", data=json.dumps({"html": "<p>v1</p>"}), position="a")
+        course = Course(user_id=user_id, title="Course", modules=[
+            Module(title="Module", position="a", lessons=[Lesson(title="Lesson", position="a", blocks=[block])])])
+        db.session.add(course)
+        db.session.commit()
+        return course.id, block.lesson_id, block.id
+
+
+def _batch(client, course_id, *ops):
+    return client.post("/editor/batch", json={"course_id": course_id, "ops": list(ops)})
+
+
+def test_add_block_checks_block_type(app, user_id, client):
+    course_id, lesson_id, _ = _block(app, user_id)
+    content = {"html": "<p>x</p>"}
+    for op in ({"content": content}, {"block_type": "marquee", "content": content}):
+        response = _batch(client, course_id, {"op": "add_block", "lesson_id": lesson_id, "temp_id": "b1", **op})
+        assert response.status_code == 400
+
+
+def test_update_block_needs_the_current_version(app, user_id, client):
+    course_id, _, block_id = _block(app, user_id)
+    update = {"op": "update_block", "id": block_id, "content": {"html": "<p>v2</p>"}}
+
+    assert _batch(client, course_id, update).status_code == 400
+    assert _batch(client, course_id, {**update, "version": 1}).status_code == 200
+
+    response = _batch(client, course_id, {**update, "content": {"html": "<p>lost</p>"}, "version": 1})
+    assert response.status_code == 409
+    assert response.get_json()["version"] == 2
+    with app.app_context():
+        block = db.session.get(ContentBlock, block_id)
+        assert block.content == {"html": "<p>v2</p>"}
+        assert "<p>v2</p>" in block.lesson.rendered_html
+
+
+def test_update_intro_needs_content(app, user_id, client):
+    course_id, _, _ = _block(app, user_id)
+    for op in ({"op": "update_intro"}, {"op": "update_conclusion", "content": None}):
+        assert _batch(client, course_id, op).status_code == 400
+    assert _batch(client, course_id, {"op": "update_intro", "content": "<p>Hi</p>"}).status_code == 200
+    with app.app_context():
+        assert db.session.get(Course, course_id).intro_content == "<p>Hi</p>"
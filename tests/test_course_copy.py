@@ -0,0 +1,37 @@
+# tests/test_course_copy.py
+import json
+
+from main import db
+from course import Course, Module, Lesson, ContentBlock
+from user import User
+
+
+def _positions(model, ids):
+    return sorted(db.session.query(model.id, model.position).filter(model.id.in_(ids)))
+
+
+def test_template_copy_leaves_tied_source_untouched(app, user_id, client):
+    with app.app_context():
+        owner = User(name="owner", email="owner@example.com")
+        owner.set_password("pw")
+        blocks = [ContentBlock(type="text", data=json.dumps({"html": f"<p>{i}</p>"}), position="m")
+                  for i in range(3)]
+        lessons = [Lesson(title="One", position="a", blocks=blocks), Lesson(title="Two", position="a")]
+        source = Course(author=owner, title="Template",
+                        modules=[Module(title="Module", position="a", lessons=lessons)])
+        db.session.add(source)
+        db.session.commit()
+        share_id = source.share_id
+        lesson_ids, block_ids = [l.id for l in lessons], [b.id for b in blocks]
+        before = _positions(Lesson, lesson_ids), _positions(ContentBlock, block_ids)
+
+    response = client.post(f"/editor/template/{share_id}")
+    assert response.status_code < 400
+
+    with app.app_context():
+        assert (_positions(Lesson, lesson_ids), _positions(ContentBlock, block_ids)) == before
+
+        copy = Course.query.filter_by(user_id=user_id).one()
+        copied_lessons = [l for m in copy.modules for l in m.lessons]
+        assert [l.title for l in copied_lessons] == ["One", "Two"]
+        assert [b.content["html"] for b in copied_lessons[0].blocks] == ["<p>0</p>", "<p>1</p>", "<p>2</p>"]
@@ -0,0 +1,9 @@
+# tests/test_query_plans.py
+"""``flask db check-plans`` as part of the suite."""
+from query_plans import check_query_plans
+
+
+def test_hot_queries_use_indexes(app):
+    with app.app_context():
+        failing = {name: problems for name, _, problems in check_query_plans() if problems}
+    assert failing == {}
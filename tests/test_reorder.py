@@ -0,0 +1,64 @@
+# tests/test_reorder.py
+from main import db
+from course import Course, Module, Lesson, ContentBlock
+
+
+def _lesson_with_blocks(app, user_id, positions):
+    with app.app_context():
+        lesson = Lesson(title="Lesson", position="a",
+                        blocks=[ContentBlock(type="text", data="{}", position=p) for p in positions])
+        db.session.add(Course(user_id=user_id, title="Course",
+                              modules=[Module(title="Module", position="a", lessons=[lesson])]))
+        db.session.commit()
+        return lesson.id, [b.id for b in lesson.blocks]
+
+
+def _order(app, lesson_id):
+    with app.app_context():
+        return [row[0] for row in db.session.query(ContentBlock.id)
+                .filter_by(lesson_id=lesson_id).order_by(ContentBlock.position)]
+
+
+def test_after_id_lands_before_the_real_next_sibling(app, user_id, client):
+    lesson_id, (first, middle, last) = _lesson_with_blocks(app, user_id, ["9", "i", "r"])
+    response = client.post("/editor/reorder", json={"item_type": "block", "item_id": last, "after_id": first})
+    assert response.status_code == 200
+    assert response.get_json()["message"] != "No change in order"
+    assert _order(app, lesson_id) == [first, last, middle]
+
+
+def test_before_id_lands_after_the_real_previous_sibling(app, user_id, client):
+    lesson_id, (first, middle, last) = _lesson_with_blocks(app, user_id, ["9", "i", "r"])
+    response = client.post("/editor/reorder", json={"item_type": "block", "item_id": first, "before_id": last})
+    assert response.status_code == 200
+    assert _order(app, lesson_id) == [middle, first, last]
+
+
+def test_non_adjacent_neighbours_are_rejected(app, user_id, client):
+    _, (first, middle, third, moved) = _lesson_with_blocks(app, user_id, ["9", "i", "r", "t"])
+    response = client.post("/editor/reorder", json={"item_type": "block", "item_id": moved,
+                                                    "after_id": first, "before_id": third})
+    assert response.status_code == 400
+
+
+def test_new_order_must_be_a_number(app, user_id, client):
+    _, (block, _) = _lesson_with_blocks(app, user_id, ["a", "b"])
+    response = client.post("/editor/reorder", json={"item_type": "block", "item_id": block, "new_order": "two"})
+    assert response.status_code == 400
+
+
+def test_move_that_triggers_a_rebalance_keeps_its_place(app, user_id, client):
+    from positions import _get_executor, evenly_spaced_keys
+
+    long_key = "a" + "0" * 22 + "1"
+    lesson_id, (first, second, third, moved) = _lesson_with_blocks(app, user_id, ["a", long_key, "b", "c"])
+    response = client.post("/editor/reorder", json={"item_type": "block", "item_id": moved,
+                                                    "after_id": first, "before_id": second})
+    assert response.status_code == 200
+
+    _get_executor().submit(lambda: None).result()   # single worker: the rebalance has run
+    assert _order(app, lesson_id) == [first, moved, second, third]
+    with app.app_context():
+        keys = [row[0] for row in db.session.query(ContentBlock.position)
+                .filter_by(lesson_id=lesson_id).order_by(ContentBlock.position)]
+        assert keys == evenly_spaced_keys(4)
@@ -0,0 +1,27 @@
+# tests/test_search.py
+import json
+
+from main import db
+from course import Course, Module, Lesson, ContentBlock
+import search
+
+
+def test_renaming_a_lesson_retitles_its_block_hits(app, user_id):
+    with app.app_context():
+        course = Course(user_id=user_id, title="Integrations")
+        lesson = Lesson(title="Webhooks basics", position="a")
+        lesson.blocks.append(ContentBlock(type="text", data=json.dumps({"html": "<p>Signing payloads</p>"}),
+                                          position="a"))
+        course.modules.append(Module(title="Events", position="a", lessons=[lesson]))
+        db.session.add(course)
+        db.session.commit()
+
+        hits = search.search(user_id, "signing")
+        assert [(h["kind"], h["title"]) for h in hits] == [("block", "Webhooks basics")]
+
+        lesson.title = "Cron jobs"
+        db.session.commit()
+
+        assert search.search(user_id, "webhooks") == []
+        hits = search.search(user_id, "signing")
+        assert [(h["kind"], h["title"]) for h in hits] == [("block", "Cron jobs")]
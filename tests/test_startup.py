@@ -0,0 +1,8 @@
+# tests/test_startup.py
+"""``flask startup-check`` as part of the suite."""
+
+
+def test_cold_start_is_within_budget(app):
+    with app.app_context():   # as the flask command pushes one
+        result = app.test_cli_runner().invoke(args=["startup-check", "--runs", "3"])
+    assert result.exit_code == 0, result.output
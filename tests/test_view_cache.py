@@ -0,0 +1,28 @@
+# tests/test_view_cache.py
+from sqlalchemy import text
+
+from main import db
+from course import Course
+
+
+def test_edits_within_one_second_change_the_page(app, user_id, client):
+    with app.app_context():
+        course = Course(user_id=user_id, title="Course", intro_content="<p>First</p>")
+        db.session.add(course)
+        db.session.commit()
+        course_id, share_id, updated_at = course.id, course.share_id, course.updated_at
+
+    first = client.get(f"/course/{share_id}")
+    assert "First" in first.get_data(as_text=True)
+
+    client.post(f"/editor/course/{course_id}/intro", json={"content": "<p>Second</p>"})
+    with app.app_context():
+        # As on MySQL DATETIME: both writes land in the same second
+        db.session.execute(text("UPDATE course SET updated_at = :t WHERE id = :id"),
+                           {"t": updated_at, "id": course_id})
+        db.session.commit()
+
+    second = client.get(f"/course/{share_id}", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert "Second" in second.get_data(as_text=True)
+    assert second.headers["ETag"] != first.headers["ETag"]
@@ -1,4 +1,5 @@
+# wsgi.py
+"""WSGI entry point: ``gunicorn -c gunicorn.conf.py wsgi:app`` and ``flask --app wsgi ...``."""
 from main import create_app
 
 app = create_app()
-